@@ -0,0 +1,78 @@
+"""Minimal HTTP/1.1 load generator shared by the benchmarks.
+
+Each simulated client keeps one connection open and sends requests back to
+back for the duration of the run; latencies are collected per request.
+"""
+import asyncio
+import time
+
+
+async def _client(host, port, request, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status, length, close = await _read_head(reader)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors.append(status)
+            if close:
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+    finally:
+        writer.close()
+
+
+async def _read_head(reader):
+    status_line = await reader.readline()
+    status = int(status_line.split()[1])
+    length, close = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            return status, length, close
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection' and value.strip().lower() == 'close':
+            close = True
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(host, port, path, cookies='', concurrency=50, duration=10.0):
+    """Hammer `path` with `concurrency` keep-alive clients for `duration` seconds.
+
+    Returns:
+        dict: requests, errors, rps, p50 and p99 latency in milliseconds
+    """
+    request = ("GET %s HTTP/1.1\r\nHost: %s:%d\r\nCookie: %s\r\n"
+        "Accept: application/json\r\n\r\n" % (path, host, port, cookies)).encode()
+    latencies, errors = [], []
+
+    async def main():
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*[
+            _client(host, port, request, deadline, latencies, errors)
+            for _ in range(concurrency)
+        ])
+
+    started = time.monotonic()
+    asyncio.run(main())
+    elapsed = time.monotonic() - started
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 0.50) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+    }
@@ -0,0 +1,82 @@
+"""Compare the cost of serializing duties with `DutySerializer` and `FastDutySerializer`.
+
+Fills a throwaway database with duties and times both serializers, with
+and without the query reading them, reported per 10k duties:
+
+    python -m benchmarks.serializers --duties 10000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+
+import django  # noqa: E402
+
+
+def prepare(count):
+    """Migrate the benchmark database and create `count` duties.
+    """
+    django.setup()
+    from django.conf import settings
+    from django.core.cache import caches
+    from django.core.management import call_command
+    from django.utils import timezone
+    from duty_api.models import Duty
+    from duty_api.schedule import get_schedule
+
+    if os.path.exists(settings.DATABASES['default']['NAME']):
+        os.remove(settings.DATABASES['default']['NAME'])
+    call_command('migrate', verbosity=0)
+    # cached rows and state versions belong to the old database
+    caches['default'].clear()
+
+    schedule = get_schedule(0)
+    now = timezone.now()
+    duties = []
+    for index in range(count):
+        start = now - schedule.duration * index
+        duties.append(Duty(duty_start=start, duty_end=start + schedule.duration,
+            slot='bench-%d' % index, **schedule.marks(start)))
+    Duty.objects.bulk_create(duties, batch_size=1000)
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - began)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--duties', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    prepare(args.duties)
+    from duty_api.models import Duty
+    from duty_api.serializers import DutySerializer, FastDutySerializer
+
+    queryset = Duty.objects.order_by('pk')
+    instances = list(queryset)
+    rows = list(queryset.values_list(*FastDutySerializer.columns()))
+    assert FastDutySerializer(rows, many=True).data == DutySerializer(instances, many=True).data
+
+    cases = [
+        ('DutySerializer, queryset', lambda: DutySerializer(queryset.all(), many=True).data),
+        ('FastDutySerializer, queryset', lambda: FastDutySerializer(queryset.all(), many=True).data),
+        ('DutySerializer, instances', lambda: DutySerializer(instances, many=True).data),
+        ('FastDutySerializer, rows', lambda: FastDutySerializer(rows, many=True).data),
+    ]
+    scale = 10000 / args.duties
+    print("%-30s %14s" % ('serializer', 'ms / 10k'))
+    for name, function in cases:
+        print("%-30s %14.1f" % (name, best_of(args.repeat, function) * 1000 * scale))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
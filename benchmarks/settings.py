@@ -0,0 +1,38 @@
+"""Settings for running the benchmarks against real servers.
+
+Every server worker is its own process and reads the sessions from the
+shared store (users.sessions); the database, the session store and the
+cache are throwaway files.
+"""
+import os
+import tempfile
+
+from customuser.settings import *  # noqa
+
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+
+# loaders are picked from DEBUG when the project settings are read
+TEMPLATES = [dict(TEMPLATES[0], OPTIONS=dict(TEMPLATES[0]['OPTIONS'],  # noqa
+    loaders=[('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]))]  # noqa
+
+SESSION_STORE = dict(SESSION_STORE,  # noqa
+    PATH=os.path.join(tempfile.gettempdir(), 'customuser-benchmark-sessions.sqlite3'))
+
+CACHES = dict(CACHES, default=dict(CACHES['default'],  # noqa
+    LOCATION=os.path.join(tempfile.gettempdir(), 'customuser-benchmark-cache')))
+
+# the servers all run on this host, so the file cache is shared by them
+SHARED_CACHE_BACKENDS = SHARED_CACHE_BACKENDS + [CACHES['default']['BACKEND']]  # noqa
+
+DATABASES = dict(DATABASES,  # noqa
+    default=dict(DATABASES['default'],  # noqa
+        NAME=os.environ.get('BENCHMARK_DB',
+            os.path.join(tempfile.gettempdir(), 'customuser-benchmark.sqlite3'))))
+
+# BENCHMARK_SQLITE=plain measures the stock backend without connection reuse
+if os.environ.get('BENCHMARK_SQLITE') == 'plain':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATABASES['default']['NAME'],
+    }
@@ -0,0 +1,107 @@
+"""Compare concurrent write throughput of the stock and the tuned SQLite backends.
+
+Starts N worker processes per backend that each run duty-like write
+transactions (read the slot, insert a duty, update a flag) in a loop, closing
+the connection between transactions like the end of a request unless
+CONN_MAX_AGE keeps it, and prints committed transactions per second and
+"database is locked" failures:
+
+    python -m benchmarks.sqlite_writes --workers 1 4 8 --duration 5
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+
+MODES = {
+    'plain': 'django.db.backends.sqlite3, CONN_MAX_AGE=0',
+    'tuned': 'customuser.db.sqlite3, WAL, BEGIN IMMEDIATE, persistent',
+}
+
+
+def setup(mode):
+    os.environ['BENCHMARK_SQLITE'] = mode
+    import django
+    django.setup()
+
+
+def prepare(mode):
+    """Create the benchmark database from scratch, journal mode included.
+    """
+    setup(mode)
+    from django.conf import settings
+    from django.core.cache import caches
+    from django.core.management import call_command
+
+    name = settings.DATABASES['default']['NAME']
+    for path in (name, name + '-wal', name + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+    call_command('migrate', verbosity=0)
+    # cached rows and state versions belong to the old database
+    caches['default'].clear()
+
+
+def work(mode, index, duration, results):
+    setup(mode)
+    from django.db import OperationalError, close_old_connections, transaction
+    from duty_api.models import Duty
+
+    slot = 'bench-%d' % index
+    committed = locked = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        try:
+            with transaction.atomic():
+                if not Duty.objects.filter(slot=slot, is_task1_submitted=False).exists():
+                    duty = Duty(slot=slot)
+                    duty.save()
+                Duty.objects.filter(slot=slot).update(is_task1_submitted=True)
+            committed += 1
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+        # end of the "request"
+        close_old_connections()
+    results.put((committed, locked))
+
+
+def run(mode, workers, duration):
+    # settings differ per mode, so even preparing runs in a fresh process
+    context = multiprocessing.get_context('spawn')
+    preparing = context.Process(target=prepare, args=(mode, ))
+    preparing.start()
+    preparing.join()
+    results = context.Queue()
+    processes = [context.Process(target=work, args=(mode, index, duration, results))
+        for index in range(workers)]
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    committed = sum(total[0] for total in totals)
+    locked = sum(total[1] for total in totals)
+    return committed / duration, locked
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    args = parser.parse_args(argv)
+
+    print("%-6s %8s %12s %8s" % ('mode', 'workers', 'writes/s', 'locked'))
+    for workers in args.workers:
+        for mode in args.modes:
+            rate, locked = run(mode, workers, args.duration)
+            print("%-6s %8d %12.1f %8d" % (mode, workers, rate, locked))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Compare the render time of the HTML pages with and without the template caches.
+
+Renders every page template through engines configured like the project,
+with the plain loaders (templates read and compiled on each render), with
+the cached loader, and with the cached loader once the per-user fragments
+are cached, reported in microseconds per render:
+
+    python -m benchmarks.templates --renders 2000 --repeat 5
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+
+import django  # noqa: E402
+
+TEMPLATES = ['profile.html', 'ongoing_duty.html', 'start_duty.html', 'login.html', 'signup.html']
+
+
+def engine(loaders):
+    from django.conf import settings
+    from django.template.backends.django import DjangoTemplates
+
+    config = settings.TEMPLATES[0]
+    return DjangoTemplates({
+        'NAME': 'benchmark',
+        'DIRS': config['DIRS'],
+        'APP_DIRS': False,
+        'OPTIONS': dict(config['OPTIONS'], loaders=loaders),
+    })
+
+
+def contexts(user, duty):
+    """Context factory of each template, `fresh` misses the fragment cache.
+    """
+    from django.contrib.auth.forms import AuthenticationForm
+    from users.cache import fragment_context
+    from users.forms import SignUpForm
+
+    counter = itertools.count()
+
+    def fragments(fresh):
+        context = fragment_context(user)
+        if fresh:
+            context = dict(context, version='fresh-%d' % next(counter))
+        return context
+
+    return {
+        'profile.html': lambda fresh: {
+            'object': user, 'user': user, 'fragments': fragments(fresh)},
+        'ongoing_duty.html': lambda fresh: {
+            'user': user, 'duty': duty, 'events_url': '/duties/events/',
+            'fragments': fragments(fresh)},
+        'start_duty.html': lambda fresh: {'user': user},
+        'login.html': lambda fresh: {'form': AuthenticationForm()},
+        'signup.html': lambda fresh: {'form': SignUpForm()},
+    }
+
+
+def best_of(repeat, renders, function):
+    timings = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        for _ in range(renders):
+            function()
+        timings.append(time.perf_counter() - began)
+    return min(timings) / renders
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--renders', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    django.setup()
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.test import RequestFactory
+    from django.utils import timezone
+    from duty_api.models import Duty
+
+    # unsaved rows, rendering doesn't touch the database
+    user = get_user_model()(pk=1, name='Benchmark User', email='benchmark@example.com')
+    now = timezone.now()
+    duty = Duty(pk=1, user=user, duty_start=now, duty_end=now + timezone.timedelta(hours=3))
+    request = RequestFactory().get('/')
+    request.user = user
+    factories = contexts(user, duty)
+
+    plain = engine(settings.TEMPLATE_LOADERS)
+    cached = engine([('django.template.loaders.cached.Loader', settings.TEMPLATE_LOADERS)])
+    cases = [
+        ('plain loaders', plain, True),
+        ('cached loader', cached, True),
+        ('cached + fragments', cached, False),
+    ]
+
+    print("%-20s %s" % ('template', ''.join('%20s' % name for name, _, _ in cases)))
+    for name in TEMPLATES:
+        timings = []
+        for _, backend, fresh in cases:
+            context = factories[name]
+
+            def render():
+                backend.get_template(name).render(context(fresh), request)
+            render()
+            timings.append(best_of(args.repeat, args.renders, render))
+        print("%-20s %s" % (name, ''.join('%17.1f us' % (timing * 1e6) for timing in timings)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
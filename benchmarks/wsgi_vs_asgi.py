@@ -0,0 +1,109 @@
+"""Compare the WSGI and ASGI deployments of the duty API.
+
+Starts gunicorn (sync workers, WSGI views) and uvicorn (ASGI, async views)
+with the same number of workers, drives `GET /duties/api/` as a logged in
+user holding a duty and prints requests/sec and latency percentiles.
+
+Requires gunicorn and uvicorn:
+
+    pip install gunicorn uvicorn
+    python -m benchmarks.wsgi_vs_asgi --workers 4 --concurrency 100
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+
+import django  # noqa: E402
+
+SERVERS = {
+    'wsgi': ['gunicorn', 'customuser.wsgi:application',
+        '--workers', '{workers}', '--bind', '{host}:{port}'],
+    'asgi': ['uvicorn', 'customuser.asgi:application',
+        '--workers', '{workers}', '--host', '{host}', '--port', '{port}',
+        '--log-level', 'warning'],
+}
+
+
+def prepare():
+    """Migrate the benchmark database and log in a user holding a duty.
+
+    Returns:
+        str: Cookie header of the user's session
+    """
+    django.setup()
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.core.cache import caches
+    from django.core.management import call_command
+    from django.test import Client
+    from duty_api.models import DutyManager
+
+    if os.path.exists(settings.DATABASES['default']['NAME']):
+        os.remove(settings.DATABASES['default']['NAME'])
+    call_command('migrate', verbosity=0)
+    # cached rows and state versions belong to the old database
+    caches['default'].clear()
+
+    user = get_user_model().objects.create_user(
+        email='bench@example.com', password='benchmark', name='Bench')
+    DutyManager().start_duty(user)
+
+    client = Client()
+    client.force_login(user)
+    return '; '.join('%s=%s' % (name, morsel.value) for name, morsel in client.cookies.items())
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Server on %s:%d didn't come up." % (host, port))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--path', default='/duties/api/')
+    parser.add_argument('--servers', nargs='+', default=list(SERVERS), choices=list(SERVERS))
+    args = parser.parse_args(argv)
+
+    from benchmarks import loadgen
+
+    cookies = prepare()
+    env = dict(os.environ)
+    env.pop('DJANGO_ROOT_URLCONF', None)
+
+    print("%-6s %10s %8s %10s %10s %10s" % ('server', 'requests', 'errors', 'req/s', 'p50 ms', 'p99 ms'))
+    for name in args.servers:
+        command = [part.format(workers=args.workers, host=args.host, port=args.port)
+            for part in SERVERS[name]]
+        server = subprocess.Popen(command, env=env)
+        try:
+            wait_for_port(args.host, args.port)
+            # warm up the workers before measuring
+            loadgen.run(args.host, args.port, args.path, cookies,
+                concurrency=args.workers, duration=1.0)
+            result = loadgen.run(args.host, args.port, args.path, cookies,
+                concurrency=args.concurrency, duration=args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        print("%-6s %10d %8d %10.1f %10.2f %10.2f" % (
+            name, result['requests'], result['errors'], result['rps'], result['p50'], result['p99']))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,23 @@
+"""
+ASGI config for customuser project.
+
+It exposes the ASGI callable as a module-level variable named ``application``
+and serves the async views of ``customuser.urls_async``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'customuser.settings')
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'customuser.urls_async')
+
+application = get_asgi_application()
+
+# only the serving processes sweep, not every process that sets Django up
+from duty_api.sweeper import start_sweeper  # noqa: E402
+
+start_sweeper()
@@ -0,0 +1,143 @@
+"""Read replicas with read-your-writes pinning.
+
+`PrimaryReplicaRouter` sends every write to `default`, the primary, and the
+reads of a request to one of `settings.DATABASE_REPLICAS`. Reads go to the
+primary when:
+
+- the request isn't a safe method (POST, DELETE, ...), the primary serves
+  the reads a write depends on
+- the request already wrote, or runs in a transaction
+- the client wrote less than `DATABASE_PIN_SECONDS` ago: after a write
+  `ReadYourWritesMiddleware` sets a cookie pinning the client to the
+  primary until the replicas have caught up, so a user never sees a duty
+  older than the one they just started
+- there is no request at all (commands, background threads)
+
+Locally the replicas are SQLite files copied from the primary by
+`manage.py replicate`, see `replicate()`.
+"""
+import random
+import sqlite3
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+PIN_COOKIE = 'db_pinned_until'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_routing = ContextVar('db_routing', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class Routing(object):
+    """Routing state of the current request.
+    """
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+class PrimaryReplicaRouter(object):
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        replicas = get_replicas()
+        if (routing is None or routing.pinned or routing.wrote or not replicas
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # replicas get the schema from the primary
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReadYourWritesMiddleware(object):
+    """Route the reads of a request, pin clients that wrote to the primary.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = self.routing(request)
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(request, routing, response)
+
+    async def __acall__(self, request):
+        routing = self.routing(request)
+        token = _routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(request, routing, response)
+
+    @staticmethod
+    def routing(request):
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        return Routing(pinned=request.method not in SAFE_METHODS or pinned_until > time.time())
+
+    @staticmethod
+    def pin(request, routing, response):
+        if routing.wrote or request.method not in SAFE_METHODS:
+            seconds = getattr(settings, 'DATABASE_PIN_SECONDS', 5)
+            response.set_cookie(PIN_COOKIE, '%.3f' % (time.time() + seconds),
+                max_age=seconds, httponly=True, samesite='Lax')
+        return response
+
+
+def replicate(source, targets):
+    """Copy the SQLite database at `source` over each of `targets`.
+
+    Uses the online backup API, so the copy is a consistent snapshot even
+    while the primary is written, and readers of a target see either the
+    old or the new copy.
+    """
+    primary = sqlite3.connect(source)
+    try:
+        for target in targets:
+            replica = sqlite3.connect(target, timeout=20)
+            try:
+                primary.backup(replica)
+            finally:
+                replica.close()
+    finally:
+        primary.close()
@@ -0,0 +1,63 @@
+"""SQLite backend tuned for several worker processes writing at once.
+
+Every connection runs in WAL mode, so readers never block the writer, with
+`synchronous=NORMAL` (durable at checkpoints, safe with WAL), a memory map
+and a busy timeout so a writer waits for the lock instead of failing with
+"database is locked". Transactions start with `BEGIN IMMEDIATE`: a
+transaction that reads before writing would otherwise take the write lock
+only at its first write and fail at once if another writer holds it, since
+SQLite can't wait there without risking a deadlock.
+
+Configured from `OPTIONS` in `settings.DATABASES`, the rest is passed to
+`sqlite3.connect` as usual:
+
+    'OPTIONS': {
+        'timeout': 20,                      # seconds to wait for the lock
+        'transaction_mode': 'IMMEDIATE',    # DEFERRED, IMMEDIATE or EXCLUSIVE
+        'pragmas': {'cache_size': -64000},  # merged into PRAGMAS
+    }
+
+Pair it with CONN_MAX_AGE so connections, and their pragmas, are reused.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+DEFAULT_TIMEOUT = 20
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        options = self.settings_dict['OPTIONS']
+        self.transaction_mode = options.get('transaction_mode', 'IMMEDIATE').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                "DATABASES transaction_mode must be one of %s." % ', '.join(TRANSACTION_MODES))
+        self.pragmas = dict(PRAGMAS, **options.get('pragmas', {}))
+
+        kwargs = super().get_connection_params()
+        kwargs.pop('transaction_mode', None)
+        kwargs.pop('pragmas', None)
+        kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+        self.busy_timeout = int(kwargs['timeout'] * 1000)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        conn.execute('PRAGMA busy_timeout = %d' % self.busy_timeout)
+        for name, value in self.pragmas.items():
+            conn.execute('PRAGMA %s = %s' % (name, value))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN %s' % self.transaction_mode)
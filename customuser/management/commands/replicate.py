@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from customuser.db.replicas import get_replicas, replicate
+
+
+class Command(BaseCommand):
+    help = ("Copy the primary SQLite database over the read replicas, a local "
+        "stand-in for database replication.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+            help="Keep replicating every INTERVAL seconds instead of once.")
+
+    def handle(self, *args, **options):
+        source = settings.DATABASES['default']['NAME']
+        targets = [settings.DATABASES[alias]['NAME'] for alias in get_replicas()]
+        while True:
+            replicate(source, targets)
+            self.stdout.write("Replicated to %d replicas." % len(targets))
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
@@ -8,12 +8,57 @@ STATIC_DIR = os.path.join(BASE_DIR,'static')
 SECRET_KEY = 'n%v9s8)gplq25r38o%6njr_(i$48+%3n7j@hpli%96bnvqla%2'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DJANGO_DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = []
 
 AUTH_USER_MODEL = 'users.User'
 
+AUTHENTICATION_BACKENDS = ['users.backends.CachedEmailBackend']
+
+# User rows, fragment versions, the schedule generation and the duty state
+# version are invalidated through the default cache, so they are only cached
+# when its backend is in SHARED_CACHE_BACKENDS (see users.cache.shared_cache)
+# and read from the database otherwise.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, '.cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Cache backends shared by every worker of every host. Add
+# 'django.core.cache.backends.filebased.FileBasedCache' when all the workers
+# run on a single host.
+SHARED_CACHE_BACKENDS = [
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+    'django.core.cache.backends.db.DatabaseCache',
+]
+
+# user rows cached by id for `get_user`, the cache must be shared by every
+# worker just like the session cache
+USER_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
+# per-user `{% cache %}` fragments of the HTML pages, versioned by users.cache
+FRAGMENT_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 600,
+}
+
+# password hashing runs off the request thread, see users.hashing
+PASSWORD_HASHING = {
+    'EXECUTOR': 'thread',
+    'WORKERS': None,
+}
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -22,6 +67,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     # applications
+    'customuser',
     'users',
     'duty_api',
     # dependencies lib
@@ -35,24 +81,44 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'customuser.db.replicas.ReadYourWritesMiddleware',
+    'duty_api.middleware.IdentityMapMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-SESSION_ENGINE = "django.contrib.sessions.backends.cache" 
+# Sessions are shared by every worker through a SQLite file, with the hot ones
+# kept decoded in each worker, see users/sessions.py
+SESSION_ENGINE = 'users.sessions'
+SESSION_STORE = {
+    'PATH': os.environ.get('SESSION_STORE_PATH', os.path.join(BASE_DIR, 'sessions.sqlite3')),
+    'HOT_SIZE': 10000,
+    'WRITE_BEHIND': 5,
+    'CLEANUP_BATCH': 1000,
+}
 
-ROOT_URLCONF = 'customuser.urls'
+# customuser.asgi serves the async views from customuser.urls_async
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'customuser.urls')
 
 REST_FRAMEWORK = {
     'DATETIME_FORMAT': "%m/%d/%Y %H:%M:%S",
 }
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+# compiled templates are kept by the cached loader outside of debug, in debug
+# they are read again on every render so edits show up under any server
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATE_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -63,17 +129,43 @@ TEMPLATES = [
     },
 ]
 
+TEST_RUNNER = 'customuser.test_runner.TestRunner'
+
 WSGI_APPLICATION = 'customuser.wsgi.application'
+ASGI_APPLICATION = 'customuser.asgi.application'
 
 
+# WAL, tuned pragmas and BEGIN IMMEDIATE for concurrent workers, see
+# customuser/db/sqlite3/base.py; connections are kept for CONN_MAX_AGE seconds
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'customuser.db.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
 
+# Read replicas, e.g. DATABASE_REPLICAS=/srv/replica1.sqlite3,/srv/replica2.sqlite3
+# kept in sync locally by `manage.py replicate`. Requests read from them
+# unless they write or follow a write, see customuser/db/replicas.py
+DATABASE_REPLICAS = []
+for index, path in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), 1):
+    alias = 'replica%d' % index
+    DATABASES[alias] = dict(DATABASES['default'], NAME=path, TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['customuser.db.replicas.PrimaryReplicaRouter']
+
+# Seconds a client keeps reading from the primary after writing, longer
+# than the replication lag
+DATABASE_PIN_SECONDS = 5
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -100,5 +192,28 @@ USE_L10N = True
 
 USE_TZ = True
 
+# Shared state of the active duty, see duty_api/state.py. The database
+# backend mirrors its version stamp into the given cache alias, which must be
+# shared by all workers (memcached, redis) to save the per-request query.
+DUTY_STATE = {
+    'BACKEND': 'duty_api.state.DatabaseStateBackend',
+    'OPTIONS': {
+        'cache_alias': 'default',
+    },
+}
+
+# Store duties as duty_start + schedule + override deltas and derive the task
+# marks on read instead of writing them, see duty_api/schedule.py
+DUTY_COMPACT_SCHEMA = False
+
+# Seconds between sweeps of finished duties by a thread of each server process
+# (started by customuser.wsgi / customuser.asgi), None to rely on the
+# sweep_duties management command instead
+DUTY_SWEEPER_INTERVAL = None
+
+# Seconds task submissions are queued and coalesced into one UPDATE per task
+# before being written, None writes every submission through at once
+DUTY_SUBMISSION_FLUSH_INTERVAL = 0.05
+
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [STATIC_DIR,]
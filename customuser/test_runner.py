@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+from django.core.cache import caches
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from django.conf import settings
+
+
+class ClearCachesResult(object):
+    """Clear the caches before each test, they outlive the rollback of its data.
+    """
+
+    def startTest(self, test):
+        for cache in caches.all():
+            cache.clear()
+        super().startTest(test)
+
+
+class TestRunner(DiscoverRunner):
+    """Run the tests with the session store and the cache in temporary files,
+    without replicas.
+
+    Reads can't be routed to the replicas: they mirror the test database
+    through connections of their own, which don't see the data of a test
+    case's transaction.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._session_dir = tempfile.TemporaryDirectory()
+        self._settings = override_settings(
+            SESSION_STORE=dict(
+                settings.SESSION_STORE,
+                PATH=os.path.join(self._session_dir.name, 'sessions.sqlite3')),
+            CACHES=dict(settings.CACHES, default=dict(
+                settings.CACHES['default'],
+                LOCATION=os.path.join(self._session_dir.name, 'cache'))),
+            # every test worker runs on this host
+            SHARED_CACHE_BACKENDS=list(settings.SHARED_CACHE_BACKENDS) + [
+                settings.CACHES['default']['BACKEND']],
+            DATABASE_REPLICAS=[],
+        )
+        self._settings.enable()
+
+    def get_resultclass(self):
+        resultclass = super().get_resultclass() or unittest.TextTestResult
+        return type('ClearCaches' + resultclass.__name__, (ClearCachesResult, resultclass), {})
+
+    def teardown_test_environment(self, **kwargs):
+        self._settings.disable()
+        self._session_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,33 @@
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+
+class TestSQLiteBackend(TestCase):
+    """Test the pragmas of `customuser.db.sqlite3` connections.
+    """
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA %s' % name)
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        """Connections wait for the write lock and sync at checkpoints only.
+        """
+        self.assertEqual(self.pragma('busy_timeout'), 20000)
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('foreign_keys'), 1)
+
+
+class TestSQLiteTransactions(TransactionTestCase):
+    """Test how `customuser.db.sqlite3` starts transactions.
+    """
+
+    def test_begin_immediate(self):
+        """Transactions take the write lock up front.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                pass
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+
+from customuser.db.replicas import (
+    PIN_COOKIE, PrimaryReplicaRouter, ReadYourWritesMiddleware, replicate,
+)
+from duty_api.models import Duty
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'], DATABASE_PIN_SECONDS=5)
+class TestReadYourWrites(TransactionTestCase):
+    """Test the routing of reads within requests, outside of a test transaction.
+    """
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def serve(self, request, write=False):
+        routes = []
+        def view(request):
+            routes.append(self.router.db_for_read(Duty))
+            if write:
+                self.router.db_for_write(Duty)
+            routes.append(self.router.db_for_read(Duty))
+            return HttpResponse()
+        return ReadYourWritesMiddleware(view)(request), routes
+
+    def test_outside_request(self):
+        """Commands and background threads read from the primary.
+        """
+        self.assertEqual(self.router.db_for_read(Duty), 'default')
+        self.assertEqual(self.router.db_for_write(Duty), 'default')
+
+    def test_reads_and_writes(self):
+        """Safe requests read from a replica until they write.
+        """
+        response, routes = self.serve(self.factory.get('/'))
+        self.assertIn(routes[0], ('replica1', 'replica2'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        response, routes = self.serve(self.factory.get('/'), write=True)
+        self.assertEqual(routes[1], 'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+
+        response, routes = self.serve(self.factory.post('/'))
+        self.assertEqual(routes, ['default', 'default'])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_pinned(self):
+        """Clients that just wrote read from the primary, until the pin expires.
+        """
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = str(time.time() + 5)
+        _, routes = self.serve(request)
+        self.assertEqual(routes, ['default', 'default'])
+
+        request.COOKIES[PIN_COOKIE] = str(time.time() - 1)
+        _, routes = self.serve(request)
+        self.assertIn(routes[0], ('replica1', 'replica2'))
+
+    def test_transaction(self):
+        """Reads within a transaction go to the primary.
+        """
+        def view(request):
+            with transaction.atomic():
+                route = self.router.db_for_read(Duty)
+            return HttpResponse(route)
+        response = ReadYourWritesMiddleware(view)(self.factory.get('/'))
+        self.assertEqual(response.content, b'default')
+
+    def test_allow_migrate(self):
+        """Only the primary is migrated.
+        """
+        self.assertFalse(self.router.allow_migrate('replica1', 'duty_api'))
+        self.assertIsNone(self.router.allow_migrate('default', 'duty_api'))
+
+
+class TestReplicate(TestCase):
+    """Test the stand-in replication of SQLite files.
+    """
+
+    def test_replicate(self):
+        """Replicas get a copy of the primary.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        primary, replica = (os.path.join(directory.name, name)
+            for name in ('primary.sqlite3', 'replica.sqlite3'))
+
+        connection = sqlite3.connect(primary, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('CREATE TABLE duty (id INTEGER PRIMARY KEY)')
+        connection.execute('INSERT INTO duty VALUES (1)')
+        replicate(primary, [replica])
+        connection.execute('INSERT INTO duty VALUES (2)')
+        replicate(primary, [replica])
+        connection.close()
+
+        connection = sqlite3.connect(replica)
+        self.assertEqual(connection.execute('SELECT id FROM duty').fetchall(), [(1, ), (2, )])
+        connection.close()
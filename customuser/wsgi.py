@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'customuser.settings')
 
 application = get_wsgi_application()
+
+# only the serving processes sweep, not every process that sets Django up
+from duty_api.sweeper import start_sweeper  # noqa: E402
+
+start_sweeper()
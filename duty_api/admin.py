@@ -1,7 +1,41 @@
-from django.contrib import admin
-from .models import Duty
+from django.contrib import admin, messages
+from .models import Duty, DutyTemplate, DutyTemplateTask
 
 class DutyAdmin(admin.ModelAdmin):
     model = Duty
 
+class DutyTemplateTaskInline(admin.TabularInline):
+    model = DutyTemplateTask
+
+    # tasks of a template in use are read-only, see DutyTemplate
+    def has_add_permission(self, request, obj=None):
+        return super().has_add_permission(request, obj) and not (obj and obj.in_use())
+
+    def has_change_permission(self, request, obj=None):
+        return super().has_change_permission(request, obj) and not (obj and obj.in_use())
+
+    def has_delete_permission(self, request, obj=None):
+        return super().has_delete_permission(request, obj) and not (obj and obj.in_use())
+
+class DutyTemplateAdmin(admin.ModelAdmin):
+    model = DutyTemplate
+    inlines = (DutyTemplateTaskInline, )
+
+    def get_readonly_fields(self, request, obj=None):
+        readonly = super().get_readonly_fields(request, obj)
+        if obj is not None and obj.in_use():
+            readonly = tuple(readonly) + ('duty_duration', )
+        return readonly
+
+    def has_delete_permission(self, request, obj=None):
+        return super().has_delete_permission(request, obj) and not (obj and obj.in_use())
+
+    def delete_queryset(self, request, queryset):
+        used = queryset.filter(pk__in=DutyTemplate.objects.used().values('pk'))
+        if used.exists():
+            self.message_user(request, "Kept the duty templates in use: %s." %
+                ", ".join(str(template.name) for template in used), messages.WARNING)
+        queryset.exclude(pk__in=used.values('pk')).delete()
+
 admin.site.register(Duty, DutyAdmin)
+admin.site.register(DutyTemplate, DutyTemplateAdmin)
@@ -0,0 +1,13 @@
+from django.urls import path
+from .async_views import duty_events, duty_handler, duty_view, export_handler, task_handler
+from .views import history_handler, stats_handler
+
+urlpatterns = [
+    path('', duty_view, name='duty-page'),
+    path('api/', duty_handler, name='duty-api'),
+    path('api/tasks/<int:task>/', task_handler, name='duty-task'),
+    path('api/history/', history_handler, name='duty-history'),
+    path('api/stats/', stats_handler, name='duty-stats'),
+    path('api/export/', export_handler, name='duty-export'),
+    path('api/events/', duty_events, name='duty-events'),
+]
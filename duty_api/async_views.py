@@ -0,0 +1,335 @@
+"""Async versions of the duty views, served by `customuser.urls_async`.
+
+Reads (the slot state and the duty) go through the async ORM, writes run in a
+worker thread as they need a transaction. Responses match the DRF views in
+`duty_api.views`. `duty_events` streams duty changes as Server-Sent Events.
+`export_handler` streams exports without loading them in memory.
+"""
+import json
+from datetime import timedelta
+
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils import timezone
+
+from users.backends import aget_user
+from users.cache import afragment_context
+
+from . import events, export
+from .views import duty_etag, etag_matches
+from .serializers import DutySerializer, FastDutySerializer
+from .schedule import MARKS, UnknownSchedule
+from .state import DEFAULT_SLOT, DutyStateConflict
+from .models import (
+    DEFAULT_SCHEDULE_ID, Duty, DutyManager,
+    CannotStartOverOngoingDuty,
+    CannotClearUnfinishedDuty,
+    TaskAlreadySubmitted,
+    TaskNotOpen,
+    UnknownTask,
+)
+
+
+async def get_user_duty(user):
+    return await DutyManager.aduty_of(user)
+
+def get_slot_manager(duty):
+    return DutyManager(duty.slot if duty else DEFAULT_SLOT)
+
+def get_request_data(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return {}
+    return request.POST
+
+def failure(message, status):
+    return JsonResponse({'success': False, 'message': message}, status=status)
+
+# Boundaries announced by the event stream, in time order within a duty
+BOUNDARIES = MARKS + ('duty_end', )
+
+HEARTBEAT_SECONDS = 15
+
+# Django < 5.0 doesn't stop a stream when its client goes away, so streams end
+# by themselves and EventSource reconnects after RETRY_MILLISECONDS
+STREAM_SECONDS = 300
+RETRY_MILLISECONDS = 3000
+
+
+async def duty_view(request):
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    duty_manager = get_slot_manager(await get_user_duty(user))
+    # GET
+    if request.method == 'GET':
+        # duty slot is available to be started, a finished duty may not have
+        # been swept yet
+        duty = await duty_manager.aget_duty()
+        if (not duty) or (duty.duty_end < timezone.now()):
+            return render(request, 'start_duty.html', {'user': user})
+
+        # user is the one undertaking the duty
+        elif user == await duty_manager.aget_user():
+            return render(request, 'ongoing_duty.html', {
+                'user': user,
+                'duty': duty,
+                'events_url': reverse('duty-events'),
+                'fragments': await afragment_context(user),
+            })
+
+        # any other user has undertaken an ongoing duty currently
+        else:
+            pass
+
+async def duty_handler(request):
+    if request.method not in ('GET', 'POST', 'DELETE'):
+        return JsonResponse(
+            {'detail': 'Method "%s" not allowed.' % request.method}, status=405)
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        return JsonResponse(
+            {'detail': "Authentication credentials were not provided."}, status=403)
+
+    #############################################
+    ## Duty Start
+    #############################################
+
+    # POST
+    if request.method == 'POST':
+        data = get_request_data(request)
+        slot = data.get('slot', DEFAULT_SLOT)
+        if not isinstance(slot, str) or not 0 < len(slot) <= Duty.SLOT_MAX_LENGTH:
+            return failure("Invalid duty slot.", 400)
+
+        try:
+            schedule = int(data.get('template', DEFAULT_SCHEDULE_ID))
+        except (TypeError, ValueError):
+            schedule = None
+
+        duty_manager = DutyManager(slot)
+        try:
+            await duty_manager.astart_duty(user=user, schedule=schedule)
+        except (UnknownSchedule, CannotStartOverOngoingDuty) as e:
+            return failure(e.message, 400)
+        except DutyStateConflict as e:
+            return failure(e.message, 409)
+
+        duty = await duty_manager.aget_duty()
+        return JsonResponse(
+            {
+                'success': True,
+                'message': "%s created sucessfully" % duty,
+                'payload': DutySerializer(duty).data
+            },
+            status=201
+        )
+
+    #############################################
+    ## Duty Ongoing
+    #############################################
+
+    user_duty = await get_user_duty(user)
+    if not user_duty:
+        return failure("User has no ongoing duty at the moment.", 400)
+
+    duty_manager = get_slot_manager(user_duty)
+
+    # Http500 when the user's duty is no longer the slot's active one,
+    # the expiry sweeper (see duty_api.sweeper) deletes such duties
+    manager_user = await duty_manager.aget_user()
+    if user != manager_user:
+        return failure(
+            "User's duty is expired but not deleted. Request.user %s; Manager.user %s"
+                % (user.email, getattr(manager_user, 'email', None)),
+            500)
+
+    duty = await duty_manager.aget_duty()
+
+    # GET, answered with 304 when the client has the current payload
+    if request.method == 'GET':
+        etag = duty_etag(duty_manager.slot, await duty_manager.aget_version(), duty.pk, user)
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if etag_matches(request, etag):
+            return HttpResponseNotModified(headers=headers)
+
+        return JsonResponse(
+            {
+                'success': True,
+                'message': "%s sent" % duty,
+                'payload': FastDutySerializer(duty).data
+            },
+            status=200,
+            headers=headers
+        )
+
+    # DELETE
+    duty_str = str(duty)
+    try:
+        await duty_manager.aclear_duty()
+    except CannotClearUnfinishedDuty as e:
+        return failure(e.message, 400)
+    except DutyStateConflict as e:
+        return failure(e.message, 409)
+    return JsonResponse(
+        {
+            'success': True,
+            'message': "Duty deactivated.",
+            'payload': duty_str
+        }
+    )
+
+async def task_handler(request, task):
+    if request.method != 'POST':
+        return JsonResponse(
+            {'detail': 'Method "%s" not allowed.' % request.method}, status=405)
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        return JsonResponse(
+            {'detail': "Authentication credentials were not provided."}, status=403)
+
+    user_duty = await get_user_duty(user)
+    duty_manager = get_slot_manager(user_duty)
+    if not user_duty or user != await duty_manager.aget_user():
+        return failure("User has no ongoing duty at the moment.", 400)
+
+    try:
+        await duty_manager.asubmit_task(task)
+    except UnknownTask as e:
+        return failure(e.message, 404)
+    except (TaskAlreadySubmitted, TaskNotOpen) as e:
+        return failure(e.message, 400)
+    return JsonResponse(
+        {
+            'success': True,
+            'message': "Task %s submitted." % task,
+        },
+        status=202
+    )
+
+#############################################
+## Duty Events
+#############################################
+
+def format_event(name, duty, retry=None):
+    data = json.dumps({'duty': FastDutySerializer(duty).data if duty else None})
+    if retry is not None:
+        return 'event: %s\ndata: %s\nretry: %d\n\n' % (name, data, retry)
+    return 'event: %s\ndata: %s\n\n' % (name, data)
+
+def passed_boundaries(duty, since, until):
+    """Names of the boundaries of `duty` in (since, until], in time order.
+    """
+    if not duty:
+        return []
+    marks = [(getattr(duty, name), name) for name in BOUNDARIES]
+    return [name for when, name in sorted((when, name) for when, name in marks
+        if when is not None and since < when <= until)]
+
+def next_boundary(duty, after):
+    marks = [getattr(duty, name) for name in BOUNDARIES] if duty else []
+    marks = [when for when in marks if when is not None and when > after]
+    return min(marks) if marks else None
+
+async def stream_duty_events(duty_manager, heartbeat=HEARTBEAT_SECONDS, lifetime=STREAM_SECONDS):
+    """Yield the active duty of a slot, then every change to it as it happens.
+
+    Ends once the duty is cleared or after `lifetime` seconds, the client
+    reconnects to follow the slot further.
+    """
+    deadline = timezone.now() + timedelta(seconds=lifetime)
+    with events.hub.subscribe(duty_manager.slot) as subscription:
+        duty = await duty_manager.aget_duty()
+        checked = timezone.now()
+        yield format_event('duty', duty, retry=RETRY_MILLISECONDS)
+
+        while checked < deadline:
+            timeout = min(heartbeat, (deadline - checked).total_seconds())
+            boundary = next_boundary(duty, checked)
+            if boundary is not None:
+                timeout = min(timeout, max((boundary - timezone.now()).total_seconds(), 0))
+            event = await subscription.get(timeout)
+
+            # re-checking the shared state also catches other workers' changes
+            current = await duty_manager.aget_duty()
+            now = timezone.now()
+            # another worker's fast-forward reloads the same duty
+            same = current is not None and duty is not None and current.pk == duty.pk
+            sent = False
+            if event is not None:
+                yield format_event(event.name, current)
+                sent = True
+            elif same and current is not duty:
+                yield format_event(events.CHANGED, current)
+                sent = True
+            elif not same and current is not duty:
+                yield format_event(
+                    events.CLEARED if current is None else events.STARTED, current)
+                sent = True
+            if same:
+                for name in passed_boundaries(current, checked, now):
+                    yield format_event(name, current)
+                    sent = True
+            if duty is not None and current is None:
+                return
+            duty, checked = current, now
+
+            if not sent:
+                yield ': keepalive\n\n'
+
+async def duty_events(request):
+    """Server-Sent Events of the user's duty slot, or of `?slot=`.
+    """
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        return JsonResponse(
+            {'detail': "Authentication credentials were not provided."}, status=403)
+
+    user_duty = await get_user_duty(user)
+    slot = user_duty.slot if user_duty else request.GET.get('slot', DEFAULT_SLOT)
+    if not 0 < len(slot) <= Duty.SLOT_MAX_LENGTH:
+        return failure("Invalid duty slot.", 400)
+
+    response = StreamingHttpResponse(
+        stream_duty_events(DutyManager(slot)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # don't let nginx buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+#############################################
+## Duty Export
+#############################################
+
+async def export_handler(request):
+    """Every duty started in a month, see `duty_api.views.export_handler`.
+    """
+    if request.method != 'GET':
+        return JsonResponse(
+            {'detail': 'Method "%s" not allowed.' % request.method}, status=405)
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        return JsonResponse(
+            {'detail': "Authentication credentials were not provided."}, status=403)
+    if not user.is_staff:
+        return JsonResponse(
+            {'detail': "You do not have permission to perform this action."}, status=403)
+
+    output = request.GET.get('output', 'csv')
+    try:
+        bucket = export.parse_month(request.GET.get('month', ''))
+    except ValueError:
+        bucket = None
+    if bucket is None or output not in export.FORMATS:
+        return failure("Invalid export month or output.", 400)
+
+    # a sync iterator would be read whole before sending under ASGI
+    response = StreamingHttpResponse(
+        export.alines(export.render(export.export_rows(bucket), output)),
+        content_type=export.FORMATS[output])
+    response['Content-Disposition'] = 'attachment; filename="duties-%d.%s"' % (bucket, output)
+    return response
@@ -0,0 +1,104 @@
+"""In-process fan-out of duty events to Server-Sent Event streams.
+
+`DutyManager` and the sweeper publish an event whenever the active duty of a
+slot is started, changed or cleared; every open stream of that slot (see
+`duty_api.async_views.duty_events`) gets it on its own queue. Publishing is
+thread-safe, so sync code running in worker threads can publish to streams
+served by the event loop. Events only reach the streams of the same process;
+streams also re-check the shared duty state on every heartbeat, which picks up
+changes made by other workers.
+"""
+import asyncio
+import threading
+from collections import namedtuple
+
+
+DutyEvent = namedtuple('DutyEvent', ('slot', 'name', 'duty_id'))
+
+# Published by the duty managers, task boundaries are detected by the streams
+STARTED = 'started'
+CHANGED = 'changed'
+CLEARED = 'cleared'
+
+
+class Subscription(object):
+    """Queue of the events of one slot for one stream.
+    """
+
+    def __init__(self, hub, slot, maxsize):
+        self.hub = hub
+        self.slot = slot
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    async def get(self, timeout=None):
+        """Return the next event, None if none came within `timeout` seconds.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def offer(self, event):
+        # runs on the subscription's loop
+        if self.queue.full():
+            # the stream fell behind: drop the backlog, it only has to reload
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = DutyEvent(self.slot, CHANGED, None)
+        self.queue.put_nowait(event)
+
+
+class DutyEventHub(object):
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, slot):
+        """Subscribe the running event loop to the events of `slot`.
+
+        Returns:
+            Subscription: to be closed when the stream ends
+        """
+        subscription = Subscription(self, slot, self.maxsize)
+        with self._lock:
+            self._subscriptions.setdefault(slot, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.slot, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.slot, None)
+
+    def subscribers(self, slot):
+        with self._lock:
+            return len(self._subscriptions.get(slot, ()))
+
+    def publish(self, slot, name, duty_id=None):
+        """Send an event to every subscription of `slot`, from any thread.
+        """
+        event = DutyEvent(slot, name, duty_id)
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(slot, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # loop closed under a stream that didn't get to unsubscribe
+                self.unsubscribe(subscription)
+
+
+hub = DutyEventHub()
@@ -0,0 +1,136 @@
+"""Streaming exports of every duty of a month.
+
+`export_rows` walks the archived duties of the month and then the ones still
+active with `.iterator()`, a chunk of rows at a time and the user joined in,
+and the renderers turn each row into a line as it comes. Memory therefore
+stays flat however many duties are exported, whether the lines go to a
+`StreamingHttpResponse` or to a file from the `export_duties` command.
+Under ASGI `alines` hands the lines over in batches from the worker thread
+holding the database cursor.
+"""
+import csv
+import json
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from .models import Duty, DutyHistory
+
+
+FIELDS = (
+    'id', 'slot', 'user_email', 'duty_start', 'duty_end',
+    'is_task1_submitted', 'is_task2_submitted', 'is_task3_submitted',
+    'archived',
+)
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+CHUNK_SIZE = 2000
+
+# lines handed from the database thread to the event loop at once
+LINE_BATCH = 500
+
+
+def parse_month(value):
+    """Return the bucket (yyyymm) of a `YYYY-MM` month.
+
+    Raises:
+        ValueError: not a month
+    """
+    month = datetime.strptime(value, '%Y-%m')
+    return DutyHistory.bucket_of(month)
+
+def month_range(bucket):
+    """Return the [start, end) datetimes of a bucket, in UTC like `bucket_of`.
+    """
+    year, month = divmod(bucket, 100)
+    start = datetime(year, month, 1, tzinfo=dt_timezone.utc)
+    if month == 12:
+        return start, start.replace(year=year + 1, month=1)
+    return start, start.replace(month=month + 1)
+
+def export_rows(bucket, chunk_size=CHUNK_SIZE):
+    """Yield a dict of `FIELDS` for every duty started in the month `bucket`.
+
+    Archived duties come first, then the ones not cleared yet, each by start.
+    """
+    history = (DutyHistory.objects
+        .filter(bucket=bucket)
+        .select_related('user')
+        .order_by('duty_start', 'id'))
+    for duty in history.iterator(chunk_size=chunk_size):
+        yield row_of(duty, archived=True)
+
+    start, end = month_range(bucket)
+    active = (Duty.objects
+        .filter(duty_start__gte=start, duty_start__lt=end)
+        .select_related('user')
+        .order_by('duty_start', 'id'))
+    for duty in active.iterator(chunk_size=chunk_size):
+        yield row_of(duty, archived=False)
+
+def row_of(duty, archived):
+    return {
+        'id': duty.pk,
+        'slot': duty.slot,
+        'user_email': duty.user.email if duty.user_id else None,
+        'duty_start': duty.duty_start,
+        'duty_end': duty.duty_end,
+        'is_task1_submitted': duty.is_task1_submitted,
+        'is_task2_submitted': duty.is_task2_submitted,
+        'is_task3_submitted': duty.is_task3_submitted,
+        'archived': archived,
+    }
+
+################################
+# Renderers
+################################
+
+class Echo(object):
+    """File-like object handing back what is written, for `csv.writer`.
+    """
+
+    def write(self, value):
+        return value
+
+def csv_lines(rows):
+    """Render rows as CSV lines, header first.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        yield writer.writerow([
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in (row[name] for name in FIELDS)
+        ])
+
+def ndjson_lines(rows):
+    """Render rows as one JSON object per line.
+    """
+    for row in rows:
+        yield json.dumps(row, default=datetime.isoformat) + '\n'
+
+RENDERERS = {
+    'csv': csv_lines,
+    'ndjson': ndjson_lines,
+}
+
+def render(rows, output_format):
+    """Lines of `rows` in `output_format`, one of `FORMATS`.
+    """
+    return RENDERERS[output_format](rows)
+
+async def alines(lines, batch=LINE_BATCH):
+    """Async iterator over `lines`, read `batch` at a time in the database thread.
+    """
+    lines = iter(lines)
+    take = sync_to_async(lambda: list(islice(lines, batch)), thread_sensitive=True)
+    while True:
+        chunk = await take()
+        if not chunk:
+            return
+        yield ''.join(chunk)
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db import models
+
+
+class DerivedDateTimeField(models.DateTimeField):
+    """Datetime that can be derived from the rest of the row.
+
+    With `settings.DUTY_COMPACT_SCHEMA` on, the column is written as NULL and
+    the model fills the attribute in again when the row is loaded. The value
+    on the instance is left untouched either way.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('null', True)
+        super().__init__(*args, **kwargs)
+
+    def pre_save(self, model_instance, add):
+        value = super().pre_save(model_instance, add)
+        if getattr(settings, 'DUTY_COMPACT_SCHEMA', False):
+            return None
+        return value
@@ -0,0 +1,73 @@
+"""Request-scoped identity map.
+
+Holds the model instances and derived lookups (a user's duty, a slot's state
+version) loaded while serving one request, so each is read from the database
+at most once per request and every part of the request sees the same
+instance. The map is opened by `duty_api.middleware.IdentityMapMiddleware`;
+outside of a request `IdentityMap.current()` is None and callers load as
+usual.
+"""
+from contextvars import ContextVar
+
+
+_current = ContextVar('duty_api_identity_map', default=None)
+
+
+class IdentityMap(object):
+
+    def __init__(self):
+        self._instances = {}
+        self._lookups = {}
+
+    @staticmethod
+    def current():
+        """Return the identity map of the current request, if any.
+        """
+        return _current.get()
+
+    def activate(self):
+        return _current.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current.reset(token)
+
+    ################################
+    # Instances
+    ################################
+
+    def get(self, model, pk):
+        return self._instances.get((model._meta.concrete_model, pk))
+
+    def add(self, instance):
+        """Register `instance`, returns the instance already mapped for its pk if any.
+        """
+        key = (instance._meta.concrete_model, instance.pk)
+        return self._instances.setdefault(key, instance)
+
+    def discard(self, instance):
+        self._instances.pop((instance._meta.concrete_model, instance.pk), None)
+
+    ################################
+    # Lookups
+    ################################
+
+    def lookup(self, key, loader):
+        """Return the value remembered under `key`, calling `loader` the first time.
+        """
+        if key not in self._lookups:
+            self._lookups[key] = loader()
+        return self._lookups[key]
+
+    async def alookup(self, key, loader):
+        """Async `lookup()`, `loader` is a coroutine function.
+        """
+        if key not in self._lookups:
+            self._lookups[key] = await loader()
+        return self._lookups[key]
+
+    def remember(self, key, value):
+        self._lookups[key] = value
+
+    def forget(self, key):
+        self._lookups.pop(key, None)
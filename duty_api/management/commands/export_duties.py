@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from duty_api import export
+
+
+class Command(BaseCommand):
+    help = "Export every duty started in a month, with user email and task flags."
+
+    def add_arguments(self, parser):
+        parser.add_argument('month',
+            help="Month to export, as YYYY-MM.")
+        parser.add_argument('--format', dest='output', default='csv',
+            choices=sorted(export.FORMATS),
+            help="Output format.")
+        parser.add_argument('--output', dest='path', default='-',
+            help="File to write, - writes standard output.")
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE,
+            help="Rows fetched from the database at once.")
+
+    def handle(self, *args, **options):
+        try:
+            bucket = export.parse_month(options['month'])
+        except ValueError:
+            raise CommandError("Invalid month %r, expected YYYY-MM." % options['month'])
+
+        rows = export.export_rows(bucket, chunk_size=options['chunk_size'])
+        lines = export.render(rows, options['output'])
+        if options['path'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+        else:
+            with open(options['path'], 'w', newline='', encoding='utf-8') as f:
+                f.writelines(lines)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from duty_api.models import DutyStats
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily duty stats rollups from the whole duty history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+            help="History rows fetched from the database at once.")
+
+    def handle(self, *args, **options):
+        count = DutyStats.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write("Rolled up %d archived duties." % count)
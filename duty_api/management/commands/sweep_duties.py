@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from duty_api.sweeper import sweep_expired_duties
+
+
+class Command(BaseCommand):
+    help = "Clear duties that have passed their duty end."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+            help="Duties cleared per transaction.")
+        parser.add_argument('--interval', type=float, default=None,
+            help="Keep sweeping every INTERVAL seconds instead of once.")
+
+    def handle(self, *args, **options):
+        while True:
+            swept = sweep_expired_duties(batch_size=options['batch_size'])
+            self.stdout.write("Swept %d finished duties." % swept)
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
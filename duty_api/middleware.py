@@ -0,0 +1,31 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .identity import IdentityMap
+
+
+class IdentityMapMiddleware(object):
+    """Open a fresh `IdentityMap` for every request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = IdentityMap().activate()
+        try:
+            return self.get_response(request)
+        finally:
+            IdentityMap.deactivate(token)
+
+    async def __acall__(self, request):
+        token = IdentityMap().activate()
+        try:
+            return await self.get_response(request)
+        finally:
+            IdentityMap.deactivate(token)
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('duty_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DutyState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('duty', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='duty_api.duty')),
+            ],
+        ),
+    ]
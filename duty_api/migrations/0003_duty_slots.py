@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('duty_api', '0002_dutystate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='duty',
+            name='slot',
+            field=models.CharField(default='default', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='dutystate',
+            name='slot',
+            field=models.CharField(default='default', max_length=64, unique=True),
+        ),
+    ]
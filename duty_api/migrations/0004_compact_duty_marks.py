@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:35
+
+from django.db import migrations, models
+import duty_api.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('duty_api', '0003_duty_slots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='duty',
+            name='overrides',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='duty',
+            name='schedule',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='duty',
+            name='task1_end',
+            field=duty_api.fields.DerivedDateTimeField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='duty',
+            name='task1_start',
+            field=duty_api.fields.DerivedDateTimeField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='duty',
+            name='task2_end',
+            field=duty_api.fields.DerivedDateTimeField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='duty',
+            name='task2_start',
+            field=duty_api.fields.DerivedDateTimeField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='duty',
+            name='task3_end',
+            field=duty_api.fields.DerivedDateTimeField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='duty',
+            name='task3_start',
+            field=duty_api.fields.DerivedDateTimeField(editable=False, null=True),
+        ),
+    ]
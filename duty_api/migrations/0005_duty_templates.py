@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('duty_api', '0004_compact_duty_marks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DutyTemplate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=254, unique=True)),
+                ('duty_duration', models.PositiveIntegerField(help_text='Minutes')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DutyTemplateTask',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.PositiveIntegerField(help_text='Minutes from the duty start')),
+                ('window', models.PositiveIntegerField(help_text='Minutes')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='duty_api.dutytemplate')),
+            ],
+            options={
+                'ordering': ('start', 'id'),
+            },
+        ),
+    ]
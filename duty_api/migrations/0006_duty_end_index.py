@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('duty_api', '0005_duty_templates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='duty',
+            name='duty_end',
+            field=models.DateTimeField(db_index=True, editable=False),
+        ),
+    ]
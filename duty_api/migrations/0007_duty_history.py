@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('duty_api', '0006_duty_end_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DutyHistory',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('slot', models.CharField(max_length=64)),
+                ('bucket', models.PositiveIntegerField()),
+                ('duty_start', models.DateTimeField()),
+                ('duty_end', models.DateTimeField()),
+                ('schedule', models.PositiveSmallIntegerField()),
+                ('overrides', models.JSONField(default=list)),
+                ('is_task1_submitted', models.BooleanField(default=False)),
+                ('is_task2_submitted', models.BooleanField(default=False)),
+                ('is_task3_submitted', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duty_history', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'duty_start'], name='duty_api_du_user_id_6d22f0_idx'), models.Index(fields=['bucket', 'duty_start'], name='duty_api_du_bucket_a6abe3_idx')],
+            },
+        ),
+    ]
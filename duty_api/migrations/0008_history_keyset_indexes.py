@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('duty_api', '0007_duty_history'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='dutyhistory',
+            name='duty_api_du_user_id_6d22f0_idx',
+        ),
+        migrations.AddIndex(
+            model_name='dutyhistory',
+            index=models.Index(fields=['user', 'duty_start', 'id'], name='duty_api_du_user_id_ac36d0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dutyhistory',
+            index=models.Index(fields=['duty_start', 'id'], name='duty_api_du_duty_st_bcc87b_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('duty_api', '0008_history_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DutyDayStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('duties', models.PositiveIntegerField(default=0)),
+                ('task1_submitted', models.PositiveIntegerField(default=0)),
+                ('task2_submitted', models.PositiveIntegerField(default=0)),
+                ('task3_submitted', models.PositiveIntegerField(default=0)),
+                ('duration', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DutyUserDayStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('duties', models.PositiveIntegerField(default=0)),
+                ('task1_submitted', models.PositiveIntegerField(default=0)),
+                ('task2_submitted', models.PositiveIntegerField(default=0)),
+                ('task3_submitted', models.PositiveIntegerField(default=0)),
+                ('duration', models.BigIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duty_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dutydaystats',
+            constraint=models.UniqueConstraint(fields=('day',), name='duty_day_stats_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='dutyuserdaystats',
+            constraint=models.UniqueConstraint(fields=('user', 'day'), name='duty_user_day_stats_unique'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('duty_api', '0009_duty_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dutyhistory',
+            index=models.Index(fields=['schedule'], name='duty_api_du_schedul_d6976e_idx'),
+        ),
+    ]
@@ -1,11 +1,34 @@
+import copy
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from django.db import models
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, models, transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from django.utils.functional import cached_property
+
+from users.cache import expire_fragments
+
+from . import events
+from .fields import DerivedDateTimeField
+from .identity import IdentityMap
+from .schedule import (
+    MARKS, Schedule, UnknownSchedule,
+    get_schedule, invalidate_schedules, register_schedule,
+)
+from .submissions import get_submission_queue
+from .state import DEFAULT_SLOT, DutyStateConflict, StateSnapshot, get_state_backend
 
 User = get_user_model()
 
+DEFAULT_SCHEDULE_ID = 0
+
 class CannotStartOverOngoingDuty(Exception):
     def __init__(self):
         self.message = ("Existing duty is still ongoing and must be cleared first before"
@@ -25,6 +48,29 @@ class CannotClearUnfinishedDuty(Exception):
             "duty to finish at %s or force clear." % duty_end)
         super().__init__(self.message)
 
+class UnknownTask(Exception):
+    def __init__(self, task):
+        self.message = "Duty has no submittable task %s." % task
+        super().__init__(self.message)
+
+class TaskAlreadySubmitted(Exception):
+    def __init__(self, task):
+        self.message = "Task %s has already been submitted." % task
+        super().__init__(self.message)
+
+class TemplateInUse(Exception):
+    def __init__(self, template_id):
+        self.message = ("Duty template %s is used by duties, add a new template instead."
+            % template_id)
+        super().__init__(self.message)
+
+class TaskNotOpen(Exception):
+    def __init__(self, task, start=None, end=None):
+        window = ("|UNKNOWN|" if not start else
+            "|{: %d %b %Y, %H:%M:%S}| to |{: %d %b %Y, %H:%M:%S}|".format(start, end))
+        self.message = "Task %s can only be submitted from %s." % (task, window)
+        super().__init__(self.message)
+
 class Duty(models.Model):
     # Task time constant (minutes)
     TASK_WINDOW = 30
@@ -35,20 +81,31 @@ class Duty(models.Model):
     # Duty Duration
     DUTY_DURATION = 180
 
+    SLOT_MAX_LENGTH = 64
+
+    # Tasks with a submission flag
+    SUBMITTABLE_TASKS = (1, 2, 3)
+
     user = models.OneToOneField("users.User", null=True,
         on_delete=models.SET_NULL)
+    slot = models.CharField(max_length=SLOT_MAX_LENGTH, default=DEFAULT_SLOT, editable=False)
     
     _behalf = None
 
     duty_start = models.DateTimeField(editable=False)
-    task1_start = models.DateTimeField(editable=False)
-    task2_start = models.DateTimeField(editable=False)
-    task3_start = models.DateTimeField(editable=False)
+    task1_start = DerivedDateTimeField(editable=False)
+    task2_start = DerivedDateTimeField(editable=False)
+    task3_start = DerivedDateTimeField(editable=False)
 
-    duty_end =  models.DateTimeField(editable=False)
-    task1_end = models.DateTimeField(editable=False)
-    task2_end = models.DateTimeField(editable=False)
-    task3_end = models.DateTimeField(editable=False)
+    duty_end =  models.DateTimeField(editable=False, db_index=True)
+    task1_end = DerivedDateTimeField(editable=False)
+    task2_end = DerivedDateTimeField(editable=False)
+    task3_end = DerivedDateTimeField(editable=False)
+
+    # Task marks are `schedule` offsets from duty_start plus `overrides`,
+    # see duty_api.schedule
+    schedule = models.PositiveSmallIntegerField(default=DEFAULT_SCHEDULE_ID, editable=False)
+    overrides = models.JSONField(default=list, editable=False)
 
     is_task1_submitted = models.BooleanField(default=False, null=False)
     is_task2_submitted = models.BooleanField(default=False, null=False)
@@ -78,21 +135,95 @@ class Duty(models.Model):
             return ("Duty Instance from time |{: %d %b %Y, %H:%M:%S}| to "
             "|{: %d %b %Y, %H:%M:%S}| by {}".format(self.duty_start, self.duty_end, self.user.name))
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Duty, cls).from_db(db, field_names, values)
+        instance._derive_marks()
+        instance._mark_clean()
+        return instance
+
+    ################################
+    # Dirty fields
+    ################################
+
+    def _mark_clean(self, fields=None):
+        # remember the loaded value of every (or the given) concrete field
+        loaded = self.__dict__
+        if not hasattr(self, '_clean'):
+            self._clean = {}
+        for field in self._meta.concrete_fields:
+            if field.attname in loaded and (fields is None or field.attname in fields
+                    or field.name in fields):
+                self._clean[field.attname] = copy.deepcopy(loaded[field.attname])
+
+    @property
+    def dirty_fields(self):
+        """Names of the loaded fields changed since the duty was read or saved.
+        """
+        clean = getattr(self, '_clean', {})
+        loaded = self.__dict__
+        return {field.name for field in self._meta.concrete_fields
+            if field.attname in clean and loaded.get(field.attname) != clean[field.attname]}
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._mark_clean(fields)
+
+    def _derive_marks(self):
+        # marks stored as NULL by the compact schema, skip deferred fields
+        loaded = self.__dict__
+        missing = [name for name in MARKS if name in loaded and loaded[name] is None]
+        if (not missing or loaded.get('duty_start') is None
+                or 'overrides' not in loaded or 'schedule' not in loaded):
+            return
+        marks = get_schedule(self.schedule).marks(self.duty_start, self.overrides)
+        for name in missing:
+            setattr(self, name, marks.get(name))
+
     def save(self, *args, **kwargs):
+        schedule = get_schedule(self.schedule)
         # Creation
         if not self.id:
-            # Starting marker
+            # Starting & ending marker
             self.duty_start = timezone.now()
-            self.task1_start = self.duty_start + timedelta(minutes=Duty.TASK1_MARK)
-            self.task2_start = self.duty_start + timedelta(minutes=Duty.TASK2_MARK)
-            self.task3_start = self.duty_start + timedelta(minutes=Duty.TASK3_MARK)
-            # Ending marker
-            self.duty_end = self.duty_start + timedelta(minutes=Duty.DUTY_DURATION)
-            self.task1_end = self.task1_start + timedelta(minutes=Duty.TASK_WINDOW)
-            self.task2_end = self.task2_start + timedelta(minutes=Duty.TASK_WINDOW)
-            self.task3_end = self.task3_start + timedelta(minutes=Duty.TASK_WINDOW)
+            self.duty_end = self.duty_start + schedule.duration
+            for name, value in schedule.marks(self.duty_start).items():
+                setattr(self, name, value)
+
+        self.overrides = schedule.overrides(self.duty_start,
+            {name: getattr(self, name) for name in MARKS})
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields).intersection(MARKS):
+            kwargs['update_fields'] = set(update_fields) | {'overrides'}
+
+        # a loaded duty only writes the columns that changed
+        elif (update_fields is None and not self._state.adding
+                and not kwargs.get('force_insert') and hasattr(self, '_clean')):
+            update_fields = self.dirty_fields
+            if not update_fields:
+                return
+            kwargs['update_fields'] = update_fields
+
+        super(Duty, self).save(*args, **kwargs)
+        self._mark_clean(kwargs.get('update_fields'))
 
-        return super(Duty, self).save(*args, **kwargs)
+    @property
+    def task_windows(self):
+        """(start, end) of every task of the duty's schedule, in order.
+        """
+        windows = get_schedule(self.schedule).windows(self.duty_start, self.overrides)
+        # first tasks may have been moved in their columns since last save
+        for index, name in enumerate(MARKS[:2 * len(windows):2]):
+            windows[index] = (getattr(self, name), getattr(self, MARKS[2 * index + 1]))
+        return windows
+
+    def task_window(self, task):
+        return getattr(self, 'task%d_start' % task), getattr(self, 'task%d_end' % task)
+
+    def is_task_open(self, task, when=None):
+        start, end = self.task_window(task)
+        when = when or timezone.now()
+        return start is not None and start <= when < end
 
     def update_tasks_end(self, task1_end=None, task2_end=None, task3_end=None):
         self.task1_end = task1_end if not None else self.task1_end
@@ -100,45 +231,595 @@ class Duty(models.Model):
         self.task3_end = task3_end if not None else self.task3_end
 
     def update_duty_end(self, duty_end):
-        if self.task1_end < duty_end:
+        # schedules with fewer tasks leave the remaining columns empty
+        if self.task1_end and self.task1_end < duty_end:
             self.task1_end = duty_end
-        if self.task2_end < duty_end:
+        if self.task2_end and self.task2_end < duty_end:
             self.task2_end = duty_end
-        if self.task3_end < duty_end:
+        if self.task3_end and self.task3_end < duty_end:
             self.task3_end = duty_end
         
         self.duty_end = duty_end
 
+register_schedule(Schedule.from_minutes(DEFAULT_SCHEDULE_ID,
+    [(mark, Duty.TASK_WINDOW) for mark in (Duty.TASK1_MARK, Duty.TASK2_MARK, Duty.TASK3_MARK)],
+    Duty.DUTY_DURATION))
+
+@receiver(post_save, sender=Duty)
+def duty_changed(instance, **kwargs):
+    # deleted duties aren't rendered, the next duty of the user is saved anyway
+    if instance.user_id is not None:
+        expire_fragments(instance.user_id)
+
 ##################################################################################
 
-# Singleton
+class DutyTemplateQuerySet(models.QuerySet):
+
+    def used(self):
+        """Templates that duties, live or archived, derive their marks from.
+        """
+        return self.filter(
+            Exists(Duty.objects.filter(schedule=OuterRef('pk')))
+            | Exists(DutyHistory.objects.filter(schedule=OuterRef('pk'))))
+
+    def delete(self):
+        used = self.used().values_list('pk', flat=True).first()
+        if used is not None:
+            raise TemplateInUse(used)
+        return super().delete()
+
+class DutyTemplate(models.Model):
+    """Configurable duty schedule with any number of tasks.
+
+    Duties and their history rows refer to their template by id through
+    `schedule` and derive their marks from it, so the duration and tasks of
+    a template in use can't be changed and it can't be deleted
+    (`TemplateInUse`): add a new one instead.
+    """
+    name = models.CharField(max_length=254, unique=True)
+    duty_duration = models.PositiveIntegerField(help_text="Minutes")
+
+    objects = DutyTemplateQuerySet.as_manager()
+
+    def __str__(self):
+        return "Duty Template {} ({} tasks over {} minutes)".format(
+            self.name, len(self.tasks.all()), self.duty_duration)
+
+    def save(self, *args, **kwargs):
+        # the name is only a label, the duration is part of the schedule
+        if self.pk is not None:
+            duration = DutyTemplate.objects.filter(pk=self.pk).values_list(
+                'duty_duration', flat=True).first()
+            if duration not in (None, self.duty_duration) and self.in_use():
+                raise TemplateInUse(self.pk)
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        if self.in_use():
+            raise TemplateInUse(self.pk)
+        return super().delete(*args, **kwargs)
+
+    def in_use(self):
+        return self.pk is not None and DutyTemplate.objects.used().filter(pk=self.pk).exists()
+
+    def to_schedule(self):
+        return Schedule.from_minutes(self.pk,
+            [(task.start, task.window) for task in self.tasks.all()],
+            self.duty_duration)
+
+class DutyTemplateTask(models.Model):
+    template = models.ForeignKey(DutyTemplate, related_name='tasks',
+        on_delete=models.CASCADE)
+    start = models.PositiveIntegerField(help_text="Minutes from the duty start")
+    window = models.PositiveIntegerField(help_text="Minutes")
+
+    class Meta:
+        ordering = ('start', 'id')
+
+    def save(self, *args, **kwargs):
+        if DutyTemplate(pk=self.template_id).in_use():
+            raise TemplateInUse(self.template_id)
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        if DutyTemplate(pk=self.template_id).in_use():
+            raise TemplateInUse(self.template_id)
+        return super().delete(*args, **kwargs)
+
+@receiver((post_save, post_delete), sender=DutyTemplate)
+@receiver((post_save, post_delete), sender=DutyTemplateTask)
+def template_changed(**kwargs):
+    invalidate_schedules()
+
+##################################################################################
+
+class DutyHistoryManager(models.Manager):
+
+    def archive(self, duties, now=None, batch_size=500):
+        """Append finished or cleared duties to the history in bulk.
+
+        Duties keep their id, so archiving the same duty twice is a no-op.
+        A duty cleared before its end is recorded as ending at `now`. The
+        stats rollups are updated with the duties actually appended.
+        """
+        now = now or timezone.now()
+        history = [
+            self.model(
+                id=duty.pk,
+                user_id=duty.user_id,
+                slot=duty.slot,
+                bucket=DutyHistory.bucket_of(duty.duty_start),
+                duty_start=duty.duty_start,
+                duty_end=min(duty.duty_end, now),
+                schedule=duty.schedule,
+                overrides=duty.overrides,
+                is_task1_submitted=duty.is_task1_submitted,
+                is_task2_submitted=duty.is_task2_submitted,
+                is_task3_submitted=duty.is_task3_submitted,
+            ) for duty in duties
+        ]
+        # history and rollups commit together, without a savepoint of their own
+        with transaction.atomic(savepoint=False):
+            archived = set(self.filter(pk__in=[row.pk for row in history])
+                .values_list('pk', flat=True))
+            history = [row for row in history if row.pk not in archived]
+            self.bulk_create(history, batch_size=batch_size, ignore_conflicts=True)
+            DutyStats.add_history(history)
+        return history
+
+class DutyHistory(models.Model):
+    """Append-only record of every cleared duty.
+
+    Rows are written once, in bulk, by `DutyHistory.objects.archive` and
+    stored compactly: task marks are derived from `schedule` and `overrides`
+    like compact duties. `bucket` (yyyymm of the duty start) groups rows by
+    month for range scans and partitioning.
+    """
+    id = models.IntegerField(primary_key=True)
+    user = models.ForeignKey("users.User", null=True, related_name='duty_history',
+        on_delete=models.SET_NULL)
+    slot = models.CharField(max_length=Duty.SLOT_MAX_LENGTH)
+    bucket = models.PositiveIntegerField()
+
+    duty_start = models.DateTimeField()
+    duty_end = models.DateTimeField()
+    schedule = models.PositiveSmallIntegerField()
+    overrides = models.JSONField(default=list)
+
+    is_task1_submitted = models.BooleanField(default=False)
+    is_task2_submitted = models.BooleanField(default=False)
+    is_task3_submitted = models.BooleanField(default=False)
+
+    objects = DutyHistoryManager()
+
+    class Meta:
+        # (duty_start, id) keys the keyset pagination of the history API
+        indexes = [
+            models.Index(fields=['user', 'duty_start', 'id']),
+            models.Index(fields=['duty_start', 'id']),
+            models.Index(fields=['bucket', 'duty_start']),
+            # templates used by archived duties are kept, see DutyTemplate
+            models.Index(fields=['schedule']),
+        ]
+
+    def __str__(self):
+        return ("Archived Duty from time |{: %d %b %Y, %H:%M:%S}| to "
+            "|{: %d %b %Y, %H:%M:%S}|".format(self.duty_start, self.duty_end))
+
+    @staticmethod
+    def bucket_of(when):
+        return when.year * 100 + when.month
+
+    @cached_property
+    def marks(self):
+        """Task marks of the archived duty, see `Duty.task_windows`.
+
+        Empty if the template was deleted before templates in use were kept.
+        """
+        try:
+            return get_schedule(self.schedule).marks(self.duty_start, self.overrides)
+        except UnknownSchedule:
+            return {}
+
+##################################################################################
+
+class DutyStatsManager(models.Manager):
+
+    def add(self, key, counts):
+        """Add `counts` to the row matching `key`, creating it if needed.
+        """
+        updates = {name: models.F(name) + value for name, value in counts.items()}
+        if self.filter(**key).update(**updates):
+            return
+        try:
+            with transaction.atomic():
+                self.create(**key, **counts)
+        except IntegrityError:
+            # created meanwhile by another worker
+            self.filter(**key).update(**updates)
+
+    def add_all(self, key_fields, totals):
+        """Add counters to many rows in a bounded number of queries.
+
+        Must run in a transaction, the existing rows are locked while updated.
+
+        Args:
+            key_fields (tuple): attnames identifying a row
+            totals (dict): tuple of `key_fields` values to counts to add
+        """
+        if not totals:
+            return
+        lookups = {'%s__in' % name: {key[index] for key in totals}
+            for index, name in enumerate(key_fields)}
+        rows = {}
+        for row in self.select_for_update().filter(**lookups):
+            key = tuple(getattr(row, name) for name in key_fields)
+            if key in totals:
+                for name, value in totals[key].items():
+                    setattr(row, name, getattr(row, name) + value)
+                rows[key] = row
+        if rows:
+            self.bulk_update(rows.values(), self.model.COUNTERS)
+
+        missing = [key for key in totals if key not in rows]
+        if not missing:
+            return
+        try:
+            with transaction.atomic():
+                self.bulk_create([self.model(**dict(zip(key_fields, key)), **totals[key])
+                    for key in missing])
+        except IntegrityError:
+            # some were created meanwhile by another worker
+            for key in missing:
+                self.add(dict(zip(key_fields, key)), totals[key])
+
+class DutyStats(models.Model):
+    """Counters of the duties archived for a day, rolled up as they are archived.
+
+    Days are local dates (TIME_ZONE) of the duty start. `duration` sums the
+    actual durations, cut short by `update_duty_end` or clearing, in seconds.
+    Rates and averages are derived from the counters on read, see `summary`.
+    """
+    day = models.DateField()
+    duties = models.PositiveIntegerField(default=0)
+    task1_submitted = models.PositiveIntegerField(default=0)
+    task2_submitted = models.PositiveIntegerField(default=0)
+    task3_submitted = models.PositiveIntegerField(default=0)
+    duration = models.BigIntegerField(default=0)
+
+    COUNTERS = ('duties', 'task1_submitted', 'task2_submitted', 'task3_submitted', 'duration')
+
+    objects = DutyStatsManager()
+
+    class Meta:
+        abstract = True
+
+    @staticmethod
+    def day_of(when):
+        return timezone.localdate(when, timezone.get_default_timezone())
+
+    @classmethod
+    def tally(cls, history):
+        """Sum the counters of archived duties per day and per (user, day).
+
+        Returns:
+            tuple: {(day,): counts}, {(user_id, day): counts}
+        """
+        days, user_days = {}, {}
+        for duty in history:
+            day = cls.day_of(duty.duty_start)
+            counts = (1, int(duty.is_task1_submitted), int(duty.is_task2_submitted),
+                int(duty.is_task3_submitted),
+                int((duty.duty_end - duty.duty_start).total_seconds()))
+            keys = [(days, (day, ))]
+            if duty.user_id is not None:
+                keys.append((user_days, (duty.user_id, day)))
+            for totals, key in keys:
+                totals[key] = [a + b for a, b in zip(totals.get(key, (0, ) * 5), counts)]
+        return (
+            {key: dict(zip(cls.COUNTERS, counts)) for key, counts in days.items()},
+            {key: dict(zip(cls.COUNTERS, counts)) for key, counts in user_days.items()},
+        )
+
+    @classmethod
+    def add_history(cls, history):
+        """Roll newly archived duties up into the stats tables.
+        """
+        days, user_days = cls.tally(history)
+        DutyDayStats.objects.add_all(('day', ), days)
+        DutyUserDayStats.objects.add_all(('user_id', 'day'), user_days)
+
+    @classmethod
+    def rebuild(cls, chunk_size=2000):
+        """Recompute both stats tables from the whole history.
+
+        The rollups are deleted before the history is read, in the same
+        transaction: archiving that commits first is read, archiving after
+        waits on the deleted rows and adds to the rebuilt ones.
+
+        Returns:
+            int: number of archived duties rolled up
+        """
+        count = 0
+        def counted(rows):
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield row
+
+        with transaction.atomic():
+            DutyDayStats.objects.all().delete()
+            DutyUserDayStats.objects.all().delete()
+            history = DutyHistory.objects.only(
+                'user', 'duty_start', 'duty_end',
+                'is_task1_submitted', 'is_task2_submitted', 'is_task3_submitted',
+            ).iterator(chunk_size=chunk_size)
+            days, user_days = cls.tally(counted(history))
+            DutyDayStats.objects.bulk_create([
+                DutyDayStats(day=day, **counts) for (day, ), counts in days.items()
+            ], batch_size=chunk_size)
+            DutyUserDayStats.objects.bulk_create([
+                DutyUserDayStats(user_id=user_id, day=day, **counts)
+                for (user_id, day), counts in user_days.items()
+            ], batch_size=chunk_size)
+        return count
+
+    @staticmethod
+    def summarize(counts):
+        """Task completion rates and average duration of summed counters.
+        """
+        duties = counts['duties'] or None
+        return {
+            'duties': counts['duties'],
+            'task1_rate': duties and counts['task1_submitted'] / duties,
+            'task2_rate': duties and counts['task2_submitted'] / duties,
+            'task3_rate': duties and counts['task3_submitted'] / duties,
+            'average_duration': duties and counts['duration'] / duties,
+        }
+
+    def summary(self):
+        return dict(day=self.day, **self.summarize(
+            {name: getattr(self, name) for name in self.COUNTERS}))
+
+class DutyDayStats(DutyStats):
+    """Stats of every duty of a day.
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day'], name='duty_day_stats_unique'),
+        ]
+
+class DutyUserDayStats(DutyStats):
+    """Stats of the duties of one user on a day.
+    """
+    user = models.ForeignKey("users.User", related_name='duty_stats',
+        on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='duty_user_day_stats_unique'),
+        ]
+
+##################################################################################
+
+class DutyState(models.Model):
+    """Shared pointer to the active duty of a slot, see `duty_api.state`.
+    """
+    slot = models.CharField(max_length=Duty.SLOT_MAX_LENGTH, unique=True,
+        default=DEFAULT_SLOT)
+    duty = models.ForeignKey(Duty, null=True, related_name='+',
+        on_delete=models.DO_NOTHING, db_constraint=False)
+    version = models.PositiveIntegerField(default=0)
+
+##################################################################################
+
+# Singleton per slot
 class DutyManager(object):
+    """Process-wide handle on the active duty of a slot.
+
+    The duty itself lives in the configured state backend so that every worker
+    sees the same one; the manager only caches it for as long as the backend's
+    version stamp doesn't move.
+
+    Slots are named by clients, so only the `max_instances` most recently used
+    managers are kept; a slot asked for again after that gets a new manager
+    that reads the shared state afresh.
+    """
     instance = None
+    instances = OrderedDict()
+    max_instances = 128
+    _instances_lock = threading.Lock()
+
+    slot = DEFAULT_SLOT
+    # (version, duty) replaced in one assignment, the manager is shared by the
+    # threads of the process
+    _cached = (None, None)
+
+    def __new__(cls, slot=DEFAULT_SLOT):
+        with cls._instances_lock:
+            manager = cls.instances.get(slot)
+            if manager is None:
+                manager = object.__new__(cls)
+                manager.slot = slot
+                if slot == DEFAULT_SLOT:
+                    cls.instance = manager
+                while len(cls.instances) >= cls.max_instances:
+                    cls.instances.popitem(last=False)
+                cls.instances[slot] = manager
+            else:
+                cls.instances.move_to_end(slot)
+        return manager
+
+    @classmethod
+    def _managers(cls):
+        with cls._instances_lock:
+            return list(cls.instances.values())
 
-    def __new__(cls, *args, **kwargs):
-        if cls.instance:
-            return cls.instance
-        else:
-            cls.instance = object.__new__(cls, *args, **kwargs)
-            return cls.instance
+    @property
+    def backend(self):
+        return get_state_backend()
 
     @property
     def duty(self):
-        if not hasattr(self, '_duty'):
-            self._duty = None
-        return self._duty
-
-    @duty.setter
-    def duty(self, new_duty):
-        self._duty = new_duty
+        return self._load()[1]
 
     @property
     def user(self):
-        if not hasattr(self, '_duty'):
-            self._duty = None
-        if not self._duty:
+        duty = self.duty
+        if not duty:
+            return None
+        return duty.user
+
+    @property
+    def version(self):
+        """Version stamp of the slot, it changes whenever the active duty does.
+        """
+        return self._current_version()
+
+    @classmethod
+    def duty_of(cls, user):
+        """Return the duty held by `user`, active or not, None if there is none.
+
+        The active duty of a slot is usually cached by its manager already, so
+        only a user without one costs the reverse one-to-one query.
+        """
+        identity_map = IdentityMap.current()
+        if identity_map is None:
+            return cls._duty_of(user)
+        identity_map.add(user)
+        return identity_map.lookup(('duty', user.pk), lambda: cls._duty_of(user))
+
+    @classmethod
+    def _duty_of(cls, user):
+        for manager in cls._managers():
+            _, duty = manager._cached
+            if duty is not None and duty.user_id == user.pk:
+                duty = manager.duty
+                if duty is not None and duty.user_id == user.pk:
+                    return duty
+                break
+        try:
+            return user.duty
+        except Duty.DoesNotExist:
+            return None
+
+    def _current_version(self):
+        # the version stamp is read once per request, see duty_api.identity
+        identity_map = IdentityMap.current()
+        if identity_map is None:
+            return self.backend.version(self.slot)
+        return identity_map.lookup(
+            ('version', self.slot), lambda: self.backend.version(self.slot))
+
+    def _load(self):
+        cached = self._cached
+        if self._current_version() != cached[0]:
+            state = self.backend.read(self.slot)
+            cached = (state.version, self._fetch(state))
+            self._remember(*cached)
+        return cached
+
+    def _remember(self, version, duty):
+        self._cached = (version, duty)
+        identity_map = IdentityMap.current()
+        if identity_map is not None:
+            identity_map.remember(('version', self.slot), version)
+
+    def _fetch(self, state):
+        duty_id = state.duty_id
+        if duty_id is None:
             return None
-        return self._duty.user
+        # the cached duty is only current if the state hasn't moved since
+        version, cached = self._cached
+        if state.version == version and cached and cached.pk == duty_id:
+            return cached
+        identity_map = IdentityMap.current()
+        duty = identity_map and identity_map.get(Duty, duty_id)
+        if duty is None:
+            duty = Duty.objects.select_related('user').filter(pk=duty_id).first()
+            if duty is not None and identity_map is not None:
+                identity_map.add(duty)
+                duty.user = identity_map.add(duty.user)
+        return duty
+
+    ################################
+    # Async access
+    ################################
+
+    async def aget_duty(self):
+        """Async `duty`, reads the state and the duty with the async ORM.
+        """
+        cached = self._cached
+        if await self._acurrent_version() != cached[0]:
+            state = await self.backend.aread(self.slot)
+            cached = (state.version, await self._afetch(state))
+            self._remember(*cached)
+        return cached[1]
+
+    async def aget_version(self):
+        """Async `version`.
+        """
+        return await self._acurrent_version()
+
+    async def aget_user(self):
+        duty = await self.aget_duty()
+        return duty.user if duty else None
+
+    @classmethod
+    async def aduty_of(cls, user):
+        """Async `duty_of()`.
+        """
+        identity_map = IdentityMap.current()
+        if identity_map is None:
+            return await cls._aduty_of(user)
+        identity_map.add(user)
+        return await identity_map.alookup(('duty', user.pk), lambda: cls._aduty_of(user))
+
+    @classmethod
+    async def _aduty_of(cls, user):
+        for manager in cls._managers():
+            _, duty = manager._cached
+            if duty is not None and duty.user_id == user.pk:
+                duty = await manager.aget_duty()
+                if duty is not None and duty.user_id == user.pk:
+                    return duty
+                break
+        duty = await Duty.objects.filter(user_id=user.pk).afirst()
+        if duty is not None:
+            duty.user = user
+        return duty
+
+    async def _acurrent_version(self):
+        identity_map = IdentityMap.current()
+        if identity_map is None:
+            return await self.backend.aversion(self.slot)
+        return await identity_map.alookup(
+            ('version', self.slot), lambda: self.backend.aversion(self.slot))
+
+    async def _afetch(self, state):
+        duty_id = state.duty_id
+        if duty_id is None:
+            return None
+        # the cached duty is only current if the state hasn't moved since
+        version, cached = self._cached
+        if state.version == version and cached and cached.pk == duty_id:
+            return cached
+        identity_map = IdentityMap.current()
+        duty = identity_map and identity_map.get(Duty, duty_id)
+        if duty is None:
+            duty = await Duty.objects.select_related('user').filter(pk=duty_id).afirst()
+            if duty is not None and identity_map is not None:
+                identity_map.add(duty)
+                duty.user = identity_map.add(duty.user)
+        return duty
+
+    # writes need transactions, which the async ORM doesn't support yet
+    async def astart_duty(self, user, schedule=DEFAULT_SCHEDULE_ID):
+        return await sync_to_async(self.start_duty)(user, schedule)
+
+    async def aclear_duty(self):
+        return await sync_to_async(self.clear_duty)()
 
     ################################
     # Duty status
@@ -151,34 +832,129 @@ class DutyManager(object):
     # Duty managements
     ################################
 
-    def start_duty(self, user):
-        if self.duty:
+    def start_duty(self, user, schedule=DEFAULT_SCHEDULE_ID):
+        get_schedule(schedule)
+        state = self.backend.read(self.slot)
+        if state.duty_id is not None:
             raise CannotStartOverOngoingDuty
-        self._duty = Duty.objects.create(user=user)
-        self._duty.save()
+        with self._swapping() as swap:
+            try:
+                with transaction.atomic():
+                    duty = Duty.objects.create(user=user, slot=self.slot, schedule=schedule)
+            except IntegrityError:
+                # user already holds a duty, created by a concurrent request
+                raise DutyStateConflict
+            state = swap(state, duty.pk)
+            self._publish(events.STARTED, duty.pk)
+        self._remember(state.version, duty)
+        identity_map = IdentityMap.current()
+        if identity_map is not None:
+            identity_map.remember(('duty', user.pk), identity_map.add(duty))
 
     def clear_duty(self):
-        if self.duty.duty_end >= timezone.now():
+        version, duty = self._load()
+        if duty.duty_end >= timezone.now():
             raise CannotClearUnfinishedDuty
-        self._clear()
-
-    def _clear(self):
-        if self.duty:
-            user = self.user
-            self.duty.delete()
-
-            user.duty = None
-            user.save()
-        
-        self._duty = None
+        self._clear(StateSnapshot(duty.pk, version))
+
+    def _clear(self, state=None):
+        state = state or self.backend.read(self.slot)
+        if state.duty_id is not None:
+            with self._swapping() as swap:
+                duty = self._fetch(state)
+                state = swap(state, None)
+                self._publish(events.CLEARED, duty and duty.pk)
+                if duty:
+                    self._merge_submissions(duty)
+                    DutyHistory.objects.archive([duty])
+                    identity_map = IdentityMap.current()
+                    if identity_map is not None:
+                        identity_map.discard(duty)
+                        identity_map.forget(('duty', duty.user_id))
+                    duty.delete()
+
+                    # drop the cached reverse relation, nothing to save
+                    if duty.user:
+                        duty.user.duty = None
+
+        self._remember(state.version, None)
+
+    @staticmethod
+    def _merge_submissions(duty):
+        # queued submissions of this worker are set on `duty` only, those of
+        # other workers only in the row, which `duty` may be older than
+        flags = ['is_task%d_submitted' % task for task in Duty.SUBMITTABLE_TASKS]
+        row = Duty.objects.select_for_update().filter(pk=duty.pk).values_list(*flags).first()
+        for flag, submitted in zip(flags, row or ()):
+            if submitted:
+                setattr(duty, flag, True)
 
     def force_fast_forward_duty(self, next_minutes=0):
-        if self.duty:
+        version, duty = self._load()
+        if duty:
             nxt = timezone.now() + timedelta(minutes=next_minutes)
-            self.duty.update_duty_end(nxt)
+            with self._swapping() as swap:
+                state = swap(StateSnapshot(duty.pk, version), duty.pk)
+                duty.update_duty_end(nxt)
+                duty.save()
+                self._publish(events.CHANGED, duty.pk)
+            self._remember(state.version, duty)
+
+    def submit_task(self, task):
+        """Submit `task` of the active duty if its window is open.
+
+        The window is checked against the cached duty and the flag is set on
+        it right away; the row is updated by the submission queue.
+        """
+        if task not in Duty.SUBMITTABLE_TASKS:
+            raise UnknownTask(task)
+        duty = self.duty
+        flag = 'is_task%d_submitted' % task
+        if getattr(duty, flag):
+            raise TaskAlreadySubmitted(task)
+        if not duty.is_task_open(task):
+            raise TaskNotOpen(task, *duty.task_window(task))
+        setattr(duty, flag, True)
+        get_submission_queue().submit(duty.pk, task)
+
+    async def asubmit_task(self, task):
+        return await sync_to_async(self.submit_task)(task)
+
+    @contextmanager
+    def _swapping(self):
+        """`transaction.atomic()` yielding `swap(state, duty_id)`, which swaps
+        the slot from `state` to `duty_id` for as long as the transaction
+        holds.
+
+        A backend outside the database keeps its swap when the transaction
+        rolls back, or fails to commit, so the swap is undone by swapping the
+        state back. Only the transaction of the block is covered, the
+        manager's writes don't run in an outer one.
+        """
+        swapped = []
+
+        def swap(state, duty_id):
+            new_state = self.backend.compare_and_swap(self.slot, state.version, duty_id)
+            swapped.append((state, new_state))
+            return new_state
+
+        try:
+            with transaction.atomic():
+                yield swap
+        except BaseException:
+            if swapped and not self.backend.transactional:
+                state, new_state = swapped[-1]
+                try:
+                    self.backend.compare_and_swap(self.slot, new_state.version, state.duty_id)
+                except DutyStateConflict:
+                    # moved on since, by a write of its own
+                    pass
+            raise
+
+    def _publish(self, name, duty_id):
+        # streams reload the duty, so only tell them once it's committed
+        transaction.on_commit(lambda: events.hub.publish(self.slot, name, duty_id))
 
     def reset(self):
         # TODO: add more reset steps if necessary
         self._clear()
-
-
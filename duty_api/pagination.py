@@ -0,0 +1,63 @@
+"""Keyset (cursor) pagination over `(duty_start, id)`.
+
+Pages are ordered newest first. A cursor encodes the key of the last row of
+a page and the next page starts right after it, so reaching page N costs one
+index range scan like the first page instead of skipping N pages of rows.
+"""
+import base64
+import binascii
+import operator
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(Exception):
+    def __init__(self):
+        self.message = "Invalid page cursor."
+        super().__init__(self.message)
+
+
+def encode_cursor(duty_start, pk):
+    key = '%s|%d' % (duty_start.isoformat(), pk)
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_cursor(cursor):
+    """Return the (duty_start, id) key encoded in `cursor`.
+
+    Raises:
+        InvalidCursor: `cursor` wasn't made by `encode_cursor`
+    """
+    try:
+        start, _, pk = base64.urlsafe_b64decode(cursor.encode()).decode().partition('|')
+        duty_start = parse_datetime(start)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor
+    if duty_start is None:
+        raise InvalidCursor
+    return duty_start, pk
+
+def keyset_page(queryset, cursor=None, limit=50, key=None):
+    """Return one page of `queryset` and the cursor of the next one.
+
+    Args:
+        key (callable): returns the (duty_start, id) of a row, needed when
+            `queryset` yields `values_list()` rows instead of instances
+
+    Returns:
+        tuple: (list of rows, next cursor or None on the last page)
+    """
+    queryset = queryset.order_by('-duty_start', '-id')
+    if cursor:
+        duty_start, pk = decode_cursor(cursor)
+        # the plain bound keeps the scan on the index, the OR breaks ties
+        queryset = queryset.filter(duty_start__lte=duty_start).filter(
+            Q(duty_start__lt=duty_start) | Q(duty_start=duty_start, id__lt=pk))
+
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    key = key or operator.attrgetter('duty_start', 'pk')
+    return rows, encode_cursor(*key(rows[-1]))
@@ -0,0 +1,168 @@
+"""Duty schedules and the compact encoding of duty time marks.
+
+Every task mark of a duty is a fixed offset from `duty_start` given by its
+schedule, unless it was moved afterwards (e.g. clamped by
+`Duty.update_duty_end`). A duty can therefore be stored as `duty_start`, a
+schedule id and a small array of `[mark index, delta]` overrides, with the
+marks derived again on read.
+
+Schedule 0 is built into `Duty`, the others come from `DutyTemplate` rows.
+Their offsets are precomputed once and cached per process; saving or
+deleting a template drops it from the cache of every worker, through a
+generation token in the shared default cache. With a cache that isn't
+shared by every host (see `users.cache.shared_cache`) other workers'
+changes can't be seen, so templates are read on every lookup instead.
+"""
+import secrets
+import threading
+from collections import namedtuple
+from datetime import timedelta
+
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from users.cache import shared_cache
+
+
+# Marks of the first three tasks kept in Duty columns, in override index order
+MARKS = (
+    'task1_start', 'task1_end',
+    'task2_start', 'task2_end',
+    'task3_start', 'task3_end',
+)
+
+MICROSECOND = timedelta(microseconds=1)
+
+
+class UnknownSchedule(Exception):
+    def __init__(self, schedule_id):
+        self.message = "No duty schedule with id %s." % schedule_id
+        super().__init__(self.message)
+
+
+class Schedule(namedtuple('Schedule', ('id', 'offsets', 'duration'))):
+    """Start & end offset of every task, flattened, and the duty duration.
+    """
+
+    @classmethod
+    def from_minutes(cls, schedule_id, tasks, duty_duration):
+        """Build a schedule from minute counts.
+
+        Args:
+            schedule_id (int): id stored on duties using this schedule
+            tasks (list of tuple): (start, window) of each task, in minutes
+                from the start of the duty
+            duty_duration (int): length of the duty, in minutes
+        """
+        offsets = []
+        for start, window in tasks:
+            offsets.append(timedelta(minutes=start))
+            offsets.append(timedelta(minutes=start + window))
+        return cls(schedule_id, tuple(offsets), timedelta(minutes=duty_duration))
+
+    def windows(self, duty_start, overrides=()):
+        """Derive the (start, end) window of every task.
+
+        Returns:
+            list of tuple: (start, end) datetimes, in task order
+        """
+        marks = [duty_start + offset for offset in self.offsets]
+        for index, delta in overrides:
+            marks[index] += delta * MICROSECOND
+        return list(zip(marks[::2], marks[1::2]))
+
+    def marks(self, duty_start, overrides=()):
+        """Derive the marks of a duty started at `duty_start`.
+
+        Returns:
+            dict: mark name to datetime, for the tasks the schedule has
+        """
+        windows = self.windows(duty_start, overrides)
+        return dict(zip(MARKS, (mark for window in windows for mark in window)))
+
+    def overrides(self, duty_start, marks):
+        """Encode how `marks` deviate from this schedule.
+
+        Args:
+            duty_start (datetime): start of the duty
+            marks (dict): mark name to datetime, as returned by `marks()`
+
+        Returns:
+            list: `[mark index, delta in microseconds]` of every moved mark
+        """
+        overrides = []
+        for index, (name, offset) in enumerate(zip(MARKS, self.offsets)):
+            delta = marks[name] - (duty_start + offset)
+            if delta:
+                overrides.append([index, delta // MICROSECOND])
+        return overrides
+
+
+################################
+# Schedule cache
+################################
+
+GENERATION_KEY = 'duty_api:schedules:generation'
+
+_builtin = {}
+_cache = {}
+_generation = None
+_lock = threading.Lock()
+
+def register_schedule(schedule):
+    """Register a schedule defined in code.
+    """
+    _builtin[schedule.id] = schedule
+
+def get_schedule(schedule_id):
+    """Return the schedule with the given id, loading templates at most once.
+
+    Raises:
+        UnknownSchedule: no such schedule
+    """
+    global _generation
+    if schedule_id in _builtin:
+        return _builtin[schedule_id]
+
+    cache = shared_cache(DEFAULT_CACHE_ALIAS)
+    if cache is None:
+        return _load_schedule(schedule_id)
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # a token of our own unless another worker set one first
+        cache.add(GENERATION_KEY, secrets.token_hex(8), None)
+        generation = cache.get(GENERATION_KEY)
+    with _lock:
+        if generation != _generation:
+            _cache.clear()
+            _generation = generation
+        schedule = _cache.get(schedule_id)
+    if schedule is None:
+        schedule = _load_schedule(schedule_id)
+        with _lock:
+            _cache[schedule_id] = schedule
+    return schedule
+
+def _load_schedule(schedule_id):
+    from .models import DutyTemplate
+    try:
+        # kept by every request of the process, a replica may lag behind
+        template = (DutyTemplate.objects.using(DEFAULT_DB_ALIAS)
+            .prefetch_related('tasks').get(pk=schedule_id))
+    except (DutyTemplate.DoesNotExist, ValueError, TypeError):
+        raise UnknownSchedule(schedule_id)
+    return template.to_schedule()
+
+def invalidate_schedules():
+    """Drop cached templates in this process and, via the cache, in all others.
+    """
+    global _generation
+    cache = shared_cache(DEFAULT_CACHE_ALIAS)
+    if cache is not None:
+        # a new token rather than incr(), which isn't atomic on every backend
+        cache.set(GENERATION_KEY, secrets.token_hex(8), None)
+        # another worker may load the old template before the commit lands
+        transaction.on_commit(lambda: cache.set(GENERATION_KEY, secrets.token_hex(8), None))
+    with _lock:
+        _cache.clear()
+        _generation = None
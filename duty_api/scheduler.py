@@ -0,0 +1,260 @@
+"""In-memory interval index over duties.
+
+`DutyScheduler` answers "who is on duty at time T" and "which duties overlap
+[a, b)" from an interval tree per slot instead of scanning the duty table.
+The index is synced incrementally: new duties are pulled by primary key above
+a high-water mark, and only duties that were still running at the last sync
+are re-read, since a finished duty never changes again. Cleared duties are
+read from the append-only `DutyHistory` the same way; they keep their duty id,
+so an archived duty replaces its live entry.
+"""
+import random
+import threading
+from collections import namedtuple
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Duty, DutyHistory
+
+
+ScheduledDuty = namedtuple('ScheduledDuty', ('duty_id', 'user_id', 'slot', 'start', 'end'))
+
+
+class _Node(object):
+    __slots__ = ('key', 'start', 'end', 'value', 'priority', 'left', 'right', 'max_end')
+
+    def __init__(self, key, start, end, value):
+        self.key = key
+        self.start = start
+        self.end = end
+        self.value = value
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.max_end = end
+
+    def update(self):
+        self.max_end = self.end
+        if self.left and self.left.max_end > self.max_end:
+            self.max_end = self.left.max_end
+        if self.right and self.right.max_end > self.max_end:
+            self.max_end = self.right.max_end
+
+
+class IntervalTree(object):
+    """Half-open intervals [start, end) in a treap ordered by (start, key).
+
+    Each node carries the max end of its subtree, so queries skip every
+    subtree that ends before the queried range. Insert and remove take
+    O(log n), queries O(log n + k) expected.
+    """
+
+    def __init__(self):
+        self._root = None
+        self._intervals = {}
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def __contains__(self, key):
+        return key in self._intervals
+
+    def get(self, key):
+        """Return (start, end) stored under `key`, None if absent.
+        """
+        return self._intervals.get(key)
+
+    def insert(self, key, start, end, value=None):
+        """Insert or replace the interval stored under `key`.
+        """
+        if key in self._intervals:
+            self.remove(key)
+        self._intervals[key] = (start, end)
+        self._root = self._insert(self._root, _Node(key, start, end, value))
+
+    def remove(self, key):
+        """Remove the interval stored under `key`, if any.
+        """
+        interval = self._intervals.pop(key, None)
+        if interval is not None:
+            self._root = self._remove(self._root, (interval[0], key))
+
+    def at(self, point):
+        """Return values of intervals containing `point`.
+        """
+        result = []
+        self._query(self._root, point, point, True, result)
+        return result
+
+    def overlapping(self, start, end):
+        """Return values of intervals overlapping [start, end).
+        """
+        result = []
+        self._query(self._root, start, end, False, result)
+        return result
+
+    ################################
+    # Treap internals
+    ################################
+
+    @staticmethod
+    def _rotate_right(node):
+        pivot = node.left
+        node.left, pivot.right = pivot.right, node
+        node.update()
+        pivot.update()
+        return pivot
+
+    @staticmethod
+    def _rotate_left(node):
+        pivot = node.right
+        node.right, pivot.left = pivot.left, node
+        node.update()
+        pivot.update()
+        return pivot
+
+    def _insert(self, node, new):
+        if node is None:
+            return new
+        if (new.start, new.key) < (node.start, node.key):
+            node.left = self._insert(node.left, new)
+            if node.left.priority > node.priority:
+                return self._rotate_right(node)
+        else:
+            node.right = self._insert(node.right, new)
+            if node.right.priority > node.priority:
+                return self._rotate_left(node)
+        node.update()
+        return node
+
+    def _remove(self, node, order):
+        if node is None:
+            return None
+        node_order = (node.start, node.key)
+        if order < node_order:
+            node.left = self._remove(node.left, order)
+        elif order > node_order:
+            node.right = self._remove(node.right, order)
+        elif node.left is None:
+            return node.right
+        elif node.right is None:
+            return node.left
+        elif node.left.priority > node.right.priority:
+            node = self._rotate_right(node)
+            node.right = self._remove(node.right, order)
+        else:
+            node = self._rotate_left(node)
+            node.left = self._remove(node.left, order)
+        node.update()
+        return node
+
+    def _query(self, node, start, end, point, result):
+        # point query: start <= p < end, range query: start < b and end > a
+        if node is None or node.max_end <= start:
+            return
+        self._query(node.left, start, end, point, result)
+        if node.start > end or (node.start == end and not point):
+            return
+        if node.end > start:
+            result.append(node.value)
+        self._query(node.right, start, end, point, result)
+
+
+##################################################################################
+
+# Singleton
+class DutyScheduler(object):
+    """Process-wide interval index over every duty slot.
+    """
+    instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls.instance:
+            return cls.instance
+        else:
+            cls.instance = object.__new__(cls, *args, **kwargs)
+            cls.instance._lock = threading.RLock()
+            cls.instance.clear()
+            return cls.instance
+
+    def clear(self):
+        """Drop the index, the next query rebuilds it from the database.
+        """
+        with self._lock:
+            self._trees = {}
+            self._high_water = 0
+            self._running = {}
+
+    def rebuild(self):
+        self.clear()
+        self.refresh()
+
+    def refresh(self):
+        """Sync the index with duties created or changed since the last sync.
+        """
+        with self._lock:
+            now = timezone.now()
+            high_water = self._high_water
+            rows = list(self._values(Duty.objects.filter(pk__gt=high_water)))
+            gone = set()
+            if self._running:
+                running = set(self._running)
+                rows += self._values(Duty.objects.filter(pk__in=running))
+                # running duties gone from the table were cleared before finishing
+                gone = running.difference(row.duty_id for row in rows)
+                for duty_id in gone:
+                    self._trees[self._running.pop(duty_id)].remove(duty_id)
+
+            for row in rows:
+                self._index(row, now)
+
+            # duties above the mark weren't seen in the table before this
+            # refresh and may have been archived by now, in any order; those
+            # still above it are read again until a newer duty is seen
+            history = DutyHistory.objects.filter(Q(pk__gt=high_water) | Q(pk__in=gone))
+            for row in self._values(history):
+                self._index(row, now, live=False)
+
+    def on_duty_at(self, when=None, slot=None):
+        """Duties in progress at `when` (default: now).
+
+        Returns:
+            list of ScheduledDuty
+        """
+        when = when or timezone.now()
+        self.refresh()
+        with self._lock:
+            return [duty for tree in self._slot_trees(slot) for duty in tree.at(when)]
+
+    def overlapping(self, start, end, slot=None):
+        """Duties overlapping the half-open range [start, end).
+
+        Returns:
+            list of ScheduledDuty
+        """
+        self.refresh()
+        with self._lock:
+            return [duty for tree in self._slot_trees(slot)
+                for duty in tree.overlapping(start, end)]
+
+    def _slot_trees(self, slot):
+        if slot is None:
+            return list(self._trees.values())
+        return [self._trees[slot]] if slot in self._trees else []
+
+    def _index(self, row, now, live=True):
+        tree = self._trees.setdefault(row.slot, IntervalTree())
+        tree.insert(row.duty_id, row.start, row.end, row)
+        if live:
+            # only the table is read from the mark on, see refresh()
+            self._high_water = max(self._high_water, row.duty_id)
+        if live and row.end > now:
+            self._running[row.duty_id] = row.slot
+        else:
+            self._running.pop(row.duty_id, None)
+
+    @staticmethod
+    def _values(queryset):
+        return (ScheduledDuty(*row) for row in queryset.values_list(
+            'id', 'user_id', 'slot', 'duty_start', 'duty_end'))
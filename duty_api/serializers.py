@@ -1,11 +1,14 @@
-from django.shortcuts import get_object_or_404
-from rest_framework import serializers
-from rest_framework.utils.serializer_helpers import (
-    BindingDict, BoundField, JSONBoundField, NestedBoundField, ReturnDict,
-    ReturnList
-)
+import operator
+import re
+from datetime import timezone as dt_timezone
 
-from .models import Duty, DutyManager
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .models import Duty, DutyHistory
+from .schedule import MARKS, UnknownSchedule, get_schedule
 
 
 class DutySerializer(serializers.ModelSerializer):
@@ -15,7 +18,7 @@ class DutySerializer(serializers.ModelSerializer):
     class Meta:
         model = Duty
         fields = (
-            'duty_start', 'duty_end', 
+            'duty_start', 'duty_end',
             'task1_start', 'task1_end',
             'task2_start', 'task2_end',
             'task3_start', 'task3_end',
@@ -25,3 +28,218 @@ class DutySerializer(serializers.ModelSerializer):
         duty = Duty.objects.create(**validated_data)
         return duty
 
+
+class DutyHistorySerializer(serializers.ModelSerializer):
+    """Archived duty serializer, task marks are derived from its schedule
+    """
+    task1_start = serializers.DateTimeField(source='marks.task1_start', default=None)
+    task1_end = serializers.DateTimeField(source='marks.task1_end', default=None)
+    task2_start = serializers.DateTimeField(source='marks.task2_start', default=None)
+    task2_end = serializers.DateTimeField(source='marks.task2_end', default=None)
+    task3_start = serializers.DateTimeField(source='marks.task3_start', default=None)
+    task3_end = serializers.DateTimeField(source='marks.task3_end', default=None)
+
+    class Meta:
+        model = DutyHistory
+        fields = (
+            'id', 'user', 'slot',
+            'duty_start', 'duty_end',
+            'task1_start', 'task1_end',
+            'task2_start', 'task2_end',
+            'task3_start', 'task3_end',
+            'is_task1_submitted', 'is_task2_submitted', 'is_task3_submitted',
+        )
+
+
+################################
+# Read-only fast path
+################################
+
+# strftime directives rendered with %-formatting of a datetime attribute
+DIRECTIVES = {
+    'Y': ('%d', 'year'),
+    'm': ('%02d', 'month'),
+    'd': ('%02d', 'day'),
+    'H': ('%02d', 'hour'),
+    'M': ('%02d', 'minute'),
+    'S': ('%02d', 'second'),
+    'f': ('%06d', 'microsecond'),
+}
+
+DIRECTIVE_RE = re.compile(r'%(.)|[^%]+', re.DOTALL)
+
+def compile_datetime_format(output_format=None):
+    """Compile `output_format` into a function rendering a datetime with it.
+
+    Formats made only of numeric directives (`%Y %m %d %H %M %S %f`) become a
+    single %-template over the datetime's attributes, anything else falls back
+    to `strftime`. Output is that of DRF's `DateTimeField`, without the time
+    zone conversion, see `localizer()`.
+
+    Args:
+        output_format (str): strftime format or 'iso-8601', defaults to
+            `REST_FRAMEWORK['DATETIME_FORMAT']`
+    """
+    if output_format is None:
+        output_format = api_settings.DATETIME_FORMAT
+    if output_format.lower() == ISO_8601:
+        def render(value):
+            value = value.isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return render
+
+    template, attrs = [], []
+    for match in DIRECTIVE_RE.finditer(output_format):
+        directive = match.group(1)
+        if directive is None:
+            template.append(match.group(0).replace('%', '%%'))
+        elif directive == '%':
+            template.append('%%')
+        elif directive in DIRECTIVES:
+            template.append(DIRECTIVES[directive][0])
+            attrs.append(DIRECTIVES[directive][1])
+        else:
+            return operator.methodcaller('strftime', output_format)
+
+    template = ''.join(template)
+    if not attrs:
+        return lambda value: template % ()
+    if len(attrs) == 1:
+        attr = operator.attrgetter(attrs[0])
+        return lambda value: template % attr(value)
+    attr = operator.attrgetter(*attrs)
+    return lambda value: template % attr(value)
+
+def localizer():
+    """Return a function converting datetimes like DRF's `DateTimeField`.
+
+    With USE_TZ they are moved to the current time zone (naive ones are taken
+    as in it), without it aware datetimes are made naive in UTC.
+    """
+    if settings.USE_TZ:
+        zone = timezone.get_current_timezone()
+        def localize(value):
+            if value.tzinfo is None:
+                return timezone.make_aware(value, zone)
+            return value.astimezone(zone)
+    else:
+        def localize(value):
+            if value.tzinfo is None:
+                return value
+            return timezone.make_naive(value, dt_timezone.utc)
+    return localize
+
+
+class ValuesSerializer(object):
+    """Read-only serializer building output dicts straight from rows.
+
+    Takes a queryset, read with `values_list(*columns())` in one query, a
+    single model instance, or a list of instances or of rows already read
+    with `values_list(*columns())`. Output matches the ModelSerializer of
+    the same fields, without building a field tree per object.
+
+    Task marks missing from a row (compact schema, archived duties) are
+    derived from its schedule and overrides.
+    """
+    model = None
+    fields = ()
+    datetime_fields = ()
+
+    def __init__(self, instance=None, many=False):
+        self.instance = instance
+        self.many = many
+
+    @classmethod
+    def columns(cls):
+        """Columns `values_list()` has to read for `fields`, in row order.
+        """
+        stored = {field.name for field in cls.model._meta.concrete_fields}
+        return tuple(name for name in cls.fields if name in stored) + ('schedule', 'overrides')
+
+    @classmethod
+    def _plan(cls):
+        plan = cls.__dict__.get('_compiled')
+        if plan is None:
+            columns = cls.columns()
+            opts = cls.model._meta
+            plan = cls._compiled = {
+                'columns': columns,
+                'attnames': tuple(opts.get_field(name).attname for name in columns),
+                'marks': tuple(name for name in MARKS if name in cls.fields),
+                'datetimes': frozenset(cls.datetime_fields),
+            }
+        return plan
+
+    def to_representation(self, rows):
+        """Serialize `values_list(*columns())` rows.
+
+        Returns:
+            list of dict: output of every row, in `fields` order
+        """
+        plan = self._plan()
+        columns, marks, datetimes = plan['columns'], plan['marks'], plan['datetimes']
+        localize, render = localizer(), compile_datetime_format()
+        fields = [(name, name in datetimes) for name in self.fields]
+
+        # looked up once per schedule, templates cost a cache read each
+        schedules = {}
+        data = []
+        for row in rows:
+            values = dict(zip(columns, row))
+            start = values['duty_start']
+            if start is not None and any(values.get(name) is None for name in marks):
+                schedule_id = values['schedule']
+                if schedule_id not in schedules:
+                    try:
+                        schedules[schedule_id] = get_schedule(schedule_id)
+                    except UnknownSchedule:
+                        # template deleted before templates in use were kept
+                        schedules[schedule_id] = None
+                schedule = schedules[schedule_id]
+                derived = schedule.marks(start, values['overrides']) if schedule else {}
+                for name in marks:
+                    if values.get(name) is None:
+                        values[name] = derived.get(name)
+            item = {}
+            for name, is_datetime in fields:
+                value = values.get(name)
+                if is_datetime and value is not None:
+                    value = render(localize(value))
+                item[name] = value
+            data.append(item)
+        return data
+
+    def _rows(self, instances):
+        attnames = self._plan()['attnames']
+        for instance in instances:
+            if isinstance(instance, tuple):
+                yield instance
+            else:
+                yield tuple(instance.__dict__.get(name) for name in attnames)
+
+    @property
+    def data(self):
+        instance = self.instance
+        if not self.many:
+            return self.to_representation(self._rows([instance]))[0]
+        if hasattr(instance, 'values_list'):
+            return self.to_representation(instance.values_list(*self.columns()))
+        return self.to_representation(self._rows(instance))
+
+
+class FastDutySerializer(ValuesSerializer):
+    """Read-only `DutySerializer`, see `ValuesSerializer`.
+    """
+    model = Duty
+    fields = DutySerializer.Meta.fields
+    datetime_fields = DutySerializer.Meta.fields
+
+
+class FastDutyHistorySerializer(ValuesSerializer):
+    """Read-only `DutyHistorySerializer`, see `ValuesSerializer`.
+    """
+    model = DutyHistory
+    fields = DutyHistorySerializer.Meta.fields
+    datetime_fields = ('duty_start', 'duty_end') + MARKS
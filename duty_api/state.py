@@ -0,0 +1,268 @@
+"""Shared state backends for `DutyManager`.
+
+Every worker process (and every host) must agree on which duty is active, so
+the pointer to it lives in a backend instead of in the manager itself. Each
+backend keeps a version stamp that is bumped on every write; `DutyManager`
+caches the loaded duty together with the version it was read at and only
+reloads it when the stamp moves. Each duty slot (team, station, ...) has
+its own independent state.
+
+Writes are optimistic: a write names the version it was based on and only
+succeeds if the stamp hasn't moved since (compare-and-swap), otherwise
+`DutyStateConflict` is raised and nothing is changed.
+"""
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from users.cache import shared_cache
+
+
+DEFAULT_STATE_BACKEND = 'duty_api.state.DatabaseStateBackend'
+
+DEFAULT_SLOT = 'default'
+
+StateSnapshot = namedtuple('StateSnapshot', ('duty_id', 'version'))
+
+
+class DutyStateConflict(Exception):
+    def __init__(self):
+        self.message = ("Duty was changed by another request in the meantime."
+            " Reload it and try again.")
+        super().__init__(self.message)
+
+
+class BaseStateBackend(object):
+    """Interface of a duty state backend.
+
+    Readers call `version()` on every access and `read()` only when the
+    version differs from the one they cached. Writers call
+    `compare_and_swap()` with the version their change was based on.
+
+    Swaps of a `transactional` backend roll back with the database
+    transaction; `DutyManager` swaps the state of the others back itself.
+    """
+    transactional = False
+
+    def version(self, slot):
+        """Return the current version stamp of `slot`, as cheaply as possible.
+        """
+        return self.read(slot).version
+
+    async def aversion(self, slot):
+        """Async `version()`, runs the sync one in a thread unless overridden.
+        """
+        return await sync_to_async(self.version)(slot)
+
+    async def aread(self, slot):
+        """Async `read()`, runs the sync one in a thread unless overridden.
+        """
+        return await sync_to_async(self.read)(slot)
+
+    def read(self, slot):
+        """Return the authoritative `StateSnapshot` of `slot`.
+        """
+        raise NotImplementedError
+
+    def compare_and_swap(self, slot, version, duty_id):
+        """Point the state of `slot` at `duty_id` if it is still at `version`.
+
+        Args:
+            slot (str): duty slot
+            version (int): version the caller's change is based on
+            duty_id (int): id of the new active duty, None to clear
+
+        Returns:
+            StateSnapshot: the new state
+
+        Raises:
+            DutyStateConflict: the version has moved since
+        """
+        raise NotImplementedError
+
+
+class DatabaseStateBackend(BaseStateBackend):
+    """State stored in `DutyState` rows, swapped with a conditional UPDATE.
+
+    The version stamp is mirrored into the Django cache so readers don't hit
+    the database on every request. The mirror only makes sense when the cache
+    is shared by every host (see `users.cache.shared_cache`), otherwise the
+    stamp is read from the database instead.
+    """
+    transactional = True
+
+    def __init__(self, cache_alias='default', cache_timeout=300,
+            key='duty_api:state:%s:version'):
+        self.cache = shared_cache(cache_alias) if cache_alias else None
+        self.cache_timeout = cache_timeout
+        self.key = key
+
+    @property
+    def model(self):
+        from .models import DutyState
+        return DutyState
+
+    def version(self, slot):
+        if self.cache is None:
+            return self.read(slot).version
+        key = self.key % slot
+        version = self.cache.get(key)
+        if version is None:
+            # a lagging replica would put an old stamp back for every worker
+            version = self._read(slot, DEFAULT_DB_ALIAS).version
+            self.cache.add(key, version, self.cache_timeout)
+        return version
+
+    async def aversion(self, slot):
+        if self.cache is None:
+            return (await self.aread(slot)).version
+        key = self.key % slot
+        version = await self.cache.aget(key)
+        if version is None:
+            version = (await self._aread(slot, DEFAULT_DB_ALIAS)).version
+            await self.cache.aadd(key, version, self.cache_timeout)
+        return version
+
+    def read(self, slot):
+        return self._read(slot)
+
+    async def aread(self, slot):
+        return await self._aread(slot)
+
+    def _read(self, slot, using=None):
+        row = (self.model.objects.using(using).filter(slot=slot)
+            .values_list('duty_id', 'version').first())
+        return StateSnapshot(*row) if row else StateSnapshot(None, 0)
+
+    async def _aread(self, slot, using=None):
+        row = await (self.model.objects.using(using).filter(slot=slot)
+            .values_list('duty_id', 'version').afirst())
+        return StateSnapshot(*row) if row else StateSnapshot(None, 0)
+
+    def compare_and_swap(self, slot, version, duty_id):
+        updated = self.model.objects.filter(slot=slot, version=version).update(
+            duty_id=duty_id, version=F('version') + 1)
+        if not updated:
+            # the row is only created by the very first write
+            if version != 0:
+                raise DutyStateConflict
+            try:
+                with transaction.atomic():
+                    self.model.objects.create(slot=slot, duty_id=duty_id, version=1)
+            except IntegrityError:
+                raise DutyStateConflict
+        self._publish(slot, version + 1)
+        return StateSnapshot(duty_id, version + 1)
+
+    def _publish(self, slot, version):
+        # Publishing before commit only costs other workers a reload: they
+        # cache the version of the row they read, which stays behind until
+        # the commit lands. Re-publish on commit in case the key was evicted.
+        if self.cache is not None:
+            key = self.key % slot
+            self.cache.set(key, version, self.cache_timeout)
+            transaction.on_commit(
+                lambda: self.cache.set(key, version, self.cache_timeout))
+
+
+class CacheStateBackend(BaseStateBackend):
+    """State stored in the Django cache.
+
+    The swap claims the next version with an atomic `cache.add`, so only one
+    writer can move the state from a given version. Requires a cache shared
+    by all workers (memcached, redis, ...).
+    """
+
+    def __init__(self, cache_alias='default', key='duty_api:state:%s', claim_timeout=300):
+        self.cache = caches[cache_alias]
+        self.key = key
+        self.claim_timeout = claim_timeout
+
+    def read(self, slot):
+        state = self.cache.get(self.key % slot)
+        return StateSnapshot(*state) if state else StateSnapshot(None, 0)
+
+    def compare_and_swap(self, slot, version, duty_id):
+        if self.read(slot).version != version:
+            raise DutyStateConflict
+        claim_key = '%s:claim:%d' % (self.key % slot, version + 1)
+        if not self.cache.add(claim_key, True, self.claim_timeout):
+            raise DutyStateConflict
+        new_state = StateSnapshot(duty_id, version + 1)
+        self.cache.set(self.key % slot, tuple(new_state), None)
+        return new_state
+
+
+class FileStateBackend(BaseStateBackend):
+    """State stored in a standalone SQLite file.
+
+    A stand-in for single-host deployments: SQLite's file lock makes the
+    conditional UPDATE atomic across processes and WAL keeps version reads
+    cheap.
+    """
+
+    def __init__(self, path=None, timeout=5):
+        self.path = path or os.path.join(settings.BASE_DIR, 'duty_state.sqlite3')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS duty_state ('
+                'slot TEXT PRIMARY KEY, duty_id INTEGER, version INTEGER NOT NULL)')
+            self._local.connection = conn
+        return conn
+
+    def read(self, slot):
+        row = self.connection.execute(
+            'SELECT duty_id, version FROM duty_state WHERE slot = ?', (slot, )).fetchone()
+        return StateSnapshot(*row) if row else StateSnapshot(None, 0)
+
+    def compare_and_swap(self, slot, version, duty_id):
+        conn = self.connection
+        if version == 0:
+            conn.execute('INSERT OR IGNORE INTO duty_state (slot, duty_id, version) '
+                'VALUES (?, NULL, 0)', (slot, ))
+        cursor = conn.execute(
+            'UPDATE duty_state SET duty_id = ?, version = version + 1 '
+            'WHERE slot = ? AND version = ?', (duty_id, slot, version))
+        if not cursor.rowcount:
+            raise DutyStateConflict
+        return StateSnapshot(duty_id, version + 1)
+
+
+################################
+# Backend loading
+################################
+
+_backend = None
+
+def get_state_backend():
+    """Return the backend configured by `settings.DUTY_STATE`.
+    """
+    global _backend
+    if _backend is None:
+        config = getattr(settings, 'DUTY_STATE', {})
+        backend_cls = import_string(config.get('BACKEND', DEFAULT_STATE_BACKEND))
+        _backend = backend_cls(**config.get('OPTIONS', {}))
+    return _backend
+
+@receiver(setting_changed)
+def reset_state_backend(setting, **kwargs):
+    global _backend
+    if setting in ('DUTY_STATE', 'CACHES', 'SHARED_CACHE_BACKENDS'):
+        _backend = None
@@ -0,0 +1,134 @@
+"""Write-coalescing persistence of task submissions.
+
+A submission only flips an `is_task*_submitted` flag, so instead of saving
+the whole duty row per request the flags are queued and flushed with one
+`UPDATE ... SET is_taskN_submitted = true WHERE id IN (...)` per task. A
+burst of submissions at a window boundary costs at most three statements per
+flush. The queue flushes every `settings.DUTY_SUBMISSION_FLUSH_INTERVAL`
+seconds from a background thread, when `max_pending` submissions are
+waiting, before a duty is cleared and at exit. Without an interval every
+submission is written through at once.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+class SubmissionQueue(object):
+
+    def __init__(self, interval=None, max_pending=500):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._count = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return self._count
+
+    def submit(self, duty_id, task):
+        """Queue the submission of `task` of `duty_id`.
+        """
+        with self._lock:
+            duty_ids = self._pending.setdefault(task, set())
+            if duty_id not in duty_ids:
+                duty_ids.add(duty_id)
+                self._count += 1
+            full = self._count >= self.max_pending
+        if full:
+            self.flush()
+        elif self.interval and self._thread is None:
+            self.start()
+
+    def flush(self):
+        """Write every queued submission.
+
+        Returns:
+            int: number of UPDATE statements issued
+        """
+        from .models import Duty
+
+        # one flush at a time, so a slow one can't be overtaken by a newer one
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending, self._count = self._pending, {}, 0
+            flushed = []
+            try:
+                for task, duty_ids in sorted(pending.items()):
+                    Duty.objects.filter(pk__in=duty_ids).update(
+                        **{'is_task%d_submitted' % task: True})
+                    flushed.append(task)
+            except Exception:
+                # keep what wasn't written for the next flush
+                for task in flushed:
+                    del pending[task]
+                with self._lock:
+                    for task, duty_ids in pending.items():
+                        self._pending.setdefault(task, set()).update(duty_ids)
+                    self._count = sum(len(duty_ids) for duty_ids in self._pending.values())
+                raise
+            return len(flushed)
+
+    ################################
+    # Background flushing
+    ################################
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='duty-submissions', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            if not self._count:
+                continue
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing task submissions failed.")
+            finally:
+                close_old_connections()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_submission_queue():
+    """Return the queue configured by `settings.DUTY_SUBMISSION_FLUSH_INTERVAL`.
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                interval = getattr(settings, 'DUTY_SUBMISSION_FLUSH_INTERVAL', None)
+                _queue = SubmissionQueue(interval, max_pending=500 if interval else 1)
+    return _queue
+
+
+@receiver(setting_changed)
+def reset_submission_queue(setting, **kwargs):
+    global _queue
+    if setting == 'DUTY_SUBMISSION_FLUSH_INTERVAL' and _queue is not None:
+        _queue.stop()
+        _queue = None
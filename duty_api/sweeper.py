@@ -0,0 +1,114 @@
+"""Clearing of finished duties outside of the request cycle.
+
+`sweep_expired_duties` walks the `duty_end` index in batches, releases the
+slots still pointing at the finished duties, archives them to `DutyHistory`
+and deletes them in bulk. It runs from the `sweep_duties` management command
+or, when `settings.DUTY_SWEEPER_INTERVAL` is set, from a `DutySweeper` thread
+started by `start_sweeper` in the server entry points (`customuser.wsgi`,
+`customuser.asgi`), so management commands and shells don't sweep.
+"""
+import logging
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import events
+from .models import Duty, DutyHistory
+from .state import DutyStateConflict, get_state_backend
+from .submissions import get_submission_queue
+
+logger = logging.getLogger(__name__)
+
+
+def sweep_expired_duties(now=None, batch_size=500):
+    """Clear every duty that ended before `now`.
+
+    Args:
+        now (datetime): cut-off, defaults to the current time
+        batch_size (int): duties cleared per transaction
+
+    Returns:
+        int: number of duties cleared
+    """
+    now = now or timezone.now()
+    backend = get_state_backend()
+    # archive the submissions this worker still has queued along with the duties
+    queue = get_submission_queue()
+    if len(queue):
+        queue.flush()
+    skipped = set()
+    swept = 0
+    while True:
+        batch = {duty.pk: duty for duty in Duty.objects
+            .filter(duty_end__lt=now)
+            .exclude(pk__in=skipped)
+            .order_by('duty_end')[:batch_size]}
+        if not batch:
+            return swept
+
+        with transaction.atomic():
+            for slot in set(duty.slot for duty in batch.values()):
+                state = backend.read(slot)
+                if state.duty_id not in batch:
+                    continue
+                try:
+                    backend.compare_and_swap(slot, state.version, None)
+                except DutyStateConflict:
+                    # changed under us (e.g. fast-forwarded), look again next run
+                    skipped.add(state.duty_id)
+                    del batch[state.duty_id]
+                else:
+                    transaction.on_commit(partial(
+                        events.hub.publish, slot, events.CLEARED, state.duty_id))
+            DutyHistory.objects.archive(batch.values(), now=now, batch_size=batch_size)
+            swept += Duty.objects.filter(pk__in=list(batch)).delete()[0]
+
+
+class DutySweeper(threading.Thread):
+    """Daemon thread sweeping finished duties every `interval` seconds.
+    """
+
+    def __init__(self, interval, batch_size=500):
+        super().__init__(name='duty-sweeper', daemon=True)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                swept = sweep_expired_duties(batch_size=self.batch_size)
+                if swept:
+                    logger.info("Swept %d finished duties.", swept)
+            except Exception:
+                logger.exception("Duty sweep failed.")
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        self.stopped.set()
+
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def start_sweeper():
+    """Start the sweeper thread of this process, if `settings.DUTY_SWEEPER_INTERVAL`
+    is set and it isn't running yet.
+
+    Returns:
+        DutySweeper: the running sweeper, None if sweeping in process is disabled
+    """
+    global _sweeper
+    interval = getattr(settings, 'DUTY_SWEEPER_INTERVAL', None)
+    if not interval:
+        return None
+    with _sweeper_lock:
+        if _sweeper is None or not _sweeper.is_alive():
+            _sweeper = DutySweeper(interval)
+            _sweeper.start()
+    return _sweeper
@@ -1,6 +1,9 @@
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.test.client import Client
+from django.utils import timezone
+
+from unittest import mock
 
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -9,6 +12,7 @@ from utils.random_support import RandomSupport
 
 from duty_api.serializers import DutySerializer
 from duty_api.models import Duty, DutyManager
+from duty_api.state import StateSnapshot
 
 User = get_user_model()
 
@@ -106,11 +110,160 @@ class DutyAPITests(APITestCase, RandomSupport):
         self.assertIn(response.status_code, [status.HTTP_200_OK, status.HTTP_201_CREATED])
         self.assertEqual(response.data.get('payload'), serialized.data)
 
+    def test_request_post_concurrent_create_conflict(self):
+        """Test POST racing with another start gets Http409 and creates nothing.
+        """
+        other_user = self.create_user()
+        self.duty_manager.start_duty(other_user)
+
+        is_logged_in = self.client.login(email=self.email, password=self.password)
+        self.assertTrue(is_logged_in)
+
+        # state read before the other start landed
+        backend = self.duty_manager.backend
+        with mock.patch.object(type(backend), 'read', return_value=StateSnapshot(None, 0)):
+            response = self.client.post(reverse('duty-api'))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        with self.assertRaises(Duty.DoesNotExist):
+            self.user.duty
+
+    def test_request_post_create_duty_in_slot(self):
+        """Test POST duty in a slot leaves other slots free.
+        """
+        other_user = self.create_user()
+        self.duty_manager.start_duty(other_user)
+
+        is_logged_in = self.client.login(email=self.email, password=self.password)
+        self.assertTrue(is_logged_in)
+
+        response = self.client.post(reverse('duty-api'), {'slot': 'lab'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(DutyManager('lab').user, self.user)
+        self.assertEqual(self.duty_manager.user, other_user)
+
+        # GET finds the duty in its slot
+        response = self.client.get(reverse('duty-api'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        DutyManager('lab').reset()
+
     def test_request_delete_duty(self):
         """Test DELETE duty is valid only if duty has been finished.
         """
         pass
 
+    def test_request_get_queries(self):
+        """Test GET duty only reads the user, the slot version is cached.
+        """
+        self.duty_manager.start_duty(self.user)
+        self.client.login(email=self.email, password=self.password)
+
+        # request.user, the slot version comes from the shared cache
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('duty-api'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_request_get_queries_cached_user(self):
+        """Test GET after the first request of a session doesn't query at all.
+        """
+        self.duty_manager.start_duty(self.user)
+        self.client.login(email=self.email, password=self.password)
+        self.client.get(reverse('duty-api'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('duty-api'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_request_get_not_modified(self):
+        """Test GET answers a current `If-None-Match` with 304 without a query.
+        """
+        self.duty_manager.start_duty(self.user)
+        self.client.login(email=self.email, password=self.password)
+        response = self.client.get(reverse('duty-api'))
+        etag = response['ETag']
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('duty-api'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        # weak comparison, as proxies may weaken the tag
+        response = self.client.get(reverse('duty-api'), HTTP_IF_NONE_MATCH='W/%s' % etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_request_get_modified(self):
+        """Test GET sends the duty again, with a new ETag, once it changed.
+        """
+        self.duty_manager.start_duty(self.user)
+        self.client.login(email=self.email, password=self.password)
+        etag = self.client.get(reverse('duty-api'))['ETag']
+
+        self.duty_manager.force_fast_forward_duty(next_minutes=-1)
+        response = self.client.get(reverse('duty-api'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['payload'], DutySerializer(self.duty_manager.duty).data)
+
+    def test_duty_page_fragment(self):
+        """Test the ongoing duty page is rendered again once the duty is saved.
+        """
+        self.duty_manager.start_duty(self.user)
+        self.client.login(email=self.email, password=self.password)
+        response = self.client.get(reverse('duty-page'))
+        self.assertContains(response, self.user.name)
+
+        self.duty_manager.force_fast_forward_duty(next_minutes=30)
+        duty_end = timezone.localtime(self.duty_manager.duty.duty_end).strftime('%H:%M')
+        self.assertContains(self.client.get(reverse('duty-page')), 'will end at %s' % duty_end)
+
+    def test_duty_page_finished_duty(self):
+        """Test the duty page offers to start a duty once the slot's duty ended.
+        """
+        self.duty_manager.start_duty(self.create_user())
+        self.duty_manager.force_fast_forward_duty(next_minutes=-1)
+        self.client.login(email=self.email, password=self.password)
+
+        response = self.client.get(reverse('duty-page'))
+        self.assertTemplateUsed(response, 'start_duty.html')
+
+    def test_request_get_queries_no_duty(self):
+        """Test GET without a duty costs a single reverse duty lookup.
+        """
+        self.client.login(email=self.email, password=self.password)
+
+        # request.user, user's duty
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('duty-api'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_request_post_queries(self):
+        """Test POST duty doesn't reload the user nor the created duty.
+        """
+        # slot state row exists once the slot has been used
+        self.duty_manager.start_duty(self.create_user())
+        self.duty_manager.reset()
+        self.client.login(email=self.email, password=self.password)
+
+        # request.user, slot state, savepoints, insert, state swap
+        with self.assertNumQueries(8):
+            response = self.client.post(reverse('duty-api'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_request_delete_queries(self):
+        """Test DELETE finished duty archives and deletes it at a bounded cost.
+        """
+        self.duty_manager.start_duty(self.user)
+        self.duty_manager.force_fast_forward_duty(next_minutes=-1)
+        self.client.login(email=self.email, password=self.password)
+
+        # request.user, savepoints, state swap, submitted flags, archive (known
+        # ids, insert, day & user day stats: select, savepointed insert), delete
+        with self.assertNumQueries(16):
+            response = self.client.delete(reverse('duty-api'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(self.duty_manager.duty)
+
     def tearDown(self):
         # reset duty manager from any duty associated
         duty_manager = DutyManager()
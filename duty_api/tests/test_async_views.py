@@ -0,0 +1,102 @@
+from asgiref.sync import sync_to_async
+from django.test import override_settings
+from django.urls import reverse
+
+from duty_api.tests.test_models import BaseDutyTestCase
+from duty_api.serializers import DutySerializer
+from duty_api.models import Duty, DutyManager
+
+
+@override_settings(ROOT_URLCONF='customuser.urls_async')
+class TestAsyncDutyViews(BaseDutyTestCase):
+    """Test the async duty views served over ASGI.
+    """
+
+    def setUp(self):
+        self.duty_manager = DutyManager()
+        self.user = self.create_user()
+        self.async_client.force_login(self.user)
+
+    async def test_duty_lifecycle(self):
+        """POST starts a duty, GET returns it, DELETE clears it once finished.
+        """
+        response = await self.async_client.get(reverse('duty-api'))
+        self.assertEqual(response.status_code, 400)
+
+        response = await self.async_client.post(reverse('duty-api'))
+        self.assertEqual(response.status_code, 201)
+        duty = await self.duty_manager.aget_duty()
+        self.assertEqual(duty.user, self.user)
+
+        response = await self.async_client.get(reverse('duty-api'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['payload'], DutySerializer(duty).data)
+
+        # still running
+        response = await self.async_client.delete(reverse('duty-api'))
+        self.assertEqual(response.status_code, 400)
+
+        # a second duty in the same slot
+        response = await self.async_client.post(reverse('duty-api'))
+        self.assertEqual(response.status_code, 400)
+
+        duty.update_duty_end(duty.duty_start)
+        await duty.asave()
+        response = await self.async_client.delete(reverse('duty-api'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(await Duty.objects.filter(user=self.user).aexists())
+        self.assertIsNone(await self.duty_manager.aget_duty())
+
+    async def test_get_not_modified(self):
+        """GET answers a current `If-None-Match` with 304 and an empty body.
+        """
+        await self.async_client.post(reverse('duty-api'))
+        response = await self.async_client.get(reverse('duty-api'))
+        etag = response['ETag']
+
+        response = await self.async_client.get(
+            reverse('duty-api'), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    async def test_post_json_slot(self):
+        """JSON bodies are accepted like form data.
+        """
+        response = await self.async_client.post(
+            reverse('duty-api'), {'slot': 'lab'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((await DutyManager('lab').aget_duty()).user, self.user)
+
+        response = await self.async_client.post(
+            reverse('duty-api'), {'slot': ''}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_unauthenticated(self):
+        """Anonymous requests are refused by the API and sent to login by pages.
+        """
+        self.async_client.cookies.clear()
+        response = await self.async_client.get(reverse('duty-api'))
+        self.assertEqual(response.status_code, 403)
+        response = await self.async_client.get(reverse('users:profile'))
+        self.assertEqual(response.status_code, 302)
+
+    async def test_profile(self):
+        """Async profile page renders the logged in user.
+        """
+        response = await self.async_client.get(reverse('users:profile'))
+        self.assertContains(response, self.user.name)
+
+    async def test_duty_page_finished_duty(self):
+        """Duty page offers to start a duty once the slot's duty ended.
+        """
+        other_user = await sync_to_async(self.create_user)()
+        await self.duty_manager.astart_duty(other_user)
+        await sync_to_async(self.duty_manager.force_fast_forward_duty)(next_minutes=-1)
+
+        response = await self.async_client.get(reverse('duty-page'))
+        self.assertTemplateUsed(response, 'start_duty.html')
+
+    def tearDown(self):
+        DutyManager('lab').reset()
+        self.duty_manager.reset()
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import RequestFactory
+from django.utils import timezone
+
+from duty_api import events
+from duty_api.async_views import RETRY_MILLISECONDS, duty_events, stream_duty_events
+from duty_api.tests.test_models import BaseDutyTestCase
+from duty_api.tests.test_state import worker_manager
+from duty_api.models import DutyManager
+
+
+class TestDutyEventHub(BaseDutyTestCase):
+    """Test the in-process fan-out of duty events.
+    """
+
+    async def test_publish_from_thread(self):
+        """Events published from any thread reach the slot's subscriptions only.
+        """
+        hub = events.DutyEventHub()
+        with hub.subscribe('default') as subscription, hub.subscribe('lab') as other:
+            self.assertEqual(hub.subscribers('default'), 1)
+            thread = threading.Thread(target=hub.publish, args=('default', events.CLEARED, 7))
+            thread.start()
+            thread.join()
+            self.assertEqual(await subscription.get(1),
+                events.DutyEvent('default', events.CLEARED, 7))
+            self.assertIsNone(await other.get(0.01))
+        self.assertEqual(hub.subscribers('default'), 0)
+
+    async def test_slow_subscriber(self):
+        """A full queue collapses into a single change event.
+        """
+        hub = events.DutyEventHub(maxsize=2)
+        with hub.subscribe('default') as subscription:
+            for duty_id in range(3):
+                hub.publish('default', events.STARTED, duty_id)
+            await asyncio.sleep(0)
+            self.assertEqual((await subscription.get(1)).name, events.CHANGED)
+            self.assertIsNone(await subscription.get(0.01))
+
+    def test_manager_publishes_on_commit(self):
+        """Starting and clearing a duty are published once committed.
+        """
+        duty_manager = DutyManager()
+        with mock.patch.object(events.hub, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                duty_manager.start_duty(self.create_user())
+                duty_id = duty_manager.duty.pk
+                self.assertFalse(publish.called)
+            with self.captureOnCommitCallbacks(execute=True):
+                duty_manager.reset()
+        self.assertEqual(publish.call_args_list, [
+            mock.call('default', events.STARTED, duty_id),
+            mock.call('default', events.CLEARED, duty_id),
+        ])
+
+
+class TestDutyEventStream(BaseDutyTestCase):
+    """Test the Server-Sent Events stream of a slot.
+    """
+
+    def setUp(self):
+        self.duty_manager = DutyManager()
+        self.user = self.create_user()
+        self.duty_manager.start_duty(self.user)
+
+    async def test_boundaries_and_clear(self):
+        """Passing task boundaries and clearing by another worker are pushed.
+        """
+        duty = await self.duty_manager.aget_duty()
+        duty.task1_start = timezone.now() + timedelta(milliseconds=50)
+
+        stream = stream_duty_events(self.duty_manager, heartbeat=0.2)
+        first = await stream.__anext__()
+        self.assertTrue(first.startswith('event: duty\n'))
+        self.assertIn('"task1_start"', first)
+
+        self.assertTrue((await asyncio.wait_for(stream.__anext__(), 2))
+            .startswith('event: task1_start\n'))
+
+        # cleared without an in-process event, found on the next heartbeat
+        await sync_to_async(self.duty_manager.reset)()
+        self.assertEqual(await asyncio.wait_for(stream.__anext__(), 2),
+            'event: cleared\ndata: {"duty": null}\n\n')
+        # and the stream ends with it
+        with self.assertRaises(StopAsyncIteration):
+            await asyncio.wait_for(stream.__anext__(), 2)
+        self.assertEqual(events.hub.subscribers('default'), 0)
+
+    async def test_fast_forwarded_elsewhere(self):
+        """A duty fast-forwarded by another worker is pushed as changed.
+        """
+        stream = stream_duty_events(self.duty_manager, heartbeat=0.05)
+        await stream.__anext__()
+
+        # no in-process event, the reloaded duty is found on the next heartbeat
+        with mock.patch.object(DutyManager, '_publish'):
+            await sync_to_async(worker_manager().force_fast_forward_duty)(60)
+        chunk = await asyncio.wait_for(stream.__anext__(), 2)
+        self.assertTrue(chunk.startswith('event: changed\n'), chunk)
+        await stream.aclose()
+
+    async def test_lifetime(self):
+        """Streams tell clients how soon to reconnect and end after their lifetime.
+        """
+        stream = stream_duty_events(self.duty_manager, heartbeat=0.05, lifetime=0.2)
+        self.assertIn('\nretry: %d\n' % RETRY_MILLISECONDS, await stream.__anext__())
+        chunks = [chunk async for chunk in stream]
+        self.assertTrue(chunks)
+        self.assertTrue(all(chunk == ': keepalive\n\n' for chunk in chunks))
+        self.assertEqual(events.hub.subscribers('default'), 0)
+
+    async def test_events_view(self):
+        """The view streams the user's slot as text/event-stream.
+        """
+        request = RequestFactory().get('/duties/api/events/')
+        request.user = self.user
+        response = await duty_events(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunk = await response.streaming_content.__anext__()
+        self.assertTrue(chunk.startswith(b'event: duty\n'))
+        await response.streaming_content.aclose()
+
+    def tearDown(self):
+        self.duty_manager.reset()
@@ -0,0 +1,116 @@
+import csv
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from duty_api.tests.test_models import BaseDutyTestCase
+from duty_api.models import Duty, DutyHistory
+
+
+class BaseExportTestCase(BaseDutyTestCase):
+
+    def setUp(self):
+        self.user = self.create_user()
+        self.staff = self.create_user()
+        self.staff.is_staff = True
+        self.staff.save()
+
+        self.now = timezone.now()
+        self.month = self.now.strftime('%Y-%m')
+        self.archived(1, self.user, self.now.replace(day=1, hour=0, minute=0), submitted=True)
+        self.archived(2, None, self.now.replace(day=1, hour=1, minute=0))
+        self.archived(3, self.user, datetime(2021, 3, 1, tzinfo=dt_timezone.utc))
+        self.active = Duty.objects.create(user=self.create_user())
+
+    def archived(self, pk, user, duty_start, submitted=False):
+        return DutyHistory.objects.create(
+            id=pk, user=user, slot='default', bucket=DutyHistory.bucket_of(duty_start),
+            duty_start=duty_start, duty_end=duty_start + timedelta(hours=3), schedule=0,
+            is_task1_submitted=submitted)
+
+    def content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+
+class TestExportAPI(BaseExportTestCase):
+    """Test the streamed `duties/api/export/`.
+    """
+
+    def test_csv(self):
+        """Archived duties of the month come first, then the active ones.
+        """
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('duty-export'), {'month': self.month})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+
+        rows = list(csv.DictReader(StringIO(self.content(response))))
+        self.assertEqual([row['id'] for row in rows], ['1', '2', str(self.active.pk)])
+        self.assertEqual(rows[0]['user_email'], self.user.email)
+        self.assertEqual(rows[0]['is_task1_submitted'], 'True')
+        self.assertEqual(rows[1]['user_email'], '')
+        self.assertEqual(rows[2]['archived'], 'False')
+
+    def test_ndjson(self):
+        """NDJSON output holds one duty per line.
+        """
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('duty-export'), {'month': '2021-03', 'output': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(rows, [{
+            'id': 3, 'slot': 'default', 'user_email': self.user.email,
+            'duty_start': '2021-03-01T00:00:00+00:00', 'duty_end': '2021-03-01T03:00:00+00:00',
+            'is_task1_submitted': False, 'is_task2_submitted': False,
+            'is_task3_submitted': False, 'archived': True,
+        }])
+
+    def test_invalid(self):
+        """Exports are for staff only and need a valid month and output.
+        """
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('duty-export'), {'month': self.month})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(self.staff)
+        for params in ({}, {'month': '2021-13'}, {'month': self.month, 'output': 'xml'}):
+            response = self.client.get(reverse('duty-export'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+@override_settings(ROOT_URLCONF='customuser.urls_async')
+class TestAsyncExportAPI(BaseExportTestCase):
+    """Test the export streamed by the async view.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.async_client.force_login(self.staff)
+
+    async def test_csv(self):
+        """The async view streams the same lines as the sync one.
+        """
+        response = await self.async_client.get(reverse('duty-export'), {'month': self.month})
+        self.assertEqual(response.status_code, 200)
+        content = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual([row['id'] for row in rows], ['1', '2', str(self.active.pk)])
+
+
+class TestExportCommand(BaseExportTestCase):
+    """Test the `export_duties` management command.
+    """
+
+    def test_export(self):
+        """The command writes the same export as the endpoint.
+        """
+        out = StringIO()
+        call_command('export_duties', self.month, '--chunk-size', '1', stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual([row['id'] for row in rows], ['1', '2', str(self.active.pk)])
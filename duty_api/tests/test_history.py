@@ -0,0 +1,135 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from duty_api.tests.test_models import BaseDutyTestCase
+from duty_api.schedule import get_schedule
+from duty_api.models import Duty, DutyHistory, DutyTemplate, TemplateInUse
+
+
+class TestHistoryAPI(BaseDutyTestCase):
+    """Test `duties/api/history/` paging and filters.
+    """
+
+    def setUp(self):
+        self.user = self.create_user()
+        self.other = self.create_user()
+        self.now = timezone.now().replace(microsecond=0)
+
+        # 7 duties of the user a day apart, two of them starting together
+        starts = [self.now - timedelta(days=day) for day in range(6)] + [self.now]
+        self.history = [self.archived(pk, self.user, start) for pk, start in enumerate(starts, 1)]
+        self.archived(100, self.other, self.now)
+        self.client.force_login(self.user)
+
+    def archived(self, pk, user, duty_start):
+        return DutyHistory.objects.create(
+            id=pk, user=user, slot='default', bucket=DutyHistory.bucket_of(duty_start),
+            duty_start=duty_start, duty_end=duty_start + timedelta(hours=3), schedule=0)
+
+    def get(self, **params):
+        response = self.client.get(reverse('duty-history'), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_pages(self):
+        """Pages follow each other newest first without gaps or repeats.
+        """
+        ids, cursor = [], None
+        while True:
+            data = self.get(limit=3, **({'cursor': cursor} if cursor else {}))
+            ids += [duty['id'] for duty in data['payload']]
+            cursor = data['next']
+            if not cursor:
+                break
+        self.assertEqual(ids, [7, 1, 2, 3, 4, 5, 6])
+
+    def test_payload(self):
+        """Archived duties carry their derived task marks and flags.
+        """
+        duty = self.get(limit=1)['payload'][0]
+        self.assertEqual(duty['user'], self.user.pk)
+        self.assertIsNotNone(duty['task3_end'])
+        self.assertFalse(duty['is_task1_submitted'])
+
+    def test_payload_template_kept(self):
+        """Marks of duties archived from a template don't move with it.
+        """
+        template = DutyTemplate.objects.create(name='lab', duty_duration=120)
+        task = template.tasks.create(start=10, window=20)
+        duty = Duty.objects.create(user=self.user, schedule=template.pk)
+        Duty.objects.filter(pk=duty.pk).delete()
+        # archived under an id the other history rows don't use
+        duty.pk = 200
+        DutyHistory.objects.archive([duty], now=duty.duty_end)
+
+        task.start = 20
+        with self.assertRaises(TemplateInUse):
+            task.save()
+        with self.assertRaises(TemplateInUse):
+            template.delete()
+        self.assertEqual(DutyHistory.objects.get(pk=200).marks['task1_start'],
+            duty.duty_start + timedelta(minutes=10))
+        payload = self.get(limit=1)['payload'][0]
+        self.assertEqual(payload['id'], 200)
+        self.assertIsNotNone(payload['task1_start'])
+
+    def test_payload_unknown_schedule(self):
+        """Duties archived from a template deleted earlier are listed unmarked.
+        """
+        DutyHistory.objects.filter(pk=7).update(schedule=999)
+        duty = self.get(limit=1)['payload'][0]
+        self.assertEqual(duty['id'], 7)
+        self.assertIsNone(duty['task1_start'])
+        self.assertEqual(DutyHistory.objects.get(pk=7).marks, {})
+
+    def test_payload_schedule_per_page(self):
+        """A page looks every schedule up once, whatever its number of rows.
+        """
+        template = DutyTemplate.objects.create(name='lab', duty_duration=120)
+        template.tasks.create(start=10, window=20)
+        DutyHistory.objects.filter(pk__lte=4).update(schedule=template.pk)
+        DutyHistory.objects.filter(pk=5).update(schedule=999)
+        with mock.patch('duty_api.serializers.get_schedule', wraps=get_schedule) as lookup:
+            payload = self.get()['payload']
+        self.assertEqual(len(payload), 7)
+        self.assertEqual(sorted(call.args[0] for call in lookup.call_args_list),
+            [0, template.pk, 999])
+
+    def test_filters(self):
+        """Date range filters on the duty start, users only see their own duties.
+        """
+        data = self.get(start=(self.now - timedelta(days=2)).date().isoformat(),
+            end=(self.now - timedelta(days=1)).isoformat())
+        self.assertEqual([duty['id'] for duty in data['payload']], [3])
+
+        # user filter is ignored for non-staff
+        data = self.get(user=self.other.pk)
+        self.assertNotIn(100, [duty['id'] for duty in data['payload']])
+
+        self.user.is_staff = True
+        self.user.save()
+        data = self.get(user=self.other.pk)
+        self.assertEqual([duty['id'] for duty in data['payload']], [100])
+
+    def test_invalid_params(self):
+        """Malformed cursors, dates and page sizes are refused.
+        """
+        for params in ({'cursor': 'nope'}, {'start': 'yesterday'}, {'limit': 0}):
+            response = self.client.get(reverse('duty-history'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_deep_page_cost(self):
+        """A deep page is one keyed range query, like the first page.
+        """
+        cursor = self.get(limit=5)['next']
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get(limit=5, cursor=cursor)
+        self.assertEqual([duty['id'] for duty in data['payload']], [5, 6])
+        selects = [query['sql'] for query in queries if 'duty_api_dutyhistory' in query['sql']]
+        self.assertEqual(len(selects), 1)
+        self.assertNotIn('OFFSET', selects[0])
@@ -1,11 +1,23 @@
-from django.test import TestCase
+import re
+from collections import OrderedDict
+from unittest import mock
+
+from django.contrib import admin
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from datetime import datetime, timedelta
 from django.contrib.auth import get_user_model
 
 from utils.random_support import RandomSupport
+from duty_api.admin import DutyTemplateAdmin, DutyTemplateTaskInline
+from duty_api.serializers import DutySerializer
+from duty_api.schedule import GENERATION_KEY, get_schedule
 from duty_api.models import (
-    Duty, DutyManager,
+    Duty, DutyHistory, DutyManager, DutyTemplate,
     BehalfWithNoUserError,
+    TemplateInUse,
     CannotStartOverOngoingDuty,
     CannotClearUnfinishedDuty,
 )
@@ -123,6 +135,240 @@ class TestDutyModel(BaseDutyTestCase):
             duty = user.duty
 
 
+    @override_settings(DUTY_COMPACT_SCHEMA=True)
+    def test_compact_duty_marks(self):
+        """Compact schema stores no task marks but derives the same ones on read.
+        """
+        duty = Duty.objects.create(user=self.create_user())
+        serialized = DutySerializer(duty).data
+
+        # task marks are not stored
+        stored = Duty.objects.values_list('task1_start', 'task3_end', 'overrides').get()
+        self.assertEqual(stored, (None, None, []))
+
+        # but are derived again on read
+        self.assertEqual(DutySerializer(Duty.objects.get(pk=duty.pk)).data, serialized)
+
+    @override_settings(DUTY_COMPACT_SCHEMA=True)
+    def test_compact_duty_marks_overrides(self):
+        """Marks moved off the schedule survive a compact save as overrides.
+        """
+        duty = Duty.objects.create(user=self.create_user())
+        duty.update_duty_end(duty.task2_end + timedelta(seconds=1.5))
+        duty.save()
+
+        # task1 & task2 end are clamped to the new duty end
+        self.assertEqual(len(duty.overrides), 2)
+        reloaded = Duty.objects.get(pk=duty.pk)
+        for name in ('duty_end', 'task1_start', 'task1_end', 'task2_end', 'task3_end'):
+            self.assertEqual(getattr(reloaded, name), getattr(duty, name))
+
+
+class TestDutyDirtyFields(BaseDutyTestCase):
+    """Test saves of a loaded duty only write the changed columns.
+    """
+
+    def setUp(self):
+        self.duty = Duty.objects.get(pk=Duty.objects.create(user=self.create_user()).pk)
+
+    def saved_columns(self, duty, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            duty.save(**kwargs)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertLessEqual(len(updates), 1)
+        if not updates:
+            return set()
+        return set(re.findall(r'"(\w+)" = ', updates[0].split(' SET ')[1].split(' WHERE ')[0]))
+
+    def test_unchanged_not_saved(self):
+        """Saving an unchanged duty doesn't touch the database.
+        """
+        with self.assertNumQueries(0):
+            self.duty.save()
+
+    def test_flag_only(self):
+        """Changing a flag writes just that column.
+        """
+        self.duty.is_task2_submitted = True
+        self.assertEqual(self.duty.dirty_fields, {'is_task2_submitted'})
+        self.assertEqual(self.saved_columns(self.duty), {'is_task2_submitted'})
+        self.assertEqual(self.duty.dirty_fields, set())
+        self.assertTrue(Duty.objects.get(pk=self.duty.pk).is_task2_submitted)
+
+    def test_duty_end_moved(self):
+        """Moving the duty end writes it, the clamped task ends and their overrides.
+        """
+        self.duty.update_duty_end(self.duty.task2_end + timedelta(minutes=1))
+        self.assertEqual(self.saved_columns(self.duty),
+            {'duty_end', 'task1_end', 'task2_end', 'overrides'})
+
+        # then nothing is left to write
+        self.assertEqual(self.saved_columns(self.duty), set())
+
+    def test_fast_forward_persisted(self):
+        """Fast-forwarding the active duty writes only its moved marks.
+        """
+        duty_manager = DutyManager()
+        duty_manager.start_duty(self.create_user())
+        with CaptureQueriesContext(connection) as queries:
+            duty_manager.force_fast_forward_duty()
+        update = next(query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE "duty_api_duty"'))
+        self.assertIn('SET "duty_end" = ', update)
+        self.assertNotIn('duty_start', update)
+        self.assertNotIn('user_id', update)
+
+        reloaded = Duty.objects.get(pk=duty_manager.duty.pk)
+        self.assertEqual(reloaded.duty_end, duty_manager.duty.duty_end)
+        duty_manager.reset()
+
+    def test_refresh_clears_dirty(self):
+        """Refreshed fields are no longer dirty.
+        """
+        self.duty.is_task1_submitted = True
+        self.duty.refresh_from_db()
+        self.assertEqual(self.duty.dirty_fields, set())
+
+
+#############################################################################
+
+class TestDutyTemplateModel(BaseDutyTestCase):
+    """Test duties scheduled by configurable templates.
+    """
+
+    def create_template(self, tasks, duty_duration=240):
+        template = DutyTemplate.objects.create(
+            name=self.generate_name(), duty_duration=duty_duration)
+        for start, window in tasks:
+            template.tasks.create(start=start, window=window)
+        return template
+
+    def test_template_with_more_tasks(self):
+        """Duty follows its template, every task has a window.
+        """
+        template = self.create_template([(10, 20), (60, 15), (120, 30), (200, 40)])
+        duty = Duty.objects.create(user=self.create_user(), schedule=template.pk)
+
+        self.assertEqual(duty.duty_end, duty.duty_start + timedelta(minutes=240))
+        self.assertEqual(duty.task2_start, duty.duty_start + timedelta(minutes=60))
+        self.assertEqual(duty.task2_end, duty.duty_start + timedelta(minutes=75))
+        self.assertEqual(duty.task_windows[3], (
+            duty.duty_start + timedelta(minutes=200),
+            duty.duty_start + timedelta(minutes=240),
+        ))
+
+    def test_template_with_fewer_tasks(self):
+        """Task columns not covered by the template stay empty.
+        """
+        template = self.create_template([(10, 20)])
+        duty = Duty.objects.create(user=self.create_user(), schedule=template.pk)
+        duty.update_duty_end(duty.duty_end)
+
+        self.assertEqual(len(duty.task_windows), 1)
+        self.assertIsNone(Duty.objects.get(pk=duty.pk).task2_start)
+
+    def test_schedule_cached_until_template_changes(self):
+        """Template rows are read once, then again only after a change.
+        """
+        template = self.create_template([(10, 20), (60, 15)])
+        get_schedule(template.pk)
+        user = self.create_user()
+
+        # only the duty insert
+        with self.assertNumQueries(1):
+            duty = Duty.objects.create(user=user, schedule=template.pk)
+
+        # only templates no duty uses can be changed
+        duty.delete()
+        task = template.tasks.get(start=60)
+        task.window = 25
+        task.save()
+        schedule = get_schedule(template.pk)
+        self.assertEqual(schedule.offsets[3], timedelta(minutes=85))
+
+    def test_template_in_use_protected(self):
+        """Schedule of a template used by a duty can't be changed nor deleted.
+        """
+        template = self.create_template([(10, 20), (60, 15)])
+        duty = Duty.objects.create(user=self.create_user(), schedule=template.pk)
+        task = template.tasks.get(start=60)
+
+        template.duty_duration = 300
+        with self.assertRaises(TemplateInUse):
+            template.save()
+        task.window = 25
+        with self.assertRaises(TemplateInUse):
+            task.save()
+        with self.assertRaises(TemplateInUse):
+            template.tasks.create(start=100, window=10)
+        with self.assertRaises(TemplateInUse):
+            task.delete()
+        with self.assertRaises(TemplateInUse):
+            template.delete()
+        with self.assertRaises(TemplateInUse):
+            DutyTemplate.objects.filter(pk=template.pk).delete()
+
+        # the name is only a label
+        template.refresh_from_db()
+        template.name = self.generate_name()
+        template.save()
+
+        # the duty still follows the template it was started with
+        duty.save()
+        self.assertEqual(duty.task2_end, duty.duty_start + timedelta(minutes=75))
+
+        duty.delete()
+        template.delete()
+        self.assertFalse(DutyTemplate.objects.exists())
+
+    def test_template_in_use_admin(self):
+        """Admin keeps the schedule of a template in use read-only.
+        """
+        template = self.create_template([(10, 20)])
+        unused = self.create_template([(10, 20)])
+        Duty.objects.create(user=self.create_user(), schedule=template.pk)
+        request = RequestFactory().get('/')
+        request.user = User.objects.create_superuser(
+            email=self.generate_email(), password=self.generate_alphanumeric())
+
+        model_admin = DutyTemplateAdmin(DutyTemplate, admin.site)
+        inline = DutyTemplateTaskInline(DutyTemplate, admin.site)
+        self.assertFalse(model_admin.has_delete_permission(request, template))
+        self.assertIn('duty_duration', model_admin.get_readonly_fields(request, template))
+        self.assertFalse(inline.has_change_permission(request, template))
+        self.assertFalse(inline.has_add_permission(request, template))
+        self.assertTrue(model_admin.has_delete_permission(request, unused))
+        self.assertTrue(inline.has_change_permission(request, unused))
+
+        with mock.patch.object(model_admin, 'message_user'):
+            model_admin.delete_queryset(request, DutyTemplate.objects.all())
+        self.assertEqual(list(DutyTemplate.objects.all()), [template])
+
+    def test_schedule_dropped_by_other_worker(self):
+        """A template changed through another worker is read again.
+        """
+        template = self.create_template([(10, 20)])
+        get_schedule(template.pk)
+        with self.assertNumQueries(0):
+            get_schedule(template.pk)
+
+        # the other worker's invalidate_schedules()
+        cache.set(GENERATION_KEY, 'other worker', None)
+        # template, tasks
+        with self.assertNumQueries(2):
+            get_schedule(template.pk)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_schedule_not_kept_in_process(self):
+        """Without a shared cache templates are read on every lookup.
+        """
+        template = self.create_template([(10, 20)])
+        get_schedule(template.pk)
+        with self.assertNumQueries(2):
+            get_schedule(template.pk)
+
+
 #############################################################################
 
 class TestDutyManagerModel(BaseDutyTestCase):
@@ -145,6 +391,25 @@ class TestDutyManagerModel(BaseDutyTestCase):
         self.assertIs(duty_manager, duty_manager2)
         self.assertIs(duty_manager2, DutyManager.instance)
 
+    def test_duty_manager_slots_bounded(self):
+        """Only the most recently used slot managers are kept.
+        """
+        with mock.patch.object(DutyManager, 'instances', OrderedDict()), \
+                mock.patch.object(DutyManager, 'max_instances', 3):
+            lobby = DutyManager('lobby')
+            lobby.start_duty(self.user1)
+            for slot in ('a', 'lobby', 'b', 'c'):
+                DutyManager(slot)
+            self.assertEqual(list(DutyManager.instances), ['lobby', 'b', 'c'])
+
+            for slot in ('d', 'e'):
+                DutyManager(slot)
+            self.assertEqual(list(DutyManager.instances), ['c', 'd', 'e'])
+            # evicted managers only cached the shared state
+            self.assertIsNot(DutyManager('lobby'), lobby)
+            self.assertEqual(DutyManager('lobby').user, self.user1)
+            self.assertEqual(DutyManager.duty_of(self.user1), lobby.duty)
+
     def test_start_and_clear_duty(self):
         """Duty manager can start duty if previously there is no duty
         then the duty can be cleared and replaced with newer one.
@@ -173,6 +438,31 @@ class TestDutyManagerModel(BaseDutyTestCase):
         with self.assertRaises(Duty.DoesNotExist):
             self.user1.duty
 
+    def test_cleared_duty_archived(self):
+        """Clearing a duty moves it to the history without touching the user.
+        """
+        duty_manager = DutyManager()
+        duty_manager.start_duty(self.user1)
+        duty = duty_manager.duty
+        duty.update_duty_end(duty.task2_end)
+        duty.save()
+
+        duty_id = duty.pk
+
+        # state read & swap, submitted flags, archive (known ids, insert, day &
+        # user day stats: select, savepointed insert), delete (plus savepoint),
+        # no user update
+        with self.assertNumQueries(16):
+            duty_manager._clear()
+        self.assertFalse(Duty.objects.exists())
+
+        # cleared before its end, so it ends now
+        archived = DutyHistory.objects.get(pk=duty_id)
+        self.assertEqual(archived.user, self.user1)
+        self.assertLess(archived.duty_end, duty.duty_end)
+        self.assertEqual(archived.marks['task1_end'], duty.task1_end)
+        self.assertEqual(archived.bucket, duty.duty_start.year * 100 + duty.duty_start.month)
+
     def test_only_one_active_duty_and_unable_clear_unfinished_duty(self):
         """One duty at a time handled by single manager. 
         New duty cannot be created when ongoing duty not finished yet.
@@ -0,0 +1,196 @@
+import random
+from datetime import timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from duty_api.tests.test_models import BaseDutyTestCase
+from duty_api.tests.test_state import worker_manager
+from duty_api.scheduler import DutyScheduler, IntervalTree
+from duty_api.models import Duty, DutyHistory, DutyManager
+
+
+class TestIntervalTree(SimpleTestCase):
+    """Test interval tree queries against a brute force scan.
+    """
+
+    def setUp(self):
+        self.random = random.Random(7558)
+        self.tree = IntervalTree()
+        self.intervals = {}
+        for key in range(500):
+            self.insert(key)
+
+    def insert(self, key):
+        start = self.random.randint(0, 1000)
+        end = start + self.random.randint(1, 100)
+        self.tree.insert(key, start, end, key)
+        self.intervals[key] = (start, end)
+
+    def assertMatchesScan(self):
+        for _ in range(100):
+            a = self.random.randint(-10, 1110)
+            b = a + self.random.randint(0, 50)
+            self.assertEqual(sorted(self.tree.at(a)), sorted(
+                key for key, (start, end) in self.intervals.items() if start <= a < end))
+            self.assertEqual(sorted(self.tree.overlapping(a, b)), sorted(
+                key for key, (start, end) in self.intervals.items() if start < b and end > a))
+
+    def test_queries(self):
+        """Point and range queries return exactly the matching intervals.
+        """
+        self.assertEqual(len(self.tree), 500)
+        self.assertMatchesScan()
+
+    def test_replace_and_remove(self):
+        """Queries stay correct after intervals are replaced and removed.
+        """
+        for key in range(0, 500, 3):
+            self.insert(key)
+        for key in range(0, 500, 5):
+            self.tree.remove(key)
+            del self.intervals[key]
+        self.assertEqual(len(self.tree), len(self.intervals))
+        self.assertMatchesScan()
+
+
+class TestDutyScheduler(BaseDutyTestCase):
+    """Test duty scheduler lookups and incremental sync.
+    """
+
+    def setUp(self):
+        self.scheduler = DutyScheduler()
+        self.scheduler.clear()
+        self.now = timezone.now()
+
+    def create_duty(self, slot, start_minutes, end_minutes):
+        duty = Duty.objects.create(user=self.create_user(), slot=slot)
+        Duty.objects.filter(pk=duty.pk).update(
+            duty_start=self.now + timedelta(minutes=start_minutes),
+            duty_end=self.now + timedelta(minutes=end_minutes),
+        )
+        return duty
+
+    def duty_ids(self, scheduled):
+        return sorted(duty.duty_id for duty in scheduled)
+
+    def test_lookups_across_slots(self):
+        """Duties of every slot are indexed, lookups can filter by slot.
+        """
+        past = self.create_duty('lobby', -300, -120)
+        lobby = self.create_duty('lobby', -60, 120)
+        lab = self.create_duty('lab', -30, 150)
+
+        self.assertEqual(self.duty_ids(self.scheduler.on_duty_at(self.now)), [lobby.pk, lab.pk])
+        self.assertEqual(self.duty_ids(self.scheduler.on_duty_at(self.now, slot='lab')), [lab.pk])
+        self.assertEqual(self.scheduler.on_duty_at(self.now, slot='unknown'), [])
+
+        # [-200, -60) touches the past duty, ends exactly where lobby starts
+        overlapping = self.scheduler.overlapping(
+            self.now - timedelta(minutes=200), self.now - timedelta(minutes=60))
+        self.assertEqual(self.duty_ids(overlapping), [past.pk])
+
+    def test_incremental_refresh(self):
+        """Refresh picks up new, fast-forwarded and cleared duties.
+        """
+        manager = worker_manager()
+        manager.start_duty(self.create_user())
+        duty = manager.duty
+        self.assertEqual(self.duty_ids(self.scheduler.on_duty_at()), [duty.pk])
+
+        # another worker fast-forwards the duty to its end
+        worker_manager().force_fast_forward_duty(next_minutes=0)
+        self.assertEqual(self.scheduler.on_duty_at(), [])
+        self.assertEqual(self.duty_ids(self.scheduler.on_duty_at(duty.duty_start)), [duty.pk])
+
+        # finished duties are not re-read, only new duties & history are
+        with self.assertNumQueries(2):
+            self.scheduler.refresh()
+
+        # archived duty stays on record
+        duty_id = duty.pk
+        manager._clear()
+        self.assertEqual(self.duty_ids(self.scheduler.on_duty_at(duty.duty_start)), [duty_id])
+
+        # running duty cleared before it finished disappears
+        second = self.create_duty('lab', -10, 60)
+        self.assertEqual(self.duty_ids(self.scheduler.on_duty_at(slot='lab')), [second.pk])
+        second.delete()
+        self.assertEqual(self.scheduler.on_duty_at(slot='lab'), [])
+
+    def test_cleared_out_of_id_order(self):
+        """A running duty cleared after a newer one stays on record.
+        """
+        first, second = DutyManager('a'), DutyManager('b')
+        first.start_duty(self.create_user())
+        second.start_duty(self.create_user())
+        duty_ids = sorted([first.duty.pk, second.duty.pk])
+        start = first.duty.duty_start
+        self.scheduler.refresh()
+
+        second._clear()
+        self.scheduler.refresh()
+        first._clear()
+        overlapping = self.scheduler.overlapping(start, timezone.now())
+        self.assertEqual(self.duty_ids(overlapping), duty_ids)
+
+    def refresh_racing(self, race):
+        """Refresh with `race()` run between the duty and the history query.
+        """
+        values = DutyScheduler._values
+        calls = []
+
+        def racing(queryset):
+            rows = list(values(queryset))
+            if not calls:
+                race()
+            calls.append(queryset)
+            return rows
+        with mock.patch.object(DutyScheduler, '_values', side_effect=racing):
+            self.scheduler.refresh()
+
+    def create_racing_duties(self):
+        """Refresh while a duty is created, then a newer one created and archived.
+
+        Returns:
+            tuple: the duty left running, id of the archived duty
+        """
+        created = []
+
+        def race():
+            created.extend(self.create_duty(slot, -10, 60) for slot in ('a', 'b'))
+            DutyHistory.objects.archive([created[1]])
+            Duty.objects.filter(pk=created[1].pk).delete()
+
+        values = DutyScheduler._values
+        def racing(queryset):
+            rows = list(values(queryset))
+            if not created:
+                race()
+            return rows
+        with mock.patch.object(DutyScheduler, '_values', side_effect=racing):
+            self.scheduler.refresh()
+        return created[0], created[1].pk
+
+    def test_created_during_refresh(self):
+        """Duty created during a refresh, below an archived one, is indexed next.
+        """
+        running, archived_id = self.create_racing_duties()
+        self.assertEqual(self.duty_ids(self.scheduler.on_duty_at(slot='a')), [running.pk])
+        self.assertEqual(self.duty_ids(self.scheduler.overlapping(
+            running.duty_start, timezone.now(), slot='b')), [archived_id])
+
+    def test_created_during_refresh_archived(self):
+        """Duty created during a refresh and archived before the next one is indexed.
+        """
+        running, archived_id = self.create_racing_duties()
+        duty_id = running.pk
+        DutyHistory.objects.archive([running])
+        running.delete()
+        overlapping = self.scheduler.overlapping(running.duty_start, timezone.now())
+        self.assertEqual(self.duty_ids(overlapping), [duty_id, archived_id])
+
+    def tearDown(self):
+        self.scheduler.clear()
+        DutyManager().reset()
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from duty_api.tests.test_models import BaseDutyTestCase
+from duty_api.models import Duty, DutyHistory
+from duty_api.serializers import (
+    DutyHistorySerializer, DutySerializer, FastDutyHistorySerializer, FastDutySerializer,
+    compile_datetime_format,
+)
+
+
+class TestDatetimeFormat(BaseDutyTestCase):
+    """Test the precompiled datetime formats against `strftime`.
+    """
+
+    def test_matches_strftime(self):
+        """Compiled formats render like `strftime`, unknown directives fall back to it.
+        """
+        when = datetime(2021, 3, 4, 5, 6, 7, 89, tzinfo=dt_timezone.utc)
+        for output_format in ("%m/%d/%Y %H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f", "%d %b %Y",
+                "100%% %Y", "no directive"):
+            self.assertEqual(compile_datetime_format(output_format)(when),
+                when.strftime(output_format), output_format)
+
+    def test_iso_8601(self):
+        """ISO 8601 output writes UTC as Z like DRF.
+        """
+        when = datetime(2021, 3, 4, 5, 6, 7, tzinfo=dt_timezone.utc)
+        self.assertEqual(compile_datetime_format('iso-8601')(when), '2021-03-04T05:06:07Z')
+
+
+class TestFastSerializers(BaseDutyTestCase):
+    """Test the read-only serializers give the output of the model serializers.
+    """
+
+    def setUp(self):
+        self.duties = [Duty.objects.create(user=self.create_user()) for _ in range(3)]
+
+    def test_duty_parity(self):
+        """Instances, querysets and rows serialize like `DutySerializer`.
+        """
+        expected = DutySerializer(Duty.objects.order_by('pk'), many=True).data
+        queryset = Duty.objects.order_by('pk')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(FastDutySerializer(queryset, many=True).data, expected)
+        self.assertEqual(len(queries), 1)
+
+        self.assertEqual(FastDutySerializer(self.duties, many=True).data, expected)
+        self.assertEqual(FastDutySerializer(self.duties[0]).data, expected[0])
+        rows = list(queryset.values_list(*FastDutySerializer.columns()))
+        self.assertEqual(FastDutySerializer(rows, many=True).data, expected)
+
+    @override_settings(TIME_ZONE='America/New_York',
+        REST_FRAMEWORK={'DATETIME_FORMAT': "%Y-%m-%d %H:%M:%S.%f"})
+    def test_duty_parity_settings(self):
+        """Output follows the time zone and `REST_FRAMEWORK['DATETIME_FORMAT']`.
+        """
+        duty = Duty.objects.get(pk=self.duties[0].pk)
+        self.assertEqual(FastDutySerializer(duty).data, DutySerializer(duty).data)
+        with timezone.override('Asia/Tokyo'):
+            self.assertEqual(FastDutySerializer(duty).data, DutySerializer(duty).data)
+
+    @override_settings(DUTY_COMPACT_SCHEMA=True)
+    def test_compact_rows(self):
+        """Marks the compact schema doesn't store are derived from the row.
+        """
+        duty = Duty.objects.create(user=self.create_user())
+        expected = DutySerializer(duty).data
+        data = FastDutySerializer(Duty.objects.filter(pk=duty.pk), many=True).data
+        self.assertEqual(data, [expected])
+
+    def test_history_parity(self):
+        """Archived duties serialize like `DutyHistorySerializer`.
+        """
+        start = timezone.now()
+        for pk, duty in enumerate(self.duties, 1):
+            DutyHistory.objects.create(
+                id=pk, user=duty.user, slot='default', bucket=DutyHistory.bucket_of(start),
+                duty_start=start, duty_end=start + timedelta(hours=3), schedule=0,
+                overrides=[[5, -60 * 10 ** 6]], is_task2_submitted=True)
+        queryset = DutyHistory.objects.order_by('pk')
+        self.assertEqual(FastDutyHistorySerializer(queryset, many=True).data,
+            DutyHistorySerializer(queryset, many=True).data)
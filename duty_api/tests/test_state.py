@@ -0,0 +1,200 @@
+import os
+import tempfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+
+from django.test import override_settings
+
+from customuser.db.replicas import PrimaryReplicaRouter
+from duty_api.tests.test_models import BaseDutyTestCase
+from duty_api.state import (
+    DEFAULT_SLOT,
+    DutyStateConflict,
+    FileStateBackend,
+    StateSnapshot,
+    get_state_backend,
+)
+from duty_api.models import Duty, DutyManager, CannotStartOverOngoingDuty
+
+
+def worker_manager():
+    """A DutyManager as seen by another worker process, bypassing the singleton.
+    """
+    return object.__new__(DutyManager)
+
+
+class StateBackendTestMixin(object):
+    """Behaviour every duty state backend must share.
+    """
+
+    def setUp(self):
+        self.user1 = self.create_user()
+        self.user2 = self.create_user()
+
+    def test_duty_shared_between_workers(self):
+        """Duty started by one worker is visible to and clearable by another.
+        """
+        worker1, worker2 = worker_manager(), worker_manager()
+        self.assertIsNone(worker2.duty)
+
+        worker1.start_duty(self.user1)
+        self.assertEqual(worker2.duty, worker1.duty)
+        self.assertEqual(worker2.user, self.user1)
+
+        # 2nd worker must not be able to start over the 1st worker's duty
+        with self.assertRaises(CannotStartOverOngoingDuty):
+            worker2.start_duty(self.user2)
+
+        worker2._clear()
+        self.assertIsNone(worker1.duty)
+        self.assertEqual(Duty.objects.count(), 0)
+
+    def test_version_bumped_on_write(self):
+        """Every write moves the version stamp.
+        """
+        backend = get_state_backend()
+        version = backend.version(DEFAULT_SLOT)
+
+        worker_manager().start_duty(self.user1)
+        self.assertEqual(backend.version(DEFAULT_SLOT), version + 1)
+
+        worker_manager()._clear()
+        self.assertEqual(backend.version(DEFAULT_SLOT), version + 2)
+
+    def test_stale_swap_conflicts(self):
+        """Swap based on an outdated version is rejected and changes nothing.
+        """
+        backend = get_state_backend()
+        version = backend.version(DEFAULT_SLOT)
+        worker_manager().start_duty(self.user1)
+
+        with self.assertRaises(DutyStateConflict):
+            backend.compare_and_swap(DEFAULT_SLOT, version, None)
+        self.assertEqual(backend.read(DEFAULT_SLOT).duty_id, self.user1.duty.pk)
+
+    def test_start_rolled_back(self):
+        """Start whose transaction rolls back leaves the slot as it was.
+        """
+        backend = get_state_backend()
+        worker1, worker2 = worker_manager(), worker_manager()
+        with mock.patch.object(DutyManager, '_publish', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                worker1.start_duty(self.user1)
+        self.assertEqual(Duty.objects.count(), 0)
+        self.assertIsNone(backend.read(DEFAULT_SLOT).duty_id)
+
+        worker2.start_duty(self.user2)
+        self.assertEqual(worker_manager().user, self.user2)
+
+    def test_start_over_uncommitted_duty(self):
+        """Duty another worker hasn't committed yet holds the slot.
+        """
+        backend = get_state_backend()
+        backend.compare_and_swap(DEFAULT_SLOT, backend.version(DEFAULT_SLOT), 10 ** 6)
+        with self.assertRaises(CannotStartOverOngoingDuty):
+            worker_manager().start_duty(self.user1)
+        backend.compare_and_swap(DEFAULT_SLOT, backend.version(DEFAULT_SLOT), None)
+
+    def test_stale_worker_conflicts(self):
+        """Worker acting on a duty changed by another worker gets a conflict.
+        """
+        worker1, worker2 = worker_manager(), worker_manager()
+        worker1.start_duty(self.user1)
+        duty = worker2.duty
+
+        worker1.force_fast_forward_duty(next_minutes=-1)
+
+        # worker2 races on the version it read before the fast-forward
+        with self.assertRaises(DutyStateConflict):
+            worker2._clear(StateSnapshot(duty.pk, worker2._cached[0]))
+        self.assertEqual(Duty.objects.count(), 1)
+
+    def tearDown(self):
+        DutyManager().reset()
+
+
+class TestDatabaseStateBackend(StateBackendTestMixin, BaseDutyTestCase):
+    """Test the default select_for_update backend.
+    """
+
+    def test_cached_duty_reused_while_version_unchanged(self):
+        """Reads only check the version stamp until it moves.
+        """
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem):
+            manager = worker_manager()
+            manager.start_duty(self.user1)
+            duty = manager.duty
+
+            # process-local cache: the stamp comes from the state row
+            with self.assertNumQueries(1):
+                self.assertIs(manager.duty, duty)
+
+    def test_version_stamp_cached_from_primary(self):
+        """Version stamp is cached as read from the primary, a replica may lag behind.
+        """
+        worker_manager().start_duty(self.user1)
+        backend = get_state_backend()
+        backend.cache.delete(backend.key % DEFAULT_SLOT)
+        with mock.patch.object(PrimaryReplicaRouter, 'db_for_read', return_value='lagging'):
+            self.assertEqual(backend.version(DEFAULT_SLOT), 1)
+            backend.cache.delete(backend.key % DEFAULT_SLOT)
+            self.assertEqual(async_to_sync(backend.aversion)(DEFAULT_SLOT), 1)
+
+    def test_version_stamp_served_from_shared_cache(self):
+        """With a shared cache, reading the active duty costs no query.
+        """
+        with tempfile.TemporaryDirectory() as cache_dir:
+            caches = {'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': cache_dir,
+            }}
+            with override_settings(CACHES=caches):
+                manager = worker_manager()
+                manager.start_duty(self.user1)
+                duty = manager.duty
+
+                with self.assertNumQueries(0):
+                    self.assertIs(manager.duty, duty)
+
+                # other worker clears, stamp moves and duty is reloaded
+                worker_manager()._clear()
+                self.assertIsNone(manager.duty)
+
+
+@override_settings(DUTY_STATE={'BACKEND': 'duty_api.state.CacheStateBackend'})
+class TestCacheStateBackend(StateBackendTestMixin, BaseDutyTestCase):
+    """Test the cache backend.
+    """
+
+    def tearDown(self):
+        super().tearDown()
+        get_state_backend().cache.clear()
+
+
+class TestFileStateBackend(StateBackendTestMixin, BaseDutyTestCase):
+    """Test the SQLite file backend.
+    """
+
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.state_dir.name, 'state.sqlite3')
+        self.settings_override = override_settings(DUTY_STATE={
+            'BACKEND': 'duty_api.state.FileStateBackend',
+            'OPTIONS': {'path': path},
+        })
+        self.settings_override.enable()
+        super().setUp()
+
+    def test_state_persisted_in_file(self):
+        """State survives a fresh backend opening the same file.
+        """
+        worker_manager().start_duty(self.user1)
+        state = FileStateBackend(path=get_state_backend().path).read(DEFAULT_SLOT)
+        self.assertEqual(state.duty_id, self.user1.duty.pk)
+
+    def tearDown(self):
+        super().tearDown()
+        self.settings_override.disable()
+        self.state_dir.cleanup()
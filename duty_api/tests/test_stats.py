@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from duty_api.tests.test_models import BaseDutyTestCase
+from duty_api.models import (
+    Duty, DutyDayStats, DutyHistory, DutyStats, DutyUserDayStats,
+)
+
+
+class BaseStatsTestCase(BaseDutyTestCase):
+
+    def setUp(self):
+        self.user = self.create_user()
+        self.other = self.create_user()
+        # 10:00 in Asia/Singapore
+        self.start = datetime(2021, 3, 4, 2, 0, tzinfo=dt_timezone.utc)
+        self.archive(self.user, self.start, minutes=180, submitted=(1, 2, 3))
+        self.archive(self.user, self.start + timedelta(hours=4), minutes=60, submitted=(1, ))
+        self.archive(self.other, self.start + timedelta(days=1), minutes=120)
+
+    def archive(self, user, duty_start, minutes, submitted=()):
+        duty = Duty(user=user, duty_start=duty_start, duty_end=duty_start + timedelta(hours=3),
+            **{'is_task%d_submitted' % task: True for task in submitted})
+        duty.pk = Duty.objects.count() + DutyHistory.objects.count() + 1
+        return DutyHistory.objects.archive([duty], now=duty_start + timedelta(minutes=minutes))
+
+    def counts(self, queryset):
+        return list(queryset.order_by('day').values_list(
+            'day', 'duties', 'task1_submitted', 'task2_submitted', 'task3_submitted', 'duration'))
+
+
+class TestDutyStats(BaseStatsTestCase):
+    """Test the rollups kept by `DutyHistory.objects.archive`.
+    """
+
+    def test_rollup(self):
+        """Archived duties are summed per local day and per user and day.
+        """
+        day = self.start.date()
+        self.assertEqual(self.counts(DutyDayStats.objects.all()), [
+            (day, 2, 2, 1, 1, 240 * 60),
+            (day + timedelta(days=1), 1, 0, 0, 0, 120 * 60),
+        ])
+        self.assertEqual(self.counts(DutyUserDayStats.objects.filter(user=self.user)), [
+            (day, 2, 2, 1, 1, 240 * 60),
+        ])
+
+    def test_archive_twice(self):
+        """Archiving a duty again counts it once.
+        """
+        history = DutyHistory.objects.get(pk=1)
+        duty = Duty(pk=1, user=self.user, duty_start=history.duty_start,
+            duty_end=history.duty_end)
+        self.assertEqual(DutyHistory.objects.archive([duty]), [])
+        self.assertEqual(DutyDayStats.objects.get(day=self.start.date()).duties, 2)
+
+    def test_rebuild(self):
+        """Rebuilding from the history gives the incremental rollups.
+        """
+        days = self.counts(DutyDayStats.objects.all())
+        user_days = self.counts(DutyUserDayStats.objects.all())
+        DutyDayStats.objects.update(duties=0)
+        DutyUserDayStats.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_duty_stats', stdout=out)
+        self.assertIn("Rolled up 3 archived duties.", out.getvalue())
+        self.assertEqual(self.counts(DutyDayStats.objects.all()), days)
+        self.assertEqual(self.counts(DutyUserDayStats.objects.all()), user_days)
+
+    def test_rebuild_reads_after_delete(self):
+        """History is read once the rollups are deleted.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            DutyStats.rebuild()
+        sql = [query['sql'] for query in queries.captured_queries]
+        deleted = max(index for index, query in enumerate(sql)
+            if query.startswith('DELETE') and DutyDayStats._meta.db_table in query)
+        read = next(index for index, query in enumerate(sql)
+            if query.startswith('SELECT') and DutyHistory._meta.db_table in query)
+        self.assertLess(deleted, read)
+
+
+class TestStatsAPI(BaseStatsTestCase):
+    """Test `duties/api/stats/`.
+    """
+
+    def get(self, **params):
+        response = self.client.get(reverse('duty-stats'), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_own_stats(self):
+        """Users get their own daily stats with rates and average duration.
+        """
+        self.client.force_login(self.user)
+        data = self.get(user=self.other.pk)
+        self.assertEqual(data['payload'], [{
+            'day': self.start.date(), 'duties': 2,
+            'task1_rate': 1.0, 'task2_rate': 0.5, 'task3_rate': 0.5,
+            'average_duration': 120 * 60,
+        }])
+        self.assertEqual(data['total']['duties'], 2)
+
+    def test_staff_stats(self):
+        """Staff get every user's stats, or one user's, within a day range.
+        """
+        staff = self.create_user()
+        staff.is_staff = True
+        staff.save()
+        self.client.force_login(staff)
+
+        data = self.get()
+        self.assertEqual([day['duties'] for day in data['payload']], [2, 1])
+        self.assertEqual(data['total']['duties'], 3)
+        self.assertEqual(data['total']['task1_rate'], 2 / 3)
+
+        data = self.get(user=self.other.pk)
+        self.assertEqual([day['duties'] for day in data['payload']], [1])
+
+        end = (self.start + timedelta(days=1)).date().isoformat()
+        data = self.get(end=end)
+        self.assertEqual([day['duties'] for day in data['payload']], [2])
+
+        data = self.get(start='2030-01-01')
+        self.assertEqual(data['payload'], [])
+        self.assertIsNone(data['total']['task1_rate'])
+
+        response = self.client.get(reverse('duty-stats'), {'start': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
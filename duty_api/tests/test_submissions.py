@@ -0,0 +1,129 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from duty_api.tests.test_models import BaseDutyTestCase
+from duty_api.submissions import SubmissionQueue
+from duty_api.models import Duty, DutyManager, TaskNotOpen
+
+
+class TestSubmissionQueue(BaseDutyTestCase):
+    """Test coalescing of task submissions.
+    """
+
+    def setUp(self):
+        self.duties = [Duty.objects.create(user=self.create_user()) for _ in range(3)]
+
+    def test_flush_coalesces(self):
+        """A burst of submissions is written with one UPDATE per task.
+        """
+        queue = SubmissionQueue()
+        for duty in self.duties:
+            queue.submit(duty.pk, 1)
+            queue.submit(duty.pk, 1)
+        queue.submit(self.duties[0].pk, 2)
+        self.assertEqual(len(queue), 4)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(queue.flush(), 2)
+        self.assertEqual(len(queries), 2)
+        for query, column in zip(queries, ('is_task1_submitted', 'is_task2_submitted')):
+            set_clause = query['sql'].split(' SET ')[1].split(' WHERE ')[0]
+            self.assertEqual(set_clause, '"%s" = 1' % column)
+
+        self.assertEqual(Duty.objects.filter(is_task1_submitted=True).count(), 3)
+        self.assertEqual(list(Duty.objects.filter(is_task2_submitted=True)), self.duties[:1])
+        self.assertEqual(len(queue), 0)
+        with self.assertNumQueries(0):
+            queue.flush()
+
+    def test_flush_when_full(self):
+        """Reaching `max_pending` flushes right away.
+        """
+        queue = SubmissionQueue(max_pending=2)
+        queue.submit(self.duties[0].pk, 3)
+        self.assertFalse(Duty.objects.filter(is_task3_submitted=True).exists())
+        queue.submit(self.duties[1].pk, 3)
+        self.assertEqual(Duty.objects.filter(is_task3_submitted=True).count(), 2)
+
+
+@override_settings(DUTY_SUBMISSION_FLUSH_INTERVAL=None)
+class TestTaskSubmission(BaseDutyTestCase):
+    """Test submitting tasks of the active duty.
+    """
+
+    def setUp(self):
+        self.duty_manager = DutyManager()
+        self.user = self.create_user()
+        self.duty_manager.start_duty(self.user)
+        self.client.force_login(self.user)
+
+    def open_task(self, task):
+        duty = self.duty_manager.duty
+        setattr(duty, 'task%d_start' % task, timezone.now() - timedelta(minutes=1))
+
+    def test_submit_task(self):
+        """Open task is submitted once, closed and unknown ones are refused.
+        """
+        url = reverse('duty-task', args=[1])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("can only be submitted", response.data['message'])
+
+        self.open_task(1)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(Duty.objects.get(user=self.user).is_task1_submitted)
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(reverse('duty-task', args=[4]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_submit_task_queries(self):
+        """Window is checked in memory, the flag written with a single UPDATE.
+        """
+        self.open_task(2)
+        self.client.get(reverse('duty-api'))
+
+        # flag update, the slot version comes from the shared cache
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('duty-task', args=[2]))
+        self.assertEqual(response.status_code, 202)
+
+    def test_window_closed(self):
+        """Task can't be submitted before its window opens.
+        """
+        with self.assertRaises(TaskNotOpen):
+            self.duty_manager.submit_task(3)
+
+    def test_archived_with_submissions(self):
+        """Cleared duty keeps its submitted tasks in the history.
+        """
+        self.open_task(1)
+        self.duty_manager.submit_task(1)
+        self.duty_manager.force_fast_forward_duty()
+        self.duty_manager.clear_duty()
+        self.assertTrue(self.user.duty_history.get().is_task1_submitted)
+
+    def test_archived_with_other_worker_submissions(self):
+        """Cleared duty keeps the tasks submitted through another worker.
+        """
+        self.open_task(1)
+        self.duty_manager.submit_task(1)
+        # flushed by another worker, this one's cached duty doesn't know
+        Duty.objects.filter(pk=self.duty_manager.duty.pk).update(is_task2_submitted=True)
+        self.duty_manager.force_fast_forward_duty(next_minutes=-1)
+        self.duty_manager.clear_duty()
+
+        history = self.user.duty_history.get()
+        self.assertTrue(history.is_task1_submitted)
+        self.assertTrue(history.is_task2_submitted)
+
+    def tearDown(self):
+        self.duty_manager.reset()
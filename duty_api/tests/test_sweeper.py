@@ -0,0 +1,74 @@
+from io import StringIO
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from duty_api.tests.test_models import BaseDutyTestCase
+from duty_api.sweeper import start_sweeper, sweep_expired_duties
+from duty_api.models import Duty, DutyHistory, DutyManager
+
+
+class TestDutySweeper(BaseDutyTestCase):
+    """Test clearing of finished duties.
+    """
+
+    def setUp(self):
+        self.duty_manager = DutyManager()
+        self.duty_manager.start_duty(self.create_user())
+
+        # ghost duties of other users, no longer active in any slot
+        self.ghosts = [Duty.objects.create(user=self.create_user()) for _ in range(5)]
+        self.running = Duty.objects.create(user=self.create_user(), slot='lab')
+
+    def expire(self, *duties):
+        Duty.objects.filter(pk__in=[duty.pk for duty in duties]).update(
+            duty_end=timezone.now() - timedelta(minutes=1))
+
+    def test_sweep_expired_duties(self):
+        """Finished duties are cleared in batches, running ones are kept.
+        """
+        self.expire(self.duty_manager.duty, *self.ghosts)
+
+        self.assertEqual(sweep_expired_duties(batch_size=2), 6)
+        self.assertEqual(list(Duty.objects.all()), [self.running])
+        self.assertEqual(DutyHistory.objects.count(), 6)
+
+        # swept duty no longer blocks the slot
+        self.assertIsNone(self.duty_manager.duty)
+        self.duty_manager.start_duty(self.create_user())
+
+    def test_sweep_batch_queries(self):
+        """Each batch costs a bounded number of queries, whatever its size.
+        """
+        self.expire(*self.ghosts)
+
+        # select, savepoint, state of the one slot, archive (known ids, insert,
+        # day & user day stats: select, savepointed insert), delete, release,
+        # then the empty select ending the sweep
+        with self.assertNumQueries(16):
+            self.assertEqual(sweep_expired_duties(batch_size=10), 5)
+
+    def test_sweep_duties_command(self):
+        """Management command sweeps once and reports the count.
+        """
+        self.expire(*self.ghosts)
+        out = StringIO()
+        call_command('sweep_duties', batch_size=2, stdout=out)
+        self.assertIn("Swept 5 finished duties.", out.getvalue())
+
+    def test_start_sweeper(self):
+        """The sweeper thread is started on demand, once per process.
+        """
+        self.assertIsNone(start_sweeper())
+
+        with override_settings(DUTY_SWEEPER_INTERVAL=3600):
+            sweeper = start_sweeper()
+            self.assertTrue(sweeper.is_alive())
+            self.assertIs(start_sweeper(), sweeper)
+        sweeper.stop()
+        sweeper.join()
+
+    def tearDown(self):
+        self.duty_manager.reset()
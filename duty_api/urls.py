@@ -1,8 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
-from .views import duty_handler, duty_view
+from .views import duty_handler, duty_view, export_handler, history_handler, stats_handler, task_handler
 
 urlpatterns = [
     path('', duty_view, name='duty-page'),
     path('api/', duty_handler, name='duty-api'),
+    path('api/tasks/<int:task>/', task_handler, name='duty-task'),
+    path('api/history/', history_handler, name='duty-history'),
+    path('api/stats/', stats_handler, name='duty-stats'),
+    path('api/export/', export_handler, name='duty-export'),
 ]
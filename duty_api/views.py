@@ -1,40 +1,82 @@
+import hashlib
+import operator
+from datetime import datetime, time
+
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags, quote_etag
 
 from django.contrib.auth.decorators import login_required
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import status
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
+from rest_framework.settings import api_settings
+
+from users.cache import fragment_context
 
-from .serializers import DutySerializer
+from . import export
+from .pagination import InvalidCursor, keyset_page
+from .serializers import DutySerializer, FastDutyHistorySerializer, FastDutySerializer
+from .schedule import UnknownSchedule
+from .state import DEFAULT_SLOT, DutyStateConflict
 from .models import (
-    Duty, DutyManager,
+    DEFAULT_SCHEDULE_ID, Duty, DutyDayStats, DutyHistory, DutyManager, DutyStats,
+    DutyUserDayStats,
     CannotStartOverOngoingDuty,
     CannotClearUnfinishedDuty,
+    TaskAlreadySubmitted,
+    TaskNotOpen,
+    UnknownTask,
 )
 
 User = get_user_model()
 
 def get_user_duty(user):
-    try:
-        return user.duty
-    except Duty.DoesNotExist:
-        return None
+    return DutyManager.duty_of(user)
+
+def get_slot_manager(duty):
+    return DutyManager(duty.slot if duty else DEFAULT_SLOT)
+
+def duty_etag(slot, version, duty_id, user):
+    """Strong ETag of the GET payload of `user`'s duty.
+
+    The payload only changes with the duty (its id and the version stamp of
+    its slot), the user's name in the message, and the datetime format and
+    time zone it is rendered in, so it is known without serializing.
+    """
+    key = '|'.join(str(part) for part in (
+        slot, version, duty_id, user.pk, user.name,
+        api_settings.DATETIME_FORMAT, timezone.get_current_timezone_name()))
+    return quote_etag(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest())
+
+def etag_matches(request, etag):
+    """Whether `If-None-Match` of the request matches `etag`.
+    """
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    return '*' in etags or any(tag.removeprefix('W/') == etag for tag in etags)
 
 @login_required
 def duty_view(request):
     user = request.user
-    duty_manager = DutyManager()
+    duty_manager = get_slot_manager(get_user_duty(user))
     # GET
     if request.method == 'GET':
-        # duty slot is available to be started
+        # duty slot is available to be started, a finished duty may not have
+        # been swept yet
         if (not duty_manager.duty) or (duty_manager.is_duty_finished()):
             return render(request, 'start_duty.html', {'user': user})
 
         # user is the one undertaking the duty
         elif user == duty_manager.user:
-            return render(request, 'ongoing_duty.html', {'user': user})
+            return render(request, 'ongoing_duty.html', {
+                'user': user,
+                'duty': duty_manager.duty,
+                'fragments': fragment_context(user),
+            })
         
         # any other user has undertaken an ongoing duty currently
         else:
@@ -44,7 +86,6 @@ def duty_view(request):
 @permission_classes((IsAuthenticated, ))
 def duty_handler(request):
     user = request.user
-    duty_manager = DutyManager()
 
     #############################################
     ## Duty Start
@@ -52,9 +93,32 @@ def duty_handler(request):
 
     # POST
     if request.method == 'POST':
+        slot = request.data.get('slot', DEFAULT_SLOT)
+        if not isinstance(slot, str) or not 0 < len(slot) <= Duty.SLOT_MAX_LENGTH:
+            return Response(
+                {
+                    'success': False,
+                    'message': "Invalid duty slot.",
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         try:
-            user = User.objects.get(email=user.email)
-            duty_manager.start_duty(user=user)
+            schedule = int(request.data.get('template', DEFAULT_SCHEDULE_ID))
+        except (TypeError, ValueError):
+            schedule = None
+
+        duty_manager = DutyManager(slot)
+        try:
+            duty_manager.start_duty(user=user, schedule=schedule)
+        except UnknownSchedule as e:
+            return Response(
+                {
+                    'success': False,
+                    'message': e.message,
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except CannotStartOverOngoingDuty as e:
             return Response(
                 {
@@ -63,6 +127,14 @@ def duty_handler(request):
                 }, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+        except DutyStateConflict as e:
+            return Response(
+                {
+                    'success': False,
+                    'message': e.message,
+                },
+                status=status.HTTP_409_CONFLICT
+            )
 
         else:
             serializer = DutySerializer(duty_manager.duty)
@@ -80,7 +152,8 @@ def duty_handler(request):
     #############################################
 
     # Http401 if no ongoing duty for that user.
-    if not get_user_duty(user):
+    user_duty = get_user_duty(user)
+    if not user_duty:
         return Response(
             {
                 'success': False, 
@@ -89,29 +162,37 @@ def duty_handler(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Http500 when expired duty not deleted,
-    # if this happen please fix TODO: handle & delete expired duty
+    duty_manager = get_slot_manager(user_duty)
+
+    # Http500 when the user's duty is no longer the slot's active one,
+    # the expiry sweeper (see duty_api.sweeper) deletes such duties
     if (user != duty_manager.user):
         return Response(
             {
                 'success': False, 
                 'message': "User's duty is expired but not deleted. Request.user %s; Manager.user %s" 
-                    % (user.email, duty_manager.user.email)
+                    % (user.email, getattr(duty_manager.user, 'email', None))
             },
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
-    # GET
+    # GET, answered with 304 when the client has the current payload
     if request.method == 'GET':
         duty = duty_manager.duty
-        serializer = DutySerializer(duty)
+        etag = duty_etag(duty_manager.slot, duty_manager.version, duty.pk, user)
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        serializer = FastDutySerializer(duty)
         return Response(
             {
                 'success': True,
                 'message': "%s sent" % duty,
                 'payload': serializer.data
             },
-            status=status.HTTP_200_OK
+            status=status.HTTP_200_OK,
+            headers=headers
         )
 
     # DELETE
@@ -127,6 +208,14 @@ def duty_handler(request):
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
+        except DutyStateConflict as e:
+            return Response(
+                {
+                    'success': False,
+                    'message': e.message,
+                },
+                status=status.HTTP_409_CONFLICT
+            )
         else:
             return Response(
                 {
@@ -135,3 +224,199 @@ def duty_handler(request):
                     'payload': duty_str
                 }
             )
+
+@api_view(['POST'])
+@permission_classes((IsAuthenticated, ))
+def task_handler(request, task):
+    user = request.user
+
+    # Http400 if no ongoing duty for that user.
+    user_duty = get_user_duty(user)
+    duty_manager = get_slot_manager(user_duty)
+    if not user_duty or user != duty_manager.user:
+        return Response(
+            {
+                'success': False,
+                'message': "User has no ongoing duty at the moment."
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        duty_manager.submit_task(task)
+    except UnknownTask as e:
+        return Response(
+            {
+                'success': False,
+                'message': e.message,
+            },
+            status=status.HTTP_404_NOT_FOUND
+        )
+    except (TaskAlreadySubmitted, TaskNotOpen) as e:
+        return Response(
+            {
+                'success': False,
+                'message': e.message,
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    else:
+        return Response(
+            {
+                'success': True,
+                'message': "Task %s submitted." % task,
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+
+def parse_bound(value):
+    """Parse a date or datetime query parameter, dates are taken at midnight.
+    """
+    when = parse_datetime(value)
+    if when is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        when = datetime.combine(day, time.min)
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    return when
+
+@api_view(['GET'])
+@permission_classes((IsAuthenticated, ))
+def history_handler(request):
+    """Archived duties, newest first, a page at a time.
+
+    Query parameters:
+        user: id of the user, staff only, defaults to the requesting user
+        start, end: duty_start range [start, end), dates or datetimes
+        cursor: `next` of the previous page
+        limit: page size
+    """
+    user = request.user
+    params = request.query_params
+    queryset = DutyHistory.objects.all()
+
+    try:
+        if user.is_staff:
+            if params.get('user'):
+                queryset = queryset.filter(user_id=int(params['user']))
+        else:
+            queryset = queryset.filter(user_id=user.pk)
+        if params.get('start'):
+            queryset = queryset.filter(duty_start__gte=parse_bound(params['start']))
+        if params.get('end'):
+            queryset = queryset.filter(duty_start__lt=parse_bound(params['end']))
+        limit = int(params.get('limit', HISTORY_PAGE_SIZE))
+        if not 0 < limit <= HISTORY_MAX_PAGE_SIZE:
+            raise ValueError(limit)
+    except ValueError:
+        return Response(
+            {
+                'success': False,
+                'message': "Invalid history filter.",
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # rows are serialized straight from the values read, no model instances
+    columns = FastDutyHistorySerializer.columns()
+    key = operator.itemgetter(columns.index('duty_start'), columns.index('id'))
+    try:
+        rows, cursor = keyset_page(
+            queryset.values_list(*columns), params.get('cursor'), limit, key=key)
+    except InvalidCursor as e:
+        return Response(
+            {
+                'success': False,
+                'message': e.message,
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return Response(
+        {
+            'success': True,
+            'payload': FastDutyHistorySerializer(rows, many=True).data,
+            'next': cursor,
+        },
+        status=status.HTTP_200_OK
+    )
+
+@api_view(['GET'])
+@permission_classes((IsAdminUser, ))
+def export_handler(request):
+    """Every duty started in a month, streamed as CSV or NDJSON.
+
+    Query parameters:
+        month: YYYY-MM
+        output: csv (default) or ndjson
+    """
+    output = request.query_params.get('output', 'csv')
+    try:
+        bucket = export.parse_month(request.query_params.get('month', ''))
+    except ValueError:
+        bucket = None
+    if bucket is None or output not in export.FORMATS:
+        return Response(
+            {
+                'success': False,
+                'message': "Invalid export month or output.",
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    response = StreamingHttpResponse(
+        export.render(export.export_rows(bucket), output),
+        content_type=export.FORMATS[output])
+    response['Content-Disposition'] = 'attachment; filename="duties-%d.%s"' % (bucket, output)
+    return response
+
+@api_view(['GET'])
+@permission_classes((IsAuthenticated, ))
+def stats_handler(request):
+    """Daily duty stats read from the rollup tables, one row per day.
+
+    Query parameters:
+        user: id of the user, staff only, all users when omitted. Other
+            users get their own stats.
+        start, end: day range [start, end), dates
+    """
+    user = request.user
+    params = request.query_params
+
+    try:
+        if user.is_staff and not params.get('user'):
+            queryset = DutyDayStats.objects.all()
+        else:
+            user_id = int(params['user']) if user.is_staff else user.pk
+            queryset = DutyUserDayStats.objects.filter(user_id=user_id)
+        for param, lookup in (('start', 'day__gte'), ('end', 'day__lt')):
+            if params.get(param):
+                day = parse_date(params[param])
+                if day is None:
+                    raise ValueError(params[param])
+                queryset = queryset.filter(**{lookup: day})
+    except ValueError:
+        return Response(
+            {
+                'success': False,
+                'message': "Invalid stats filter.",
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    days = list(queryset.order_by('day'))
+    total = DutyStats.summarize({name: sum(getattr(day, name) for day in days)
+        for name in DutyStats.COUNTERS})
+    return Response(
+        {
+            'success': True,
+            'payload': [day.summary() for day in days],
+            'total': total,
+        },
+        status=status.HTTP_200_OK
+    )
@@ -0,0 +1,13 @@
+from django.urls import path
+
+from .async_views import login_view, profile, signup
+from .views import hashing_metrics
+
+app_name = 'users'
+
+urlpatterns = [
+    path('profile/', profile, name='profile'),
+    path('signup/', signup, name='signup'),
+    path('login/', login_view, name='login'),
+    path('metrics/hashing/', hashing_metrics, name='hashing-metrics'),
+]
@@ -0,0 +1,66 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import login
+from django.contrib.auth.views import redirect_to_login
+from django.shortcuts import redirect, render, resolve_url
+from django.utils.http import url_has_allowed_host_and_scheme
+
+from .backends import aget_user
+from .cache import afragment_context
+from .forms import AsyncAuthenticationForm, SignUpForm
+
+BACKEND = 'users.backends.CachedEmailBackend'
+
+
+async def profile(request):
+	user = await aget_user(request)
+	if not user.is_authenticated:
+		return redirect_to_login(request.get_full_path())
+	return render(request, 'profile.html', {
+		'object': user,
+		'user': user,
+		'fragments': await afragment_context(user),
+	})
+
+
+def success_url(request):
+	# `next` like LoginView, if it stays on this site
+	url = request.POST.get('next', request.GET.get('next', ''))
+	if url_has_allowed_host_and_scheme(url, allowed_hosts={request.get_host()},
+			require_https=request.is_secure()):
+		return url
+	return resolve_url(settings.LOGIN_REDIRECT_URL)
+
+
+async def login_view(request):
+	"""Async login, the password is checked without blocking the event loop.
+	"""
+	user = await aget_user(request)
+	if user.is_authenticated:
+		return redirect(success_url(request))
+
+	if request.method == 'POST':
+		form = AsyncAuthenticationForm(request, data=request.POST)
+		if await form.aauthenticate():
+			# the session and the last_login update are sync
+			await sync_to_async(login)(request, form.get_user(), backend=BACKEND)
+			return redirect(success_url(request))
+	else:
+		form = AsyncAuthenticationForm(request)
+	return render(request, 'login.html', {'form': form})
+
+
+async def signup(request):
+	"""Async `users.views.signup`, the password is hashed off the event loop.
+	"""
+	if request.method == 'POST':
+		form = SignUpForm(request.POST)
+		# uniqueness checks read the database
+		if await sync_to_async(form.is_valid)():
+			user = await form.asave()
+			# just hashed, no need to check the password again
+			await sync_to_async(login)(request, user, backend=BACKEND)
+			return redirect('users:profile')
+	else:
+		form = SignUpForm()
+	return render(request, 'signup.html', {'form': form})
@@ -0,0 +1,86 @@
+"""Authentication backend for email logins.
+
+`CachedEmailBackend` looks users up by their normalized email key, so logins
+are case-insensitive and hit an index, and keeps the user row cached by id so
+the per-request `get_user` doesn't SELECT the user again. Cached rows are
+dropped whenever the user is saved or deleted (see `users.models`); rows
+changed with `QuerySet.update()` stay cached until they time out. Rows aren't
+cached at all unless the cache is shared by every host, see
+`users.cache.shared_cache`.
+
+The cache is configured by `settings.USER_CACHE`:
+
+	USER_CACHE = {
+		'ALIAS': 'default',		# must be shared by every worker, like sessions
+		'TIMEOUT': 300,
+	}
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db import DEFAULT_DB_ALIAS
+
+from .cache import USER_CACHE_KEY, get_user_cache
+
+
+class CachedEmailBackend(ModelBackend):
+
+	def authenticate(self, request, username=None, password=None, **kwargs):
+		UserModel = get_user_model()
+		if username is None:
+			username = kwargs.get(UserModel.USERNAME_FIELD)
+		if username is None or password is None:
+			return None
+
+		user = UserModel._default_manager.get_by_email(username)
+		if user is None:
+			# hash anyway, so unknown emails take as long as wrong passwords
+			UserModel().set_password(password)
+		elif user.check_password(password) and self.user_can_authenticate(user):
+			return user
+		return None
+
+	async def aauthenticate(self, request, username=None, password=None, **kwargs):
+		"""Async `authenticate()`, the password is hashed off the event loop.
+		"""
+		UserModel = get_user_model()
+		if username is None:
+			username = kwargs.get(UserModel.USERNAME_FIELD)
+		if username is None or password is None:
+			return None
+
+		user = await sync_to_async(UserModel._default_manager.get_by_email)(username)
+		if user is None:
+			await UserModel().aset_password(password)
+		elif await user.acheck_password(password) and self.user_can_authenticate(user):
+			return user
+		return None
+
+	def get_user(self, user_id):
+		cache, timeout = get_user_cache()
+		key = USER_CACHE_KEY % user_id
+		user = cache.get(key) if cache is not None else None
+		if user is None:
+			users = get_user_model()._default_manager
+			if cache is not None:
+				# a lagging replica would put a dropped row back for every worker
+				users = users.using(DEFAULT_DB_ALIAS)
+			user = users.filter(pk=user_id).first()
+			if user is None:
+				return None
+			if cache is not None:
+				cache.add(key, user, timeout)
+		return user if self.user_can_authenticate(user) else None
+
+
+async def aget_user(request):
+	"""Resolve the lazy `request.user` of an async view.
+
+	The session and the cached user row are read in a worker thread, since
+	neither the session stores nor the auth backends have an async API.
+	"""
+	def resolve():
+		request.user.is_authenticated
+		return request.user._wrapped if hasattr(request.user, '_wrapped') else request.user
+
+	return await sync_to_async(resolve)()
@@ -0,0 +1,123 @@
+"""Cache of user rows by id, filled by `users.backends.CachedEmailBackend`,
+and versions of the per-user template fragments.
+
+Pages cache the parts rendered for a user with `{% cache %}`, varying on the
+user's fragment version:
+
+	{% cache fragments.timeout 'profile' user.pk fragments.version using=fragments.cache %}
+
+The version is a random token replaced whenever the user or their duty is
+saved (see the signal receivers of `users.models` and `duty_api.models`), so
+a changed page misses the cache and the stale fragments simply expire. With a
+cache that isn't shared by every host (see `shared_cache`) fragments are
+rendered every time, as other workers couldn't see the new version. The
+fragments are configured by `settings.FRAGMENT_CACHE`:
+
+	FRAGMENT_CACHE = {
+		'ALIAS': 'default',		# must be shared by every worker
+		'TIMEOUT': 600,
+	}
+"""
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+USER_CACHE_KEY = 'users:user:%s'
+FRAGMENT_VERSION_KEY = 'users:fragments:%s'
+
+# cache backends every worker of every host reads and writes alike
+DEFAULT_SHARED_CACHE_BACKENDS = (
+	'django.core.cache.backends.redis.RedisCache',
+	'django.core.cache.backends.memcached.PyMemcacheCache',
+	'django.core.cache.backends.memcached.PyLibMCCache',
+	'django.core.cache.backends.db.DatabaseCache',
+)
+
+
+def shared_cache(alias):
+	"""The cache `alias`, None unless its backend is in
+	`settings.SHARED_CACHE_BACKENDS`.
+
+	Invalidating a cache of one process (`LocMemCache`) or one host
+	(`FileBasedCache`) would leave the other workers with stale entries, so
+	what must be shared isn't cached at all there.
+	"""
+	backends = getattr(settings, 'SHARED_CACHE_BACKENDS', DEFAULT_SHARED_CACHE_BACKENDS)
+	if settings.CACHES[alias]['BACKEND'] not in backends:
+		return None
+	return caches[alias]
+
+
+def get_user_cache():
+	"""Return the cache of user rows, None if it isn't shared, and its timeout.
+	"""
+	config = getattr(settings, 'USER_CACHE', {})
+	return shared_cache(config.get('ALIAS', 'default')), config.get('TIMEOUT', 300)
+
+
+def forget_cached_user(user_id):
+	"""Drop the cached row of `user_id`, now and once the transaction commits.
+	"""
+	cache, _ = get_user_cache()
+	if cache is None:
+		return
+	key = USER_CACHE_KEY % user_id
+	cache.delete(key)
+	# a concurrent request may re-cache the old row before the commit lands
+	transaction.on_commit(lambda: cache.delete(key))
+
+
+def get_fragment_cache():
+	config = getattr(settings, 'FRAGMENT_CACHE', {})
+	return config.get('ALIAS', 'default'), config.get('TIMEOUT', 600)
+
+
+def fragment_context(user):
+	"""Context of the `{% cache %}` fragments rendered for `user`.
+
+	Returns:
+		dict: `cache` alias, `timeout` and current `version` of the fragments
+	"""
+	alias, timeout = get_fragment_cache()
+	cache = shared_cache(alias)
+	if cache is None:
+		# fragments expire as soon as they are stored
+		return {'cache': alias, 'timeout': 0, 'version': None}
+	key = FRAGMENT_VERSION_KEY % user.pk
+	version = cache.get(key)
+	if version is None:
+		# a token of our own unless another request set one first
+		cache.add(key, secrets.token_hex(8), None)
+		version = cache.get(key)
+	return {'cache': alias, 'timeout': timeout, 'version': version}
+
+
+async def afragment_context(user):
+	"""Async `fragment_context()`.
+	"""
+	alias, timeout = get_fragment_cache()
+	cache = shared_cache(alias)
+	if cache is None:
+		return {'cache': alias, 'timeout': 0, 'version': None}
+	key = FRAGMENT_VERSION_KEY % user.pk
+	version = await cache.aget(key)
+	if version is None:
+		await cache.aadd(key, secrets.token_hex(8), None)
+		version = await cache.aget(key)
+	return {'cache': alias, 'timeout': timeout, 'version': version}
+
+
+def expire_fragments(user_id):
+	"""Give `user_id` a new fragment version, now and once the transaction commits.
+	"""
+	alias, _ = get_fragment_cache()
+	cache = shared_cache(alias)
+	if cache is None:
+		return
+	key = FRAGMENT_VERSION_KEY % user_id
+	cache.set(key, secrets.token_hex(8), None)
+	# a concurrent request may cache the old page under the new version
+	transaction.on_commit(lambda: cache.set(key, secrets.token_hex(8), None))
@@ -1,7 +1,46 @@
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
+from django.core.exceptions import ValidationError
+
+from .backends import CachedEmailBackend
 from .models import User
 
 class SignUpForm(UserCreationForm):
     class Meta:
         model = User
         fields = ('email', 'name', 'password')
+
+    async def asave(self):
+        """Async `save()`, the password is hashed in the hasher pool.
+        """
+        # UserCreationForm.save() would hash in the calling thread
+        user = super(UserCreationForm, self).save(commit=False)
+        await user.aset_password(self.cleaned_data['password1'])
+        await user.asave()
+        return user
+
+class AsyncAuthenticationForm(AuthenticationForm):
+    """Login form whose credentials are checked by `aauthenticate()`.
+    """
+
+    def clean(self):
+        # the password is checked by aauthenticate(), not in is_valid()
+        return self.cleaned_data
+
+    async def aauthenticate(self):
+        """Authenticate the cleaned credentials, errors are added to the form.
+
+        Returns:
+            bool: whether the form is valid and the credentials are correct
+        """
+        if not self.is_valid():
+            return False
+        self.user_cache = await CachedEmailBackend().aauthenticate(self.request,
+            username=self.cleaned_data['username'], password=self.cleaned_data['password'])
+        try:
+            if self.user_cache is None:
+                raise self.get_invalid_login_error()
+            self.confirm_login_allowed(self.user_cache)
+        except ValidationError as e:
+            self.add_error(None, e)
+            return False
+        return True
@@ -0,0 +1,213 @@
+"""Password hashing off the calling thread.
+
+Hashing a password (PBKDF2, argon2, ...) is deliberately slow CPU work. A
+`HasherPool` runs it in a thread pool, where hashlib and the argon2 bindings
+release the GIL, or in a process pool for hashers that hold the GIL. The
+pool also bounds how many hashes run at once and records throughput and
+latency metrics, served to staff by `users.views.hashing_metrics`.
+
+The async methods (`amake_password`, `averify_password`) are what frees the
+worker: the async login and signup views await the hash while the event loop
+serves other requests. The blocking methods, used by `User.set_password` and
+`User.check_password`, hash in the calling thread unless the pool is a
+process pool, as the caller waits for the hash either way and hashlib
+already releases the GIL.
+
+The shared pool is configured by `settings.PASSWORD_HASHING`:
+
+	PASSWORD_HASHING = {
+		'EXECUTOR': 'thread',	# 'thread', 'process' or None to hash inline
+		'WORKERS': 4,			# defaults to the number of CPUs
+	}
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+def verify_password(password, encoded):
+	"""Check `password` against `encoded`.
+
+	Returns:
+		tuple: (password is correct, hash should be upgraded)
+	"""
+	upgrades = []
+	return check_password(password, encoded, setter=upgrades.append), bool(upgrades)
+
+
+def _timed(func, *args):
+	# runs in the worker, so the measured time excludes the queue wait
+	started = time.perf_counter()
+	return func(*args), time.perf_counter() - started
+
+
+class HashingMetrics(object):
+	"""Counters of a `HasherPool`, safe to update from several threads.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.started = time.monotonic()
+		self.completed = 0
+		self.failed = 0
+		self.in_flight = 0
+		self.hash_seconds = 0.0
+		self.latency_seconds = 0.0
+		self.max_latency = 0.0
+
+	def submitted(self):
+		with self._lock:
+			self.in_flight += 1
+
+	def finished(self, latency, hash_seconds=None):
+		with self._lock:
+			self.in_flight -= 1
+			if hash_seconds is None:
+				self.failed += 1
+				return
+			self.completed += 1
+			self.hash_seconds += hash_seconds
+			self.latency_seconds += latency
+			self.max_latency = max(self.max_latency, latency)
+
+	def snapshot(self):
+		"""Return the metrics as a dict.
+
+		`latency` is measured from submission to result and includes the time
+		spent waiting for a free worker, `hash_time` only the hashing itself.
+		"""
+		with self._lock:
+			completed = self.completed
+			return {
+				'completed': completed,
+				'failed': self.failed,
+				'in_flight': self.in_flight,
+				'throughput': completed / max(time.monotonic() - self.started, 1e-9),
+				'mean_latency': self.latency_seconds / completed if completed else 0.0,
+				'max_latency': self.max_latency,
+				'mean_hash_time': self.hash_seconds / completed if completed else 0.0,
+			}
+
+
+class HasherPool(object):
+	"""Executor for password hashing.
+
+	Args:
+		executor (str): 'thread', 'process' or None to hash in the calling thread
+		workers (int): pool size, defaults to the number of CPUs
+	"""
+
+	def __init__(self, executor='thread', workers=None):
+		self.workers = workers or os.cpu_count() or 1
+		self.metrics = HashingMetrics()
+		if executor == 'thread':
+			self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='hasher')
+		elif executor == 'process':
+			# workers started with spawn need Django set up to read the hashers
+			self._executor = ProcessPoolExecutor(self.workers, initializer=django.setup)
+		elif executor is None:
+			self._executor = None
+		else:
+			raise ValueError("Unknown password hashing executor %r." % executor)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.shutdown()
+
+	def shutdown(self):
+		if self._executor is not None:
+			self._executor.shutdown()
+
+	def submit(self, func, *args):
+		"""Run `func(*args)` in the pool.
+
+		Returns:
+			concurrent.futures.Future: resolves to the result of `func`
+		"""
+		return self._submit(self._executor, func, *args)
+
+	def _call(self, func, *args):
+		# a handoff to a thread would only add latency to a caller that waits
+		executor = self._executor if isinstance(self._executor, ProcessPoolExecutor) else None
+		return self._submit(executor, func, *args).result()
+
+	def _submit(self, executor, func, *args):
+		submitted = time.perf_counter()
+		self.metrics.submitted()
+		if executor is None:
+			future = Future()
+			try:
+				future.set_result(_timed(func, *args))
+			except Exception as e:
+				future.set_exception(e)
+		else:
+			future = executor.submit(_timed, func, *args)
+
+		result = Future()
+
+		def done(timed):
+			latency = time.perf_counter() - submitted
+			if timed.exception() is not None:
+				self.metrics.finished(latency)
+				result.set_exception(timed.exception())
+			else:
+				value, hash_seconds = timed.result()
+				self.metrics.finished(latency, hash_seconds)
+				result.set_result(value)
+
+		future.add_done_callback(done)
+		return result
+
+	def make_password(self, password):
+		return self._call(make_password, password)
+
+	def verify_password(self, password, encoded):
+		"""See `verify_password`.
+		"""
+		return self._call(verify_password, password, encoded)
+
+	def map_make_password(self, passwords):
+		"""Hash `passwords` concurrently, results in order.
+		"""
+		return [future.result() for future in
+			[self.submit(make_password, password) for password in passwords]]
+
+	async def amake_password(self, password):
+		return await asyncio.wrap_future(self.submit(make_password, password))
+
+	async def averify_password(self, password, encoded):
+		return await asyncio.wrap_future(self.submit(verify_password, password, encoded))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hasher_pool():
+	"""Return the shared pool configured by `settings.PASSWORD_HASHING`.
+	"""
+	global _pool
+	if _pool is None:
+		with _pool_lock:
+			if _pool is None:
+				config = getattr(settings, 'PASSWORD_HASHING', {})
+				_pool = HasherPool(config.get('EXECUTOR'), config.get('WORKERS'))
+	return _pool
+
+
+@receiver(setting_changed)
+def reset_hasher_pool(setting, **kwargs):
+	global _pool
+	if setting in ('PASSWORD_HASHING', 'PASSWORD_HASHERS') and _pool is not None:
+		_pool.shutdown()
+		_pool = None
@@ -0,0 +1,34 @@
+import csv
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Create users from a CSV file with email, name and password columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path',
+            help="CSV file with a header row, - reads standard input.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+            help="Users checked, hashed and inserted at once.")
+        parser.add_argument('--workers', type=int, default=None,
+            help="Password hashing processes, 0 hashes in this process. "
+                "Defaults to one per CPU.")
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            created, skipped = self.import_users(sys.stdin, options)
+        else:
+            with open(options['path'], newline='', encoding='utf-8') as f:
+                created, skipped = self.import_users(f, options)
+        self.stdout.write("Imported %d users, skipped %d." % (created, skipped))
+
+    @staticmethod
+    def import_users(f, options):
+        return get_user_model().objects.bulk_create_users(
+            csv.DictReader(f),
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+        )
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+def fill_email_keys(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    users = list(User.objects.only('id', 'email'))
+    for user in users:
+        user.email_key = (user.email or '').strip().lower()
+    User.objects.bulk_update(users, ['email_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_auto_20190529_2154'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='email_key',
+            field=models.CharField(default='', editable=False, max_length=254),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_email_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='email_key',
+            field=models.CharField(db_index=True, editable=False, max_length=254),
+        ),
+    ]
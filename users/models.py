@@ -1,10 +1,35 @@
+from itertools import islice
+
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 
+from .cache import expire_fragments, forget_cached_user
+from .hashing import HasherPool, get_hasher_pool
+
 
 class UserManager(BaseUserManager):
 
+	@staticmethod
+	def normalize_email_key(email):
+		"""Case-insensitive lookup key of an email address.
+		"""
+		return (email or '').strip().lower()
+
+	def get_by_email(self, email):
+		"""Return the user of `email` regardless of case, None if there is none.
+
+		Emails are unique as typed, so differently cased duplicates may exist;
+		the exact match wins over the others.
+		"""
+		users = list(self.filter(email_key=self.normalize_email_key(email)))
+		for user in users:
+			if user.email == email:
+				return user
+		return users[0] if users else None
+
 	def _create_user(self, email, password, is_staff, is_superuser, **extra_fields):
 		if not email:
 			raise ValueError('Users must have an email address')
@@ -27,13 +52,74 @@ class UserManager(BaseUserManager):
 		return self._create_user(email, password, False, False, **extra_fields)
 
 	def create_superuser(self, email, password, **extra_fields):
-		user=self._create_user(email, password, True, True, **extra_fields)
-		user.save(using=self._db)
-		return user
+		return self._create_user(email, password, True, True, **extra_fields)
+
+	def bulk_create_users(self, rows, batch_size=1000, workers=None):
+		"""Create regular users from `rows` in batches.
+
+		Rows are consumed lazily, `batch_size` at a time: emails are
+		normalized, rows whose email already exists (case-insensitively, in
+		the database or earlier in `rows`) are skipped with one query per
+		batch, passwords are hashed in a process pool and the batch is written
+		with a single `bulk_create`. Model `save()` and its signals are not
+		run for the created users.
+
+		Args:
+			rows (iterable of dict): `email`, `name` and `password` of each
+				user, a missing password makes it unusable
+			batch_size (int): users checked, hashed and inserted at once
+			workers (int): hashing processes, 0 hashes in this process,
+				None uses one per CPU
+
+		Returns:
+			tuple: (number of users created, number of rows skipped)
+		"""
+		created = skipped = 0
+		seen = set()
+		rows = iter(rows)
+		with HasherPool('process' if workers != 0 else None, workers) as pool:
+			while True:
+				batch = list(islice(rows, batch_size))
+				if not batch:
+					return created, skipped
+
+				users = {}
+				for row in batch:
+					email = self.normalize_email(row.get('email') or '').strip()
+					key = self.normalize_email_key(email)
+					if not key or key in seen or key in users:
+						skipped += 1
+						continue
+					users[key] = (email, row.get('name') or '', row.get('password') or None)
+
+				existing = set(self.filter(email_key__in=list(users))
+					.values_list('email_key', flat=True))
+				skipped += len(existing)
+				seen.update(users)
+				for key in existing:
+					del users[key]
+
+				hashes = pool.map_make_password(
+					[password for _, _, password in users.values()])
+
+				now = timezone.now()
+				created += len(self.bulk_create([
+					self.model(
+						email=email,
+						email_key=key,
+						name=name,
+						password=password_hash,
+						is_active=True,
+						last_login=now,
+						date_joined=now,
+					)
+					for (key, (email, name, _)), password_hash in zip(users.items(), hashes)
+				], batch_size=batch_size))
 
 
 class User(AbstractBaseUser, PermissionsMixin):
 	email = models.EmailField(max_length=254, unique=True)
+	email_key = models.CharField(max_length=254, db_index=True, editable=False)
 	name = models.CharField(max_length=254, blank=False)
 	is_staff = models.BooleanField(default=False)
 	is_superuser = models.BooleanField(default=False)
@@ -54,6 +140,78 @@ class User(AbstractBaseUser, PermissionsMixin):
 	def __str__(self):
 		return "User of {} - {}".format(self.name, self.email)
 
+	def set_password(self, raw_password):
+		self.password = get_hasher_pool().make_password(raw_password)
+		self._password = raw_password
+
+	def check_password(self, raw_password):
+		"""Check `raw_password` in the hasher pool, upgrading the stored hash if needed.
+		"""
+		is_correct, must_update = get_hasher_pool().verify_password(raw_password, self.password)
+		if is_correct and must_update:
+			self.set_password(raw_password)
+			# hash upgrades aren't password changes
+			self._password = None
+			self.save(update_fields=['password'])
+		return is_correct
+
+	async def aset_password(self, raw_password):
+		"""Async `set_password()`, awaits the hash in the hasher pool.
+		"""
+		self.password = await get_hasher_pool().amake_password(raw_password)
+		self._password = raw_password
+
+	async def acheck_password(self, raw_password):
+		"""Async `check_password()`, awaits the hash in the hasher pool.
+		"""
+		is_correct, must_update = await get_hasher_pool().averify_password(
+			raw_password, self.password)
+		if is_correct and must_update:
+			await self.aset_password(raw_password)
+			self._password = None
+			await self.asave(update_fields=['password'])
+		return is_correct
+
+	def save(self, *args, **kwargs):
+		self.email_key = UserManager.normalize_email_key(self.email)
+		update_fields = kwargs.get('update_fields')
+		if update_fields is not None and 'email' in update_fields:
+			kwargs['update_fields'] = set(update_fields) | {'email_key'}
+		super().save(*args, **kwargs)
+
 	def __eq__(self, other):
-		if isinstance(other, User):
-			return (self.email == other.email) and (self.name == other.name)
+		"""Users are equal when they are the same row, whatever their loaded fields.
+
+		An unsaved user has no primary key yet and only equals itself.
+		"""
+		if not isinstance(other, User):
+			return NotImplemented
+		if self.pk is None or other.pk is None:
+			return self is other
+		return self.pk == other.pk
+
+	def __hash__(self):
+		"""Hash of the primary key.
+
+		Raises:
+			TypeError: the user is unsaved, its hash would change on save
+		"""
+		if self.pk is None:
+			raise TypeError("Model instances without primary key value are unhashable")
+		return hash(self.pk)
+
+
+@receiver((post_save, post_delete), sender=User)
+def user_changed(instance, **kwargs):
+	forget_cached_user(instance.pk)
+	expire_fragments(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def user_permissions_changed(instance, action, pk_set, reverse, **kwargs):
+	if not action.startswith('post_'):
+		return
+	# reverse: the group or permission changed, pk_set holds the users
+	for user_id in (pk_set or ()) if reverse else (instance.pk, ):
+		forget_cached_user(user_id)
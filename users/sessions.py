@@ -0,0 +1,343 @@
+"""Session engine keeping sessions in a SQLite file shared by every worker.
+
+With `SESSION_ENGINE = 'users.sessions'` sessions live in the file at
+`SESSION_STORE['PATH']`, so they are seen by every worker process and
+survive restarts, and each worker keeps the sessions it served last in an
+LRU hot tier. A hot session is only used after its version is checked
+against the store, a single row primary key read, so a session changed or
+deleted by another worker is never served stale; a hit skips reading and
+decoding the data.
+
+Saves that only push the expiry back (SESSION_SAVE_EVERY_REQUEST) are
+written behind: collected in memory and flushed in one batch every
+`WRITE_BEHIND` seconds and at exit. Expired sessions are deleted by
+`clear_expired()` (the `clearsessions` command) `CLEANUP_BATCH` rows at a
+time, so the store is never locked for long.
+
+	SESSION_STORE = {
+		'PATH': '/var/lib/app/sessions.sqlite3',
+		'HOT_SIZE': 10000,		# sessions kept decoded per worker
+		'WRITE_BEHIND': 5,		# seconds, None writes expiry updates through
+		'CLEANUP_BATCH': 1000,
+	}
+"""
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, SessionBase, UpdateError
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS session (
+	session_key TEXT PRIMARY KEY,
+	session_data TEXT NOT NULL,
+	expire REAL NOT NULL,
+	version INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS session_expire ON session (expire);
+"""
+
+
+class HotTier(object):
+	"""LRU of `key: (version, data)`, safe to use from several threads.
+	"""
+
+	def __init__(self, size):
+		self.size = size
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key):
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None:
+				self._entries.move_to_end(key)
+			return entry
+
+	def put(self, key, version, data):
+		if not self.size:
+			return
+		with self._lock:
+			self._entries[key] = (version, data)
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.size:
+				self._entries.popitem(last=False)
+
+	def discard(self, key):
+		with self._lock:
+			self._entries.pop(key, None)
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+	def __len__(self):
+		return len(self._entries)
+
+
+class SharedSessionStore(object):
+	"""Sessions of every worker in one SQLite file, see the module docstring.
+
+	Data is the serialized session dict; expiries are unix timestamps.
+	"""
+
+	def __init__(self, path, hot_size=10000, write_behind=5.0, cleanup_batch=1000):
+		self.path = path
+		self.hot = HotTier(hot_size)
+		self.write_behind = write_behind
+		self.cleanup_batch = cleanup_batch
+		self._local = threading.local()
+		self._lock = threading.Lock()
+		self._pending = {}
+		self._stopped = threading.Event()
+		self._thread = None
+
+	def connection(self):
+		connection = getattr(self._local, 'connection', None)
+		if connection is None:
+			# autocommit, every statement is its own short transaction
+			connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+			connection.execute('PRAGMA journal_mode=WAL')
+			connection.execute('PRAGMA synchronous=NORMAL')
+			connection.executescript(SCHEMA)
+			self._local.connection = connection
+		return connection
+
+	def get(self, key, now=None):
+		"""Return the (version, data) of a live session, or None.
+		"""
+		now = now or time.time()
+		connection = self.connection()
+		entry = self.hot.get(key)
+		if entry is not None:
+			row = connection.execute(
+				'SELECT version, expire FROM session WHERE session_key = ?', (key, )).fetchone()
+			if row is not None and row[0] == entry[0] and self._expire(key, row[1]) > now:
+				return entry
+		row = connection.execute(
+			'SELECT version, session_data, expire FROM session WHERE session_key = ?',
+			(key, )).fetchone()
+		if row is None or self._expire(key, row[2]) <= now:
+			self.hot.discard(key)
+			return None
+		self.hot.put(key, row[0], row[1])
+		return row[0], row[1]
+
+	def _expire(self, key, expire):
+		# an expiry pushed back by this worker may not be written yet
+		return max(expire, self._pending.get(key, expire))
+
+	def exists(self, key):
+		return self.connection().execute(
+			'SELECT 1 FROM session WHERE session_key = ?', (key, )).fetchone() is not None
+
+	def create(self, key, data, expire):
+		"""Insert a new session.
+
+		Raises:
+			CreateError: `key` is taken
+		"""
+		try:
+			self.connection().execute(
+				'INSERT INTO session (session_key, session_data, expire, version) '
+				'VALUES (?, ?, ?, 1)', (key, data, expire))
+		except sqlite3.IntegrityError:
+			raise CreateError
+		self.hot.put(key, 1, data)
+
+	def update(self, key, data, expire):
+		"""Replace the data of a session, returns False if it doesn't exist.
+		"""
+		row = self.connection().execute(
+			'UPDATE session SET session_data = ?, expire = ?, version = version + 1 '
+			'WHERE session_key = ? RETURNING version', (data, expire, key)).fetchone()
+		with self._lock:
+			self._pending.pop(key, None)
+		if row is None:
+			self.hot.discard(key)
+			return False
+		self.hot.put(key, row[0], data)
+		return True
+
+	def touch(self, key, expire):
+		"""Push the expiry of a session back, written behind unless disabled.
+		"""
+		if self.write_behind is None:
+			self.connection().execute(
+				'UPDATE session SET expire = ? WHERE session_key = ?', (expire, key))
+			return
+		with self._lock:
+			self._pending[key] = max(expire, self._pending.get(key, expire))
+		self.start()
+
+	def delete(self, key):
+		self.connection().execute('DELETE FROM session WHERE session_key = ?', (key, ))
+		with self._lock:
+			self._pending.pop(key, None)
+		self.hot.discard(key)
+
+	def flush(self):
+		"""Write the pending expiry updates in one transaction.
+
+		Returns:
+			int: number of sessions updated
+		"""
+		with self._lock:
+			pending, self._pending = self._pending, {}
+		if not pending:
+			return 0
+		connection = self.connection()
+		connection.execute('BEGIN IMMEDIATE')
+		try:
+			connection.executemany(
+				'UPDATE session SET expire = ? WHERE session_key = ? AND expire < ?',
+				[(expire, key, expire) for key, expire in pending.items()])
+		except BaseException:
+			connection.execute('ROLLBACK')
+			with self._lock:
+				for key, expire in pending.items():
+					self._pending.setdefault(key, expire)
+			raise
+		connection.execute('COMMIT')
+		return len(pending)
+
+	def clear_expired(self, now=None):
+		"""Delete expired sessions, `cleanup_batch` rows per statement.
+
+		Returns:
+			int: number of sessions deleted
+		"""
+		self.flush()
+		now = now or time.time()
+		connection = self.connection()
+		deleted = 0
+		while True:
+			count = connection.execute(
+				'DELETE FROM session WHERE session_key IN ('
+				'SELECT session_key FROM session WHERE expire <= ? LIMIT ?)',
+				(now, self.cleanup_batch)).rowcount
+			deleted += count
+			if count < self.cleanup_batch:
+				return deleted
+
+	def start(self):
+		with self._lock:
+			if self._thread is not None:
+				return
+			self._thread = threading.Thread(
+				target=self._run, name='session-write-behind', daemon=True)
+		self._thread.start()
+		atexit.register(self.stop)
+
+	def stop(self):
+		self._stopped.set()
+		if self._thread is not None and self._thread is not threading.current_thread():
+			self._thread.join()
+		self.flush()
+
+	def _run(self):
+		while not self._stopped.wait(self.write_behind):
+			try:
+				self.flush()
+			except Exception:
+				logger.exception("Writing session expiries failed, retrying.")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store():
+	"""Return the store configured by `settings.SESSION_STORE`.
+	"""
+	global _store
+	if _store is None:
+		with _store_lock:
+			if _store is None:
+				config = settings.SESSION_STORE
+				_store = SharedSessionStore(
+					config['PATH'],
+					hot_size=config.get('HOT_SIZE', 10000),
+					write_behind=config.get('WRITE_BEHIND', 5.0),
+					cleanup_batch=config.get('CLEANUP_BATCH', 1000),
+				)
+	return _store
+
+
+@receiver(setting_changed)
+def reset_session_store(setting, **kwargs):
+	global _store
+	if setting == 'SESSION_STORE' and _store is not None:
+		_store.stop()
+		_store = None
+
+
+class SessionStore(SessionBase):
+	"""Session engine over `get_session_store()`.
+	"""
+
+	def __init__(self, session_key=None):
+		super().__init__(session_key)
+		# serialized data as loaded, to tell expiry-only saves apart
+		self._loaded = None
+
+	def _expiry_timestamp(self, session_data):
+		return self.get_expiry_date(expiry=session_data.get('_session_expiry')).timestamp()
+
+	def load(self):
+		entry = get_session_store().get(self.session_key) if self.session_key else None
+		if entry is None:
+			self._session_key = None
+			self._loaded = None
+			return {}
+		self._loaded = entry[1]
+		return self.serializer().loads(entry[1].encode('latin-1'))
+
+	def exists(self, session_key):
+		return get_session_store().exists(session_key)
+
+	def create(self):
+		while True:
+			self._session_key = self._get_new_session_key()
+			try:
+				self.save(must_create=True)
+			except CreateError:
+				continue
+			self.modified = True
+			return
+
+	def save(self, must_create=False):
+		if self.session_key is None:
+			return self.create()
+		session_data = self._get_session(no_load=must_create)
+		data = self.serializer().dumps(session_data).decode('latin-1')
+		expire = self._expiry_timestamp(session_data)
+		store = get_session_store()
+		if must_create:
+			store.create(self.session_key, data, expire)
+		elif data == self._loaded:
+			store.touch(self.session_key, expire)
+		elif not store.update(self.session_key, data, expire):
+			raise UpdateError
+		self._loaded = data
+
+	def delete(self, session_key=None):
+		if session_key is None:
+			if self.session_key is None:
+				return
+			session_key = self.session_key
+		get_session_store().delete(session_key)
+
+	@classmethod
+	def clear_expired(cls):
+		get_session_store().clear_expired(timezone.now().timestamp())
@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.contrib.auth import authenticate, get_user_model
+from django.test import TestCase, override_settings
+
+from customuser.db.replicas import PrimaryReplicaRouter
+from utils.random_support import RandomSupport
+from users.backends import CachedEmailBackend
+from users.cache import DEFAULT_SHARED_CACHE_BACKENDS, shared_cache
+
+User = get_user_model()
+
+
+class TestCachedEmailBackend(TestCase, RandomSupport):
+    """Test email logins and the cached `get_user`.
+    """
+
+    def setUp(self):
+        self.email = self.generate_email()
+        self.password = self.generate_alphanumeric(10)
+        self.user = User.objects.create_user(
+            name=self.generate_name(), email=self.email, password=self.password)
+        self.backend = CachedEmailBackend()
+
+    def test_authenticate_case_insensitive(self):
+        """Email matches regardless of case, the password doesn't.
+        """
+        self.assertEqual(authenticate(email=self.email.upper(), password=self.password), self.user)
+        self.assertEqual(authenticate(username=self.email, password=self.password), self.user)
+        self.assertIsNone(authenticate(email=self.email, password=self.password.swapcase() + 'x'))
+        self.assertIsNone(authenticate(email='x' + self.email, password=self.password))
+
+    def test_email_key_saved(self):
+        """Normalized email key follows email changes.
+        """
+        self.user.email = ' Someone.Else@Example.COM'
+        self.user.save(update_fields=['email'])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.email_key, 'someone.else@example.com')
+
+    def test_get_user_cached(self):
+        """Only the first `get_user` reads the user row.
+        """
+        with self.assertNumQueries(1):
+            self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_get_user_not_cached_in_process(self):
+        """Rows aren't cached in a process-local cache, other workers couldn't drop them.
+        """
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+    def test_get_user_not_cached_on_host(self):
+        """Rows aren't cached in a cache of one host unless it is listed as shared.
+        """
+        with override_settings(SHARED_CACHE_BACKENDS=DEFAULT_SHARED_CACHE_BACKENDS):
+            self.assertIsNone(shared_cache('default'))
+            for _ in range(2):
+                with self.assertNumQueries(1):
+                    self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+        self.assertIsNotNone(shared_cache('default'))
+
+    def test_get_user_cached_from_primary(self):
+        """Rows are cached as read from the primary, a replica may lag behind.
+        """
+        with mock.patch.object(PrimaryReplicaRouter, 'db_for_read', return_value='lagging'):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+    def test_get_user_invalidated_on_save(self):
+        """Saving or deleting the user drops the cached row.
+        """
+        self.backend.get_user(self.user.pk)
+        self.user.set_password(self.generate_alphanumeric(12))
+        self.user.save()
+
+        cached = self.backend.get_user(self.user.pk)
+        self.assertEqual(cached.password, self.user.password)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+        user_id = self.user.pk
+        self.user.delete()
+        self.assertIsNone(self.backend.get_user(user_id))
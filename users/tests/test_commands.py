@@ -0,0 +1,33 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from utils.random_support import RandomSupport
+
+User = get_user_model()
+
+
+class TestImportUsersCommand(TestCase, RandomSupport):
+    """Test the `import_users` management command.
+    """
+
+    def test_import_users(self):
+        """CSV rows become users, duplicates are reported as skipped.
+        """
+        emails = [self.generate_email() for _ in range(3)]
+        lines = ["email,name,password"]
+        lines += ["%s,%s,%s" % (email, self.generate_name(), self.generate_alphanumeric())
+            for email in emails + emails[:1]]
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write("\n".join(lines))
+        self.addCleanup(os.remove, f.name)
+
+        out = StringIO()
+        call_command('import_users', f.name, workers=0, batch_size=2, stdout=out)
+        self.assertIn("Imported 3 users, skipped 1.", out.getvalue())
+        self.assertEqual(set(User.objects.values_list('email', flat=True)), set(emails))
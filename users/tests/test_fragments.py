@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from utils.random_support import RandomSupport
+from users.cache import expire_fragments, forget_cached_user, fragment_context
+
+User = get_user_model()
+
+
+class TestFragmentCache(TestCase, RandomSupport):
+    """Test the per-user fragments of the profile page.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(name=self.generate_name(),
+            email=self.generate_email(), password=self.generate_alphanumeric(10))
+        self.client.force_login(self.user)
+
+    def test_version(self):
+        """The version is kept until the user is expired.
+        """
+        version = fragment_context(self.user)['version']
+        self.assertEqual(fragment_context(self.user)['version'], version)
+
+        expire_fragments(self.user.pk)
+        self.assertNotEqual(fragment_context(self.user)['version'], version)
+
+    def test_profile_cached(self):
+        """The profile fragment is reused until the user is saved.
+        """
+        name = self.user.name
+        self.assertContains(self.client.get(reverse('users:profile')), name)
+
+        # not seen by the signals, the request gets the new row but the
+        # cached fragment is served
+        User.objects.filter(pk=self.user.pk).update(name='Someone Else')
+        forget_cached_user(self.user.pk)
+        self.user.refresh_from_db()
+        self.assertContains(self.client.get(reverse('users:profile')), name)
+
+        self.user.save()
+        response = self.client.get(reverse('users:profile'))
+        self.assertContains(response, 'Someone Else')
+        self.assertNotContains(response, name)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_profile_not_kept_in_process(self):
+        """Without a shared cache the profile is rendered on every request.
+        """
+        self.assertEqual(fragment_context(self.user)['timeout'], 0)
+        name = self.user.name
+        self.assertContains(self.client.get(reverse('users:profile')), name)
+
+        User.objects.filter(pk=self.user.pk).update(name='Someone Else')
+        self.assertContains(self.client.get(reverse('users:profile')), 'Someone Else')
+
+    def test_profile_per_user(self):
+        """Users never get each other's fragments.
+        """
+        self.client.get(reverse('users:profile'))
+        other = User.objects.create_user(name=self.generate_name(),
+            email=self.generate_email(), password=self.generate_alphanumeric(10))
+        self.client.force_login(other)
+        self.assertContains(self.client.get(reverse('users:profile')), other.name)
@@ -0,0 +1,86 @@
+import asyncio
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password
+from django.test import TestCase, override_settings
+
+from utils.random_support import RandomSupport
+from users.hashing import HasherPool, get_hasher_pool
+
+User = get_user_model()
+
+
+class TestHasherPool(TestCase, RandomSupport):
+    """Test password hashing in thread and process pools.
+    """
+
+    def check_pool(self, executor):
+        password = self.generate_alphanumeric()
+        with HasherPool(executor, workers=2) as pool:
+            encoded = pool.make_password(password)
+            self.assertTrue(check_password(password, encoded))
+            self.assertEqual(pool.verify_password(password, encoded), (True, False))
+            self.assertEqual(pool.verify_password(password + 'x', encoded), (False, False))
+
+            hashes = pool.map_make_password(['a', 'b', 'c'])
+            self.assertEqual([check_password(p, h) for p, h in zip('abc', hashes)], [True] * 3)
+
+            metrics = pool.metrics.snapshot()
+        self.assertEqual(metrics['completed'], 6)
+        self.assertEqual(metrics['in_flight'], 0)
+        self.assertGreater(metrics['mean_hash_time'], 0)
+        self.assertGreaterEqual(metrics['max_latency'], metrics['mean_hash_time'])
+
+    def test_thread_pool(self):
+        self.check_pool('thread')
+
+    def test_process_pool(self):
+        self.check_pool('process')
+
+    def test_inline(self):
+        self.check_pool(None)
+
+    def test_async(self):
+        """Awaiting a hash doesn't block the event loop.
+        """
+        with HasherPool('thread', workers=2) as pool:
+            async def hash_both():
+                return await asyncio.gather(
+                    pool.amake_password('a'), pool.amake_password('b'))
+            hashes = asyncio.run(hash_both())
+            self.assertTrue(check_password('b', hashes[1]))
+            self.assertEqual(asyncio.run(pool.averify_password('a', hashes[0])), (True, False))
+
+    def test_unknown_executor(self):
+        with self.assertRaises(ValueError):
+            HasherPool('fork')
+
+    def test_user_password_upgrade(self):
+        """Correct password stored with an outdated hasher is re-hashed on check.
+        """
+        pbkdf2, md5 = (
+            'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+            'django.contrib.auth.hashers.MD5PasswordHasher',
+        )
+        password = self.generate_alphanumeric()
+        with override_settings(PASSWORD_HASHERS=[md5]):
+            user = User.objects.create_user(email=self.generate_email(), password=password)
+        self.assertTrue(user.password.startswith('md5$'))
+
+        with override_settings(PASSWORD_HASHERS=[pbkdf2, md5]):
+            self.assertTrue(user.check_password(password))
+            user.refresh_from_db()
+            self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+            self.assertTrue(user.check_password(password))
+            self.assertEqual(get_hasher_pool().metrics.snapshot()['completed'], 3)
+
+    def test_blocking_call_inline(self):
+        """Blocking hashes skip the thread pool, the caller waits either way.
+        """
+        with HasherPool('thread', workers=2) as pool:
+            with mock.patch.object(pool._executor, 'submit') as submit:
+                encoded = pool.make_password('a')
+                self.assertEqual(pool.verify_password('a', encoded), (True, False))
+            submit.assert_not_called()
+            self.assertEqual(pool.metrics.snapshot()['completed'], 2)
@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from utils.random_support import RandomSupport
+
+User = get_user_model()
+
+
+class TestUserIdentity(TestCase, RandomSupport):
+    """Test equality and hashing of users.
+    """
+
+    def create_user(self):
+        return User.objects.create_user(
+            name=self.generate_name(), email=self.generate_email(),
+            password=self.generate_alphanumeric())
+
+    def test_equal_by_pk(self):
+        """Instances of the same row are equal even if their fields differ.
+        """
+        user = self.create_user()
+        other = User.objects.get(pk=user.pk)
+        other.name = self.generate_name()
+        self.assertEqual(user, other)
+        self.assertNotEqual(user, self.create_user())
+        self.assertNotEqual(user, user.pk)
+
+    def test_hashable(self):
+        """Users can be set members and dict keys.
+        """
+        user = self.create_user()
+        users = {user, User.objects.get(pk=user.pk), self.create_user()}
+        self.assertEqual(len(users), 2)
+        self.assertIn(User.objects.get(pk=user.pk), users)
+
+    def test_unsaved_identity(self):
+        """Unsaved users only equal themselves and can't be hashed.
+        """
+        email = self.generate_email()
+        user = User(name='same', email=email)
+        self.assertEqual(user, user)
+        self.assertNotEqual(user, User(name='same', email=email))
+        with self.assertRaises(TypeError):
+            hash(user)
+
+
+class TestBulkCreateUsers(TestCase, RandomSupport):
+    """Test the bulk user import.
+    """
+
+    def rows(self, count):
+        return [{
+            'email': self.generate_email(),
+            'name': self.generate_name(),
+            'password': self.generate_alphanumeric(),
+        } for _ in range(count)]
+
+    def test_bulk_create_users(self):
+        """Users are created with normalized emails and hashed passwords.
+        """
+        rows = self.rows(3)
+        rows[0]['email'] = 'Someone@EXAMPLE.com'
+        del rows[2]['password']
+
+        self.assertEqual(User.objects.bulk_create_users(rows, workers=0), (3, 0))
+        user = User.objects.get(email='Someone@example.com')
+        self.assertEqual(user.email_key, 'someone@example.com')
+        self.assertTrue(user.check_password(rows[0]['password']))
+        self.assertFalse(User.objects.get(email=rows[2]['email']).has_usable_password())
+
+    def test_bulk_create_users_dedupes(self):
+        """Existing and repeated emails are skipped with one query per batch.
+        """
+        existing = User.objects.create_user(
+            email=self.generate_email(), password=self.generate_alphanumeric())
+        rows = self.rows(4)
+        rows[1]['email'] = existing.email.upper()
+        rows[3]['email'] = rows[0]['email']
+
+        # existing emails, then the insert
+        with self.assertNumQueries(2):
+            self.assertEqual(
+                User.objects.bulk_create_users(rows, batch_size=10, workers=0), (2, 2))
+        self.assertEqual(User.objects.count(), 3)
+
+    def test_bulk_create_users_process_pool(self):
+        """Passwords hashed in worker processes check out.
+        """
+        rows = self.rows(4)
+        self.assertEqual(User.objects.bulk_create_users(rows, batch_size=3, workers=2), (4, 0))
+        for row in rows:
+            self.assertTrue(User.objects.get(email=row['email']).check_password(row['password']))
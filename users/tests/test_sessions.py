@@ -0,0 +1,102 @@
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from users.sessions import SessionStore, SharedSessionStore, get_session_store
+
+
+class BaseSessionTestCase(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'sessions.sqlite3')
+        config = override_settings(SESSION_STORE=dict(
+            settings.SESSION_STORE, PATH=self.path, WRITE_BEHIND=60, CLEANUP_BATCH=2))
+        config.enable()
+        self.addCleanup(config.disable)
+
+    def other_worker(self):
+        # a store of its own, like in another process
+        return SharedSessionStore(self.path, write_behind=None)
+
+
+class TestSharedSessionStore(BaseSessionTestCase):
+    """Test the SQLite session store shared by the workers.
+    """
+
+    def test_shared(self):
+        """Sessions written by one worker are read by the others, never stale.
+        """
+        store, other = get_session_store(), self.other_worker()
+        expire = time.time() + 60
+        store.create('key', '{"a":1}', expire)
+        self.assertEqual(other.get('key'), (1, '{"a":1}'))
+
+        # the hot copy of `store` is checked against the version
+        self.assertTrue(other.update('key', '{"a":2}', expire))
+        self.assertEqual(store.get('key'), (2, '{"a":2}'))
+
+        other.delete('key')
+        self.assertIsNone(store.get('key'))
+        self.assertEqual(len(store.hot), 0)
+
+    def test_write_behind(self):
+        """Expiry updates are written in one batch, and count before that.
+        """
+        store, other = get_session_store(), self.other_worker()
+        now = time.time()
+        store.create('key', '{}', now + 1)
+        store.touch('key', now + 60)
+
+        self.assertIsNotNone(store.get('key', now=now + 30))
+        self.assertIsNone(other.get('key', now=now + 30))
+        self.assertEqual(store.flush(), 1)
+        self.assertIsNotNone(other.get('key', now=now + 30))
+
+    def test_clear_expired(self):
+        """Expired sessions are deleted in batches, live ones are kept.
+        """
+        store = get_session_store()
+        now = time.time()
+        for index in range(5):
+            store.create('old%d' % index, '{}', now - 1)
+        store.create('live', '{}', now + 60)
+
+        self.assertEqual(store.clear_expired(now), 5)
+        self.assertTrue(store.exists('live'))
+        self.assertFalse(store.exists('old0'))
+
+
+class TestSessionEngine(BaseSessionTestCase):
+    """Test `users.sessions.SessionStore`.
+    """
+
+    def test_session_lifecycle(self):
+        """Data changes are written through, saves without changes only touch.
+        """
+        session = SessionStore()
+        session['user'] = 1
+        session.save()
+        key = session.session_key
+
+        other = self.other_worker()
+        version, _ = other.get(key)
+
+        session = SessionStore(key)
+        self.assertEqual(session['user'], 1)
+        session.save()
+        self.assertEqual(other.get(key)[0], version)
+        self.assertEqual(len(get_session_store()._pending), 1)
+
+        session['user'] = 2
+        session.save()
+        self.assertEqual(SessionStore(key)['user'], 2)
+        self.assertGreater(other.get(key)[0], version)
+
+        session.delete()
+        self.assertFalse(SessionStore(key).exists(key))
+        self.assertEqual(SessionStore(key).load(), {})
@@ -0,0 +1,103 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from utils.random_support import RandomSupport
+from users.hashing import get_hasher_pool
+
+User = get_user_model()
+
+
+@override_settings(ROOT_URLCONF='customuser.urls_async')
+class TestAsyncAuthViews(TestCase, RandomSupport):
+    """Test the async login and signup views served over ASGI.
+    """
+
+    def setUp(self):
+        self.email = self.generate_email()
+        self.password = self.generate_alphanumeric(10)
+        self.user = User.objects.create_user(email=self.email, password=self.password)
+
+    async def test_login(self):
+        """Correct credentials log in, the password checked in the hasher pool.
+        """
+        pool = get_hasher_pool()
+        with mock.patch.object(pool, 'averify_password', wraps=pool.averify_password) as verify:
+            response = await self.async_client.post(reverse('users:login'), {
+                'username': self.email.upper(), 'password': self.password})
+        self.assertRedirects(response, reverse('users:profile'), fetch_redirect_response=False)
+        verify.assert_called_once()
+
+        response = await self.async_client.get(reverse('users:profile'))
+        self.assertEqual(response.status_code, 200)
+
+        # logged in already
+        response = await self.async_client.get(reverse('users:login'))
+        self.assertEqual(response.status_code, 302)
+
+    async def test_login_wrong_password(self):
+        """Wrong credentials render the form again with an error.
+        """
+        response = await self.async_client.post(reverse('users:login'), {
+            'username': self.email, 'password': self.password + 'x'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].non_field_errors())
+
+        response = await self.async_client.post(reverse('users:login'), {
+            'username': self.generate_email(), 'password': self.password})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].non_field_errors())
+
+    async def test_login_next(self):
+        """Login redirects to `next` on this site only.
+        """
+        response = await self.async_client.post(reverse('users:login'), {
+            'username': self.email, 'password': self.password, 'next': '/duties/'})
+        self.assertRedirects(response, '/duties/', fetch_redirect_response=False)
+
+        # a new session, logged out
+        client = self.async_client_class()
+        response = await client.post(reverse('users:login'), {
+            'username': self.email, 'password': self.password,
+            'next': 'https://example.com/'})
+        self.assertRedirects(response, reverse('users:profile'), fetch_redirect_response=False)
+
+    async def test_signup(self):
+        """Signup creates the user with a password hashed in the pool and logs in.
+        """
+        email, password = self.generate_email(), self.generate_alphanumeric(12)
+        pool = get_hasher_pool()
+        with mock.patch.object(pool, 'amake_password', wraps=pool.amake_password) as make:
+            response = await self.async_client.post(reverse('users:signup'), {
+                'email': email, 'name': self.generate_name(), 'password': 'unused',
+                'password1': password, 'password2': password})
+        self.assertRedirects(response, reverse('users:profile'), fetch_redirect_response=False)
+        make.assert_called_once()
+
+        user = await User.objects.aget(email=email)
+        self.assertTrue(user.check_password(password))
+        response = await self.async_client.get(reverse('users:profile'))
+        self.assertEqual(response.status_code, 200)
+
+
+class TestHashingMetricsView(TestCase, RandomSupport):
+    """Test the hashing metrics endpoint.
+    """
+
+    def test_staff_only(self):
+        """Metrics are served to staff, other users are refused.
+        """
+        user = User.objects.create_user(email=self.generate_email(), password='x')
+        self.client.force_login(user)
+        response = self.client.get(reverse('users:hashing-metrics'))
+        self.assertEqual(response.status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        self.client.force_login(user)
+        response = self.client.get(reverse('users:hashing-metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('completed', response.json())
+        self.assertIn('pid', response.json())
@@ -2,7 +2,7 @@ from django.urls import path, include
 from django.contrib.auth import views as auth_views
 from django.contrib.auth.decorators import login_required
 
-from .views import UserView, signup
+from .views import UserView, hashing_metrics, signup
 
 app_name = 'users'
 
@@ -15,4 +15,5 @@ urlpatterns = [
             redirect_authenticated_user=True), 
         name='login'
     ),
+    path('metrics/hashing/', hashing_metrics, name='hashing-metrics'),
 ]
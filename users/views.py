@@ -1,7 +1,12 @@
+import os
+
+from django.http import JsonResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate
 from django.views.generic.detail import DetailView
+from .cache import fragment_context
 from .forms import SignUpForm
+from .hashing import get_hasher_pool
 
 def redirect_login(request):
     if request.method == 'GET':
@@ -15,6 +20,10 @@ class UserView(DetailView):
     def get_object(self, queryset=None):
         return self.request.user
 
+    def get_context_data(self, **kwargs):
+        kwargs['fragments'] = fragment_context(self.object)
+        return super().get_context_data(**kwargs)
+
 def signup(request):
     if request.method == 'POST':
         form = SignUpForm(request.POST)
@@ -28,3 +37,11 @@ def signup(request):
     else:
         form = SignUpForm()
     return render(request, 'signup.html', {'form': form})
+
+def hashing_metrics(request):
+    """Password hashing metrics of the worker serving the request, for staff.
+    """
+    if not request.user.is_staff:
+        return JsonResponse(
+            {'detail': "You do not have permission to perform this action."}, status=403)
+    return JsonResponse(dict(get_hasher_pool().metrics.snapshot(), pid=os.getpid()))